@@ -0,0 +1,79 @@
+#!/usr/local/bin/python3
+
+# Author: Pranab Ghosh
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you
+# may not use this file except in compliance with the License. You may
+# obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+# Package imports
+import os
+import sys
+import time
+import subprocess
+import statistics
+import argparse
+from datetime import datetime
+from matumizi.util import *
+
+"""
+cold start import time of modules, each import done in a fresh interpreter
+"""
+
+MODULES = ["matumizi.util", "matumizi.stats", "matumizi.sampler", "matumizi.mlutil", "matumizi.mcsim",
+"matumizi.sdrift", "matumizi.udrift", "matumizi.daexp", "zaman.tsfeat", "zaman.tseda", "zaman.tsano"]
+
+def importTime(modName, nrep):
+	"""
+	median cold start import time of a module
+
+	Parameters
+		modName : module name
+		nrep : num of repetitions
+	"""
+	stmt = "import time;st = time.perf_counter();import {};print(time.perf_counter() - st)".format(modName)
+	times = list()
+	for _ in range(nrep):
+		res = subprocess.run([sys.executable, "-c", stmt], capture_output=True, text=True)
+		if res.returncode != 0:
+			return None
+		times.append(float(res.stdout.strip().split("\n")[-1]))
+	return statistics.median(times)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--op', type=str, default = "none", help = "operation")
+	parser.add_argument('--mods', type=str, default = "all", help = "comma separated module names")
+	parser.add_argument('--nrep', type=int, default = 3, help = "num of repetitions per module")
+	parser.add_argument('--fpath', type=str, default = "none", help = "output file path for tracking")
+	args = parser.parse_args()
+	op = args.op
+
+	if op == "imptm":
+		""" cold start import time """
+		mods = MODULES if args.mods == "all" else args.mods.split(",")
+		ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+		recs = list()
+		for m in mods:
+			t = importTime(m, args.nrep)
+			if t is None:
+				print("{:20s} failed".format(m))
+				continue
+			print("{:20s} {:.3f}".format(m, t))
+			recs.append("{},{},{:.3f}".format(ts, m, t))
+
+		if args.fpath != "none":
+			#append for tracking over time
+			with open(args.fpath, "a") as fh:
+				for r in recs:
+					fh.write(r + "\n")
+	else:
+		exitWithMsg("invalid command")
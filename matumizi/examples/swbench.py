@@ -0,0 +1,105 @@
+#!/usr/local/bin/python3
+
+# Author: Pranab Ghosh
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you
+# may not use this file except in compliance with the License. You may
+# obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+# Package imports
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from matumizi.util import *
+from matumizi.mlutil import *
+from matumizi.stats import *
+
+"""
+micro benchmark for sliding window stats, per value cost of add and extend for various window sizes
+"""
+
+class NullProcessor(SlidingWindowProcessor):
+	"""
+	sliding window processor doing nothing, for benchmarking window maintenance
+	"""
+	def __init__(self, wsize, pstep):
+		super(NullProcessor, self).__init__(wsize, pstep)
+
+	def process(self):
+		pass
+
+def createWindow(wtype, wsize, pstep):
+	"""
+	creates sliding window object
+
+	Parameters
+		wtype : window type
+		wsize : window size
+		pstep : processing step size for sliding window processor
+	"""
+	if wtype == "swstat":
+		win = SlidingWindowStat.createEmpty(wsize)
+	elif wtype == "rstat":
+		win = RollingStat(wsize)
+	elif wtype == "swproc":
+		win = NullProcessor(wsize, pstep)
+	else:
+		exitWithMsg("invalid window type")
+	return win
+
+def benchmark(wtype, wsize, nval, pstep, chunk):
+	"""
+	returns per value add and extend time in micro sec
+
+	Parameters
+		wtype : window type
+		wsize : window size
+		nval : num of values to add
+		pstep : processing step size for sliding window processor
+		chunk : chunk size for extend
+	"""
+	values = np.random.randn(nval)
+	lvalues = values.tolist()
+	win = createWindow(wtype, wsize, pstep)
+	st = time.perf_counter()
+	for v in lvalues:
+		win.add(v)
+		if wtype == "rstat":
+			win.getStat()
+	atime = (time.perf_counter() - st) * 1e6 / nval
+
+	win = createWindow(wtype, wsize, pstep)
+	st = time.perf_counter()
+	for i in range(0, nval, chunk):
+		win.extend(values[i:i+chunk])
+	etime = (time.perf_counter() - st) * 1e6 / nval
+	return (atime, etime)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--op', type=str, default = "none", help = "operation")
+	parser.add_argument('--wsizes', type=str, default = "10,100,1000,10000,100000", help = "comma separated window sizes")
+	parser.add_argument('--nval', type=int, default = 200000, help = "num of values to add")
+	parser.add_argument('--pstep', type=int, default = 10, help = "processing step size for sliding window processor")
+	parser.add_argument('--chunk', type=int, default = 1000, help = "chunk size for extend")
+	args = parser.parse_args()
+	op = args.op
+
+	if op in ("swstat", "rstat", "swproc"):
+		""" per value cost for various window sizes """
+		print("window size  add usec  extend usec")
+		for wsize in toIntList(args.wsizes):
+			atime, etime = benchmark(op, wsize, args.nval, args.pstep, args.chunk)
+			print("{:11d}  {:8.3f}  {:11.3f}".format(wsize, atime, etime))
+	else:
+		exitWithMsg("invalid command")
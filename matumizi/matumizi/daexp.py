@@ -17,37 +17,36 @@
 # Package imports
 import os
 import sys
+import multiprocessing
 import numpy as np
-import pandas as pd
-import sklearn as sk
-from sklearn import preprocessing
-from sklearn import metrics
 import random
 from math import *
 from decimal import Decimal
 import pprint
-from statsmodels.graphics import tsaplots
-from statsmodels.tsa import stattools as stt
-from statsmodels.stats import stattools as sstt
-from sklearn.linear_model import LinearRegression
-from matplotlib import pyplot as plt
-from scipy import stats as sta
-from scipy import fft
-from statsmodels.tsa.seasonal import seasonal_decompose
-import statsmodels.api as sm
-from sklearn.ensemble import IsolationForest
-from sklearn.neighbors import LocalOutlierFactor
-from sklearn.svm import OneClassSVM
-from sklearn.covariance import EllipticEnvelope
-from sklearn.mixture import GaussianMixture
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-import hurst
 from .util import *
 from .mlutil import *
 from .sampler import *
 from .stats import *
 
+#heavy dependencies are imported on first use
+sk = LazyImport("sklearn")
+tsaplots = LazyImport("statsmodels.graphics.tsaplots")
+stt = LazyImport("statsmodels.tsa.stattools")
+sstt = LazyImport("statsmodels.stats.stattools")
+LinearRegression = LazyImport("sklearn.linear_model", "LinearRegression")
+sta = LazyImport("scipy.stats")
+fft = LazyImport("scipy.fft")
+seasonal_decompose = LazyImport("statsmodels.tsa.seasonal", "seasonal_decompose")
+sm = LazyImport("statsmodels.api")
+IsolationForest = LazyImport("sklearn.ensemble", "IsolationForest")
+LocalOutlierFactor = LazyImport("sklearn.neighbors", "LocalOutlierFactor")
+OneClassSVM = LazyImport("sklearn.svm", "OneClassSVM")
+EllipticEnvelope = LazyImport("sklearn.covariance", "EllipticEnvelope")
+GaussianMixture = LazyImport("sklearn.mixture", "GaussianMixture")
+KMeans = LazyImport("sklearn.cluster", "KMeans")
+PCA = LazyImport("sklearn.decomposition", "PCA")
+hurst = LazyImport("hurst")
+
 """
 Load  data from a CSV file, data frame, numpy array or list
 Each data set (array like) is given a name while loading
@@ -72,6 +71,175 @@ class DataSetMetaData:
 		self.notes.append(note)
 
 
+#codes of all features, set in each feature selection worker process
+featCodes = None
+
+def initFeatCodes(codes):
+	"""
+	sets feature codes in feature selection worker process
+	
+	Parameters
+		codes : discretized feature values
+	"""
+	global featCodes
+	featCodes = codes
+
+def codesJointEntropy(codes, kc, other, ko, maxSize=1<<24):
+	"""
+	joint entropy of each column of codes with other codes, all columns at once with one 
+	bincount per chunk of columns
+	
+	Parameters
+		codes : n x p array of codes for columns
+		kc : no of code values for columns
+		other : array of other codes
+		ko : no of other code values
+		maxSize : max size of count table and combined codes per chunk
+	"""
+	n, p = codes.shape
+	csize = kc * ko
+	chunk = max(1, min(maxSize // csize, maxSize // n))
+	entr = np.empty(p)
+	for beg in range(0, p, chunk):
+		end = min(beg + chunk, p)
+		comb = codes[:, beg:end] * ko + (other[:, None] + np.arange(end - beg) * csize)
+		counts = np.bincount(comb.ravel(), minlength=(end - beg) * csize).reshape(end - beg, csize)
+		pr = counts / n
+		with np.errstate(divide="ignore", invalid="ignore"):
+			entr[beg:end] = -np.sum(np.where(pr > 0, pr * np.log(pr), 0.0), axis=1)
+	return entr
+
+def featCodesJointEntropy(args):
+	"""
+	joint entropy of a range of feature columns with other codes in worker process
+	
+	Parameters
+		args : first column, column after last, no of code values for columns, other codes, no of other code values
+	"""
+	beg, end, kc, other, ko = args
+	return codesJointEntropy(featCodes[:, beg:end], kc, other, ko)
+
+class MutualInfoFeatureSelector:
+	"""
+	mutual information based feature selection. Each feature is discretized once and mutual information
+	and conditional mutual information with target is found for all candidate features at once with joint
+	histograms of combined codes. Each selection round only needs information between the newly
+	selected feature and the candidates
+	ref: Conditional likelihood maximisation : A unifying framework for information 
+	theoretic feature selection, Gavin Brown
+	"""
+	def __init__(self, features, target, nbins=20, njobs=1):
+		"""
+		initialize
+		
+		Parameters
+			features : list of (name, data, data type) with data type num or cat
+			target : (data, data type) for target
+			nbins : no of bins for numerical data
+			njobs : no of processes for calculating mutual information 
+		"""
+		self.names = list(map(lambda f : f[0], features))
+		fcodes = list(map(lambda f : self.__discretize(f[1], f[2], nbins), features))
+		self.kc = max(map(lambda c : c[1], fcodes))
+		self.codes = np.column_stack(list(map(lambda c : c[0], fcodes)))
+		self.tcodes, self.kt = self.__discretize(target[0], target[1], nbins)
+		self.njobs = njobs
+		self.pool = None
+		
+	def __discretize(self, data, dtype, nbins):
+		"""
+		discretizes data into codes, equal width bins for numeric data
+		
+		Parameters
+			data : data
+			dtype : data type num or cat
+			nbins : no of bins for numerical data
+		"""
+		if dtype == "num":
+			data = np.asarray(data, dtype=float)
+			vmin = np.min(data)
+			vmax = np.max(data)
+			bwidth = (vmax - vmin) / nbins if vmax > vmin else 1.0
+			codes = np.minimum(((data - vmin) / bwidth).astype(int), nbins - 1)
+			ncodes = nbins
+		else:
+			uvalues, codes = np.unique(np.asarray(data), return_inverse=True)
+			ncodes = len(uvalues)
+		return codes.astype(np.int64), ncodes
+	
+	def __jointEntropy(self, other, ko):
+		"""
+		joint entropy of each feature with other codes
+		
+		Parameters
+			other : array of other codes
+			ko : no of other code values
+		"""
+		if self.pool is None:
+			return codesJointEntropy(self.codes, self.kc, other, ko)
+		p = self.codes.shape[1]
+		bounds = np.linspace(0, p, self.njobs + 1).astype(int)
+		wargs = list(map(lambda i : (bounds[i], bounds[i+1], self.kc, other, ko), range(self.njobs)))
+		return np.concatenate(self.pool.map(featCodesJointEntropy, wargs))
+		
+	def select(self, nfeatures, algo):
+		"""
+		get top n features
+		
+		Parameters
+			nfeatures : desired no of features
+			algo: mi based feature selection algorithm mrmr, jmi, cmim or icap
+		"""
+		algos = ["mrmr", "jmi", "cmim", "icap"]
+		assertInList(algo, algos, "invalid feature selection algo " + algo)
+		p = self.codes.shape[1]
+		assertGreater(p, nfeatures, "no of features should be greater than no of features to be selected")
+		if self.njobs > 1:
+			self.pool = multiprocessing.Pool(self.njobs, initializer=initFeatCodes, initargs=(self.codes,))
+		
+		try:
+			#entropies and relevancy
+			zeros = np.zeros(len(self.tcodes), dtype=np.int64)
+			hf = self.__jointEntropy(zeros, 1)
+			hft = self.__jointEntropy(self.tcodes, self.kt)
+			ht = codesJointEntropy(self.tcodes[:, None], self.kt, zeros, 1)[0]
+			relev = hf + ht - hft
+			
+			redSum = np.zeros(p)
+			redMax = np.full(p, -np.inf)
+			candidate = np.ones(p, dtype=bool)
+			selFeatures = list()
+			for i in range(nfeatures):
+				nsel = len(selFeatures)
+				if algo == "mrmr" or algo == "jmi":
+					redun = redSum / nsel if nsel > 0 else redSum
+				else:
+					redun = redMax if nsel > 0 else np.zeros(p)
+					if algo == "icap":
+						redun = np.maximum(redun, 0)
+				score = np.where(candidate, relev - redun, -np.inf)
+				s = int(np.argmax(score))
+				selFeatures.append((self.names[s], float(score[s])))
+				candidate[s] = False
+				
+				#redundancy with newly selected
+				if i < nfeatures - 1:
+					scodes = self.codes[:, s]
+					mutInfo = hf + hf[s] - self.__jointEntropy(scodes, self.kc)
+					if algo != "mrmr":
+						stcodes = scodes * self.kt + self.tcodes
+						mutInfoCnd = hft + hft[s] - self.__jointEntropy(stcodes, self.kc * self.kt) - ht
+					else:
+						mutInfoCnd = 0
+					red = mutInfo - mutInfoCnd
+					redSum += red
+					redMax = np.maximum(redMax, red)
+		finally:
+			if self.pool is not None:
+				self.pool.close()
+				self.pool = None
+		return selFeatures
+
 class DataExplorer:
 	"""
 	various data exploration functions
@@ -1652,45 +1820,61 @@ class DataExplorer:
 		"""
 		self.__printBanner("doing sub sequence anomaly detection with dissimilarity", ds)
 		data = self.getNumericData(ds)
-		sz = len(data)
-		dist = dict()
-		minDist = dict()
-		for i in range(sz - subSeqSize):
-			#first window
-			w1 = data[i : i + subSeqSize]
-			dmin = None
-			for j in range(sz - subSeqSize):
-				#second window not overlapping with the first
-				if j + subSeqSize <=i or j >= i + subSeqSize:
-					w2 = data[j : j + subSeqSize]
-					k = (j,i)
-					if k in dist:
-						d = dist[k]
-					else:
-						d = euclideanDistance(w1,w2)
-						k = (i,j)
-						dist[k] = d
-					if dmin is None:
-						dmin = d
-					else:
-						dmin = d if d < dmin else dmin
-			minDist[i] = dmin
-		
-		#find max of min
-		dmax = None
-		offset = None
-		for k in minDist.keys():
-			d = minDist[k]
-			if dmax is None:
-				dmax = d
-				offset = k
-			else:
-				if d > dmax:
-					dmax = d
-					offset = k
+		mp = MatrixProfile(data, subSeqSize)
+		offset, dmax = mp.getDiscords(1)[0]
 		result = self.__printResult("subSeqOffset", offset, "outlierScore", dmax)	
 		return result
 	
+	def getSubsequenceDiscords(self, subSeqSize, ds, numDiscords=1, znorm=False):
+		"""
+		gets top sub sequence discords i.e sub sequences farthest from their nearest neighbors
+		with matrix profile
+		
+		Parameters
+			subSeqSize : sub sequence size
+			ds: data set name or list or numpy array
+			numDiscords : no of discords
+			znorm : if True distance between z normalized sub sequences
+		"""
+		self.__printBanner("getting sub sequence discords with matrix profile", ds)
+		data = self.getNumericData(ds)
+		mp = MatrixProfile(data, subSeqSize, znorm)
+		discords = mp.getDiscords(numDiscords)
+		result = self.__printResult("discords", discords)	
+		return result
+
+	def getSubsequenceMotifs(self, subSeqSize, ds, numMotifs=1, znorm=False):
+		"""
+		gets top sub sequence motifs i.e closest pairs of sub sequences with matrix profile
+		
+		Parameters
+			subSeqSize : sub sequence size
+			ds: data set name or list or numpy array
+			numMotifs : no of motifs
+			znorm : if True distance between z normalized sub sequences
+		"""
+		self.__printBanner("getting sub sequence motifs with matrix profile", ds)
+		data = self.getNumericData(ds)
+		mp = MatrixProfile(data, subSeqSize, znorm)
+		motifs = mp.getMotifs(numMotifs)
+		result = self.__printResult("motifs", motifs)	
+		return result
+
+	def getMatrixProfile(self, subSeqSize, ds, znorm=False):
+		"""
+		gets matrix profile and matrix profile index
+		
+		Parameters
+			subSeqSize : sub sequence size
+			ds: data set name or list or numpy array
+			znorm : if True distance between z normalized sub sequences
+		"""
+		self.__printBanner("getting matrix profile", ds)
+		data = self.getNumericData(ds)
+		profile, index = MatrixProfile(data, subSeqSize, znorm).getProfile()
+		result = self.__printResult("profile", profile, "index", index)	
+		return result
+	
 	def getNullCount(self, ds):
 		"""
 		get count of null fields
@@ -2086,31 +2270,24 @@ class DataExplorer:
 		"""
 		self.__printBanner("getting approximate entropy", ds)
 		ldata = self.getNumericData(ds)
-		aent = abs(self.__phi(ldata, m + 1, r) - self.__phi(ldata, m, r))
+		aent = approximateEntropy(ldata, m, r)
 		result = self.__printResult("approxEntropy", aent)
 		return result
 		
-	def __phi(self, ldata, m, r):
+	def sampleEntropy(self, ds, m, r):
 		"""
-		phi function for approximate entropy
+		gets sample entroty of time series (ref: wikipedia)
 		
 		Parameters
-			ldata: data array
+			ds: data set name or list or numpy array
 			m:  length of compared run of data
 			r: filtering level
 		"""
-		le = len(ldata)
-		x = [[ldata[j] for j in range(i, i + m - 1 + 1)] for i in range(le - m + 1)]
-		lex = len(x)
-		c = list()
-		for i in range(lex):
-			cnt = 0
-			for j in range(lex):
-				cnt += (1 if maxListDist(x[i], x[j]) <= r else 0)
-			cnt /= (le - m + 1.0)
-			c.append(cnt)
-		return sum(np.log(c)) / (le - m + 1.0)
-		
+		self.__printBanner("getting sample entropy", ds)
+		ldata = self.getNumericData(ds)
+		sent = sampleEntropy(ldata, m, r)
+		result = self.__printResult("sampleEntropy", sent)
+		return result
 
 	def oneSpaceEntropy(self, ds, scaMethod="zscale"):
 		"""
@@ -2808,7 +2985,7 @@ class DataExplorer:
 		self.__printBanner("doing interaction capped feature selection")
 		return self.getMutInfoFeatures(fdst, tdst, nfeatures, "icap", nbins)
 
-	def getMutInfoFeatures(self, fdst, tdst, nfeatures, algo, nbins=20):
+	def getMutInfoFeatures(self, fdst, tdst, nfeatures, algo, nbins=20, njobs=1):
 		"""
 		get top n features based on various mutual information	based algorithm
 		ref: Conditional likelihood maximisation : A unifying framework for information 
@@ -2820,78 +2997,28 @@ class DataExplorer:
 			nfeatures : desired no of features
 			algo: mi based feature selection algorithm
 			nbins : no of bins for numerical data
+			njobs : no of processes for calculating mutual information 
 		"""	
 		#verify data source types types
 		le = len(fdst)
 		nfeatGiven = int(le / 2)
 		assertGreater(nfeatGiven, nfeatures, "no of features should be greater than no of features to be selected")
-		fds = list()
+		features = list()
 		types = ["num", "cat"]
 		for i in range (0, le, 2):
 			ds = fdst[i]
 			dt = fdst[i+1]
 			assertInList(dt, types, "invalid type for data source " + dt)
 			data = self.getNumericData(ds) if dt == "num" else self.getCatData(ds)
-			p =(ds, dt)
-			fds.append(p)
+			features.append((ds, data, dt))
 		algos = ["mrmr", "jmi", "cmim", "icap"]
 		assertInList(algo, algos, "invalid feature selection algo " + algo)
 		
 		assertInList(tdst[1], types, "invalid type for data source " + tdst[1])
 		data = self.getNumericData(tdst[0]) if tdst[1] == "num" else self.getCatData(tdst[0])
-		#print(fds)
 		
-		sfds = list()
-		selected = set()
-		relevancies = dict()
-		for i in range(nfeatures):
-			#print(i)
-			scorem = None
-			dsm = None
-			dsmt = None
-			for ds, dt in fds:
-				#print(ds, dt)
-				if ds not in selected:
-					#relevancy
-					if ds in relevancies:
-						mutInfo = relevancies[ds]
-					else:
-						mutInfo = self.getMutualInfo([ds, dt,  tdst[0], tdst[1]], nbins)["mutInfo"]
-						relevancies[ds] = mutInfo
-					relev = mutInfo
-					#print("relev", relev)
-					
-					#redundancy
-					smi = 0
-					reds = list()
-					for sds, sdt, _ in sfds:
-						#print(sds, sdt)
-						mutInfo = self.getMutualInfo([ds, dt,  sds, sdt], nbins)["mutInfo"]
-						mutInfoCnd = self.getCondMutualInfo([ds, dt,  sds, sdt, tdst[0], tdst[1]], nbins)["condMutInfo"] \
-						if algo != "mrmr" else 0
-						
-						red = mutInfo - mutInfoCnd
-						reds.append(red)	
-						
-					if algo == "mrmr" or algo == "jmi":
-						redun = sum(reds) / len(sfds) if len(sfds) > 0 else 0
-					elif algo == "cmim" or algo == "icap":
-						redun = max(reds) if len(sfds) > 0 else 0
-						if algo == "icap":
-							redun = max(0, redun)
-					#print("redun", redun)
-					score = relev - redun
-					if scorem is None or score > scorem:
-						scorem = score
-						dsm = ds
-						dsmt = dt
-						
-			pa = (dsm, dsmt, scorem)
-			#print(pa)
-			sfds.append(pa)
-			selected.add(dsm)
-			
-		selFeatures = list(map(lambda r : (r[0], r[2]), sfds))
+		selector = MutualInfoFeatureSelector(features, (data, tdst[1]), nbins, njobs)
+		selFeatures = selector.select(nfeatures, algo)
 		result = self.__printResult("selFeatures", selFeatures)
 		return result
 
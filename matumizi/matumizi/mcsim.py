@@ -18,16 +18,33 @@
 # Package imports
 import os
 import sys
-import matplotlib.pyplot as plt
+import time
+import multiprocessing
 import numpy as np
-import matplotlib
 import random
 import jprops
 import statistics 
-from matplotlib import pyplot
 from .util import *
 from .mlutil import *
 from .sampler import *
+from .stats import *
+
+pyplot = LazyImport("matplotlib.pyplot")
+
+def runSimulatorSegment(args):
+	"""
+	runs a segment of iterations of a simulator in a worker process with its own seed
+
+	Parameters
+		args : simulator, worker index, first iteration, iteration after last, seed, batch size
+	"""
+	(simulator, worker, beg, end, seed, batchSize) = args
+	random.seed(seed)
+	np.random.seed(seed)
+	stime = time.time()
+	output = simulator.runSegment(beg, end, batchSize)
+	elapsed = time.time() - stime
+	return (worker, end - beg, output, elapsed, simulator.prSamples, simulator.summary)
 
 class MonteCarloSimulator(object):
 	"""
@@ -53,6 +70,10 @@ class MonteCarloSimulator(object):
 		self.sd = None
 		self.replSamplers = dict()
 		self.prSamples = None
+		self.seed = None
+		self.workerStats = None
+		self.summary = None
+		self.keepOutput = True
 		
 		self.logger = None
 		if logFilePath is not None: 		
@@ -301,18 +322,48 @@ class MonteCarloSimulator(object):
 					sampler = self.replSamplers[key]
 					self.samplers[v] = sampler
 
-	def run(self):
+	def enableStreamSummary(self, relAcc=0.01, keepOutput=False):
 		"""
-		run simulator
+		enables summary of output with quantile sketch and running moments, updated as iterations 
+		complete. Stats are then based on the summary and can be queried during a run
+
+		Parameters
+			relAcc : relative accuracy for quantiles
+			keepOutput : if True raw output is also kept
+		"""
+		self.summary = QuantileSketch(relAcc)
+		self.keepOutput = keepOutput
+
+	def __initRun(self):
+		"""
+		initializes before a run
 		"""
 		self.sum = None
 		self.mean = None
 		self.sd = None
 		self.numVars = len(self.samplers)
-		vOut = 0
+		if self.summary is not None:
+			self.summary = QuantileSketch(self.summary.relAcc, self.summary.minValue, self.summary.maxBuckets)
+
+	def run(self):
+		"""
+		run simulator
+		"""
+		self.__initRun()
+		self.output = list()
 
 		#print(formatAny(self.numIter, "num iterations"))
-		for i in range(self.numIter):
+		self.__runIters(0, self.numIter)
+	
+	def __runIters(self, beg, end):
+		"""
+		run iterations one at a time appending to output
+
+		Parameters
+			beg : first iteration
+			end : iteration after last
+		"""
+		for i in range(beg, end):
 			self.replSampler(i)
 			args = list()
 			for s in self.samplers:
@@ -328,9 +379,162 @@ class MonteCarloSimulator(object):
 			args.append(self)
 			args.append(i)
 			vOut = self.callback(args)	
-			self.output.append(vOut)
+			if self.keepOutput:
+				self.output.append(vOut)
+			if self.summary is not None:
+				self.summary.add(vOut)
 			self.prSamples = args[:slen]
 	
+	def runBatch(self, batchSize=100000):
+		"""
+		run simulator in batch mode. Each sampler draws a whole block of samples at once and 
+		the call back gets a list of column arrays, one per variable, and returns an array of 
+		output values for the block. Output is stored in a pre allocated array
+
+		Parameters
+			batchSize : no of iterations per block
+		"""
+		self.__initRun()
+		self.output = np.empty(self.numIter) if self.keepOutput else list()
+		self.__runBlocks(0, self.numIter, batchSize)
+	
+	def __runBlocks(self, beg, end, batchSize):
+		"""
+		run iterations in blocks writing to pre allocated output
+
+		Parameters
+			beg : first iteration
+			end : iteration after last
+			batchSize : no of iterations per block
+		"""
+		#block boundaries include iterations where samplers get replaced
+		bounds = set(range(beg, end, batchSize))
+		bounds.update(filter(lambda i : i >= beg and i < end, map(lambda k : k[1], self.replSamplers.keys())))
+		bounds = sorted(bounds)
+		bounds.append(end)
+		
+		for bbeg, bend in zip(bounds[:-1], bounds[1:]):
+			self.replSampler(bbeg)
+			size = bend - bbeg
+			args = list()
+			for s in self.samplers:
+				arg = self.__sampleBlock(s, size)
+				if arg.ndim == 2:
+					args.extend(arg.T)
+				else:
+					args.append(arg)
+			
+			slen = len(args)
+			if self.extraArgs:
+				args.extend(self.extraArgs)
+			args.append(self)
+			args.append(np.arange(bbeg, bend))
+			bOut = self.callback(args)
+			if self.keepOutput:
+				self.output[bbeg - beg:bend - beg] = bOut
+			if self.summary is not None:
+				self.summary.addMany(np.broadcast_to(bOut, size))
+			self.prSamples = args[:slen]
+	
+	def __sampleBlock(self, sampler, size):
+		"""
+		samples a block of values from a sampler, looping for samplers without batch sampling
+
+		Parameters
+			sampler : sampler
+			size : block size
+		"""
+		if hasattr(sampler, "sampleBatch"):
+			block = sampler.sampleBatch(size)
+		else:
+			block = list(map(lambda i : sampler.sample(), range(size)))
+		return np.asarray(block)
+	
+	def runSegment(self, beg, end, batchSize=None):
+		"""
+		run a segment of iterations with samplers as replaced up to the first iteration,
+		as done by each worker in parallel mode
+
+		Parameters
+			beg : first iteration
+			end : iteration after last
+			batchSize : no of iterations per block for batch mode, None for one at a time
+		"""
+		self.__initRun()
+		self.__replSamplersBefore(beg)
+		if batchSize is None or not self.keepOutput:
+			self.output = list()
+		else:
+			self.output = np.empty(end - beg)
+		if batchSize is None:
+			self.__runIters(beg, end)
+		else:
+			self.__runBlocks(beg, end, batchSize)
+		return self.output
+	
+	def __replSamplersBefore(self, iter):
+		"""
+		replace samplers for all iterations before given iteration 
+
+		Parameters
+			iter : iteration number
+		"""
+		for key in sorted(self.replSamplers.keys(), key=lambda k : k[1]):
+			if key[1] < iter:
+				self.samplers[key[0]] = self.replSamplers[key]
+	
+	def runParallel(self, nworkers, seed=None, batchSize=None):
+		"""
+		run simulator with iterations split across a pool of processes. Each worker gets its own
+		seed spawned from the given seed, making results reproducible. Call back must be picklable
+		and any side effect of it in the workers is not visible in this process. Returns per worker
+		stats as list of (worker, no of iterations, elapsed time, iterations per sec)
+
+		Parameters
+			nworkers : no of worker processes
+			seed : base seed, random if None
+			batchSize : no of iterations per block for batch mode, None for one at a time
+		"""
+		self.__initRun()
+		self.output = list()
+		
+		seedSeq = np.random.SeedSequence(seed)
+		self.seed = seedSeq.entropy
+		seeds = list(map(lambda s : int(s.generate_state(1)[0]), seedSeq.spawn(nworkers)))
+		bounds = np.linspace(0, self.numIter, nworkers + 1).astype(int)
+		wargs = list(map(lambda w : (self, w, bounds[w], bounds[w+1], seeds[w], batchSize), range(nworkers)))
+		with multiprocessing.Pool(nworkers) as pool:
+			results = pool.map(runSimulatorSegment, wargs)
+		
+		#merge in iteration order
+		if self.keepOutput:
+			outputs = list(map(lambda r : r[2], results))
+			if batchSize is None:
+				for out in outputs:
+					self.output.extend(out)
+			else:
+				self.output = np.concatenate(outputs)
+		if self.summary is not None:
+			for r in results:
+				self.summary.merge(r[5])
+		self.prSamples = results[-1][4]
+		self.__replSamplersBefore(self.numIter)
+		
+		self.workerStats = list()
+		for (w, niter, out, elapsed, prSamples, summary) in results:
+			rate = niter / elapsed if elapsed > 0 else 0
+			st = (w, niter, elapsed, rate)
+			self.workerStats.append(st)
+			if self.logger is not None:
+				self.logger.info("worker {}  num iterations {}  elapsed {:.3f}  iter per sec {:.3f}".format(*st))
+		return self.workerStats
+	
+	def __isArrayOutput(self):
+		"""
+		True if output is numpy array as in batch mode
+		"""
+		return isinstance(self.output, np.ndarray)
+
 	def getOutput(self):
 		"""
 		get raw output
@@ -366,24 +570,33 @@ class MonteCarloSimulator(object):
 		"""
 		get sum
 		"""
+		if self.summary is not None:
+			return self.summary.getSum()
 		if not self.sum:
-			self.sum = sum(self.output)
+			self.sum = np.sum(self.output) if self.__isArrayOutput() else sum(self.output)
 		return self.sum
 		
 	def getMean(self):
 		"""
 		get average
 		"""
+		if self.summary is not None:
+			return self.summary.getMean()
 		if self.mean is None:
-			self.mean = statistics.mean(self.output)
+			self.mean = np.mean(self.output) if self.__isArrayOutput() else statistics.mean(self.output)
 		return self.mean 
 		
 	def getStdDev(self):
 		"""
 		get std dev
 		"""
+		if self.summary is not None:
+			return self.summary.getStdDev()
 		if self.sd is None:
-			self.sd = statistics.stdev(self.output, xbar=self.mean) if self.mean else statistics.stdev(self.output)
+			if self.__isArrayOutput():
+				self.sd = np.std(self.output, ddof=1)
+			else:
+				self.sd = statistics.stdev(self.output, xbar=self.mean) if self.mean else statistics.stdev(self.output)
 		return self.sd 
 		
 
@@ -391,20 +604,26 @@ class MonteCarloSimulator(object):
 		"""
 		get average
 		"""
-		med = statistics.median(self.output)
+		if self.summary is not None:
+			return self.summary.getQuantile(0.5)
+		med = np.median(self.output) if self.__isArrayOutput() else statistics.median(self.output)
 		return med
 
 	def getMax(self):
 		"""
 		get max
 		"""
-		return max(self.output)
+		if self.summary is not None:
+			return self.summary.getMax()
+		return np.max(self.output) if self.__isArrayOutput() else max(self.output)
 		
 	def getMin(self):
 		"""
 		get min
 		"""
-		return min(self.output)
+		if self.summary is not None:
+			return self.summary.getMin()
+		return np.min(self.output) if self.__isArrayOutput() else min(self.output)
 		
 	def getIntegral(self, bounds):
 		"""
@@ -413,9 +632,7 @@ class MonteCarloSimulator(object):
 		Parameters
 			bounds :  bound on sum
 		"""
-		if not self.sum:
-			self.sum = sum(self.output)
-		return self.sum * bounds / self.numIter
+		return self.getSum() * bounds / self.numIter
 	
 	def getLowerTailStat(self, zvalue, numIntPoints=50):
 		"""
@@ -444,10 +661,9 @@ class MonteCarloSimulator(object):
 		Parameters
 			cvalue : value for percentile 
 		"""
-		count = 0
-		for v in self.output:
-			if v < cvalue:
-				count += 1 
+		if self.summary is not None:
+			return int(self.summary.getCumDistr(cvalue) * 100.0)
+		count = np.count_nonzero(np.asarray(self.output) < cvalue)
 		percent =  int(count * 100.0 / self.numIter)
 		return percent
 
@@ -460,7 +676,9 @@ class MonteCarloSimulator(object):
 			pvalue : pvalue 
 		"""
 		assertWithinRange(pvalue, 0.0, 1.0, "invalid probabaility value")
-		svalues = self.output.sorted()
+		if self.summary is not None:
+			return self.summary.getQuantile(pvalue)
+		svalues = np.sort(self.output)
 		ppval = None
 		cpval = None
 		intv = 1.0 / (self.numIter - 1)
@@ -505,13 +723,14 @@ class MonteCarloSimulator(object):
 		"""
 		delta = (tailEnd - tailStart) / numIntPoints
 		cvalues = floatRange(tailStart, tailEnd, delta)
+		if self.summary is not None:
+			cdistr = list(map(lambda cv : self.summary.getCumDistr(cv), cvalues))
+		else:
+			svalues = np.sort(self.output)
+			cdistr = np.searchsorted(svalues, cvalues, side="left") / self.numIter
 		cvaCounts = list()
-		for cv in cvalues:
-			count = 0
-			for v in self.output:
-				if v < cv:
-					count += 1
-			p = (cv, count/self.numIter)
+		for cv, cd in zip(cvalues, cdistr):
+			p = (cv, cd)
 			if self.logger is not None:
 				self.logger.info("{:.3f}  {:.3f}".format(p[0], p[1]))
 			cvaCounts.append(p)
@@ -19,23 +19,26 @@
 import os
 import sys
 import numpy as np
-from sklearn import preprocessing
-from sklearn import metrics
-from sklearn.datasets import make_blobs
-from sklearn.datasets import make_classification
 import random
 from math import *
 from decimal import Decimal
 import statistics
 import abc
 import jprops
-from Levenshtein import distance as ld
 from .util import *
 from .sampler import *
+from .stats import RingBuffer, SlidingWindowStat
+
+preprocessing = LazyImport("sklearn.preprocessing")
+metrics = LazyImport("sklearn.metrics")
+make_blobs = LazyImport("sklearn.datasets", "make_blobs")
+make_classification = LazyImport("sklearn.datasets", "make_classification")
+ld = LazyImport("Levenshtein", "distance")
 
 class Configuration:
 	"""
-	Configuration management. Supports default value, mandatory value and typed value.
+	Configuration management. Supports default value, mandatory value and typed value. Typed values are 
+	parsed once and cached, with the cache cleared when any param is changed
 	"""
 	def __init__(self, configFile, defValues, verbose=False):
 		"""
@@ -53,6 +56,7 @@ class Configuration:
 		self.configs = configs
 		self.defValues = defValues
 		self.verbose = verbose
+		self.typed = dict()
 
 
 	def override(self, configFile):
@@ -65,6 +69,7 @@ class Configuration:
 		with open(configFile) as fp:
   			for key, value in jprops.iter_properties(fp):
   				self.configs[key] = value
+		self.typed.clear()
   			
 	
 	def setParam(self, name, value):
@@ -76,6 +81,7 @@ class Configuration:
 			value : config param value
 		"""
 		self.configs[name] = value
+		self.typed.clear()
 
 	
 	def getStringConfig(self, name):
@@ -85,15 +91,7 @@ class Configuration:
 		Parameters
 			name : config param name
 		"""
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			val = (self.configs[name], False)
-		if self.verbose:
-			print( "{} {} {}".format(name, self.configs[name], val[0]))
-		return val
+		return self.typed.get((name, "string")) or self.__getTypedConfig(name, "string", str)
 
 	
 	def getIntConfig(self, name):
@@ -103,16 +101,7 @@ class Configuration:
 		Parameters
 			name : config param name
 		"""
-		#print "%s %s" %(name,self.configs[name])
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			val = (int(self.configs[name]), False)
-		if self.verbose:
-			print( "{} {} {}".format(name, self.configs[name], val[0]))
-		return val
+		return self.typed.get((name, "int")) or self.__getTypedConfig(name, "int", int)
 		
 	
 	def getFloatConfig(self, name):
@@ -122,16 +111,7 @@ class Configuration:
 		Parameters
 			name : config param name
 		"""
-		#print "%s %s" %(name,self.configs[name])
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			val = (float(self.configs[name]), False)
-		if self.verbose:
-			print( "{} {} {:06.3f}".format(name, self.configs[name], val[0]))
-		return val
+		return self.typed.get((name, "float")) or self.__getTypedConfig(name, "float", float)
 
 	
 	def getBooleanConfig(self, name):
@@ -141,16 +121,7 @@ class Configuration:
 		Parameters
 			name : config param name
 		"""
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			bVal = self.configs[name].lower() == "true"
-			val = (bVal, False)
-		if self.verbose:
-			print( "{} {} {}".format(name, self.configs[name], val[0]))
-		return val
+		return self.typed.get((name, "boolean")) or self.__getTypedConfig(name, "boolean", lambda v : v.lower() == "true")
 		
 	
 	def getIntListConfig(self, name, delim=","):
@@ -161,17 +132,8 @@ class Configuration:
 			name : config param name
 			delim : delemeter
 		"""
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			delSepStr = self.getStringConfig(name)
-		
-			#specified as range
-			intList = strListOrRangeToIntArray(delSepStr[0])
-			val =(intList, delSepStr[1])
-		return val
+		#specified as list or range
+		return self.__getTypedListConfig(name, "intList", strListOrRangeToIntArray)
 	
 	def getFloatListConfig(self, name, delim=","):
 		"""
@@ -181,15 +143,7 @@ class Configuration:
 			name : config param name
 			delim : delemeter
 		"""
-		delSepStr = self.getStringConfig(name)
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			flList = strToFloatArray(delSepStr[0], delim)
-			val =(flList, delSepStr[1])
-		return val
+		return self.__getTypedListConfig(name, "floatList" + delim, lambda v : strToFloatArray(v, delim))
 
 	
 	def getStringListConfig(self, name, delim=","):
@@ -200,16 +154,44 @@ class Configuration:
 			name : config param name
 			delim : delemeter
 		"""
-		delSepStr = self.getStringConfig(name)
-		if self.isNone(name):
-			val = (None, False)
-		elif self.isDefault(name):
-			val = (self.handleDefault(name), True)
-		else:
-			strList = delSepStr[0].split(delim)
-			val = (strList, delSepStr[1])
+		return self.__getTypedListConfig(name, "stringList" + delim, lambda v : v.split(delim))
+	
+	def __getTypedConfig(self, name, vtype, parse):
+		"""
+		get typed param from cache, parsing and caching on first access
+
+		Parameters
+			name : config param name
+			vtype : value type
+			parse : function to parse value string
+		"""
+		#cached values are non empty tuples, so that getters can check cache with get() or ...
+		key = (name, vtype)
+		val = self.typed.get(key)
+		if val is None:
+			if self.isNone(name):
+				val = (None, False)
+			elif self.isDefault(name):
+				val = (self.handleDefault(name), True)
+			else:
+				val = (parse(self.configs[name]), False)
+			self.typed[key] = val
+			if self.verbose:
+				print( "{} {} {}".format(name, self.configs[name], val[0]))
 		return val
 	
+	def __getTypedListConfig(self, name, vtype, parse):
+		"""
+		get typed list param from cache, as a copy so that the cached list is not modified by caller
+
+		Parameters
+			name : config param name
+			vtype : value type
+			parse : function to parse value string
+		"""
+		val = self.__getTypedConfig(name, vtype, parse)
+		return (val[0].copy(), val[1]) if type(val[0]) == list else val
+	
 	def handleDefault(self, name):
 		"""
 		handles default
@@ -678,10 +660,17 @@ class SlidingWindowProcessor(metaclass=abc.ABCMeta):
 		"""
 		self.wsize = wsize
 		self.pstep = pstep
-		self.window = list()
+		self.rbuf = RingBuffer(wsize)
 		self.vcount = 0
 		self.scount = 0
 		self.full = False
+	
+	@property
+	def window(self):
+		"""
+		window values, oldest first, as array view
+		"""
+		return self.rbuf.get()
 		
 	def add(self, val):
 		"""
@@ -690,7 +679,7 @@ class SlidingWindowProcessor(metaclass=abc.ABCMeta):
 		Parameters
 			val : value
 		"""
-		self.window.append(val)
+		self.rbuf.add(val)
 		if not self.full:
 			self.vcount += 1
 		
@@ -700,13 +689,38 @@ class SlidingWindowProcessor(metaclass=abc.ABCMeta):
 			self.process()
 		elif self.full:
 			#already full
-			self.window.pop(0)
 			self.scount += 1
 			
 			if self.scount == self.pstep:
 				#process
 				self.process()
 				self.scount = 0
+	
+	def extend(self, values):
+		"""
+		adds array of values to window, processing at the same points as add
+		
+		Parameters
+			values : values
+		"""
+		values = np.asarray(values)
+		i = 0
+		while i < len(values):
+			if not self.full:
+				k = min(self.wsize - self.vcount, len(values) - i)
+				self.rbuf.extend(values[i:i+k])
+				self.vcount += k
+				if self.vcount == self.wsize:
+					self.full = True
+					self.process()
+			else:
+				k = min(self.pstep - self.scount, len(values) - i)
+				self.rbuf.extend(values[i:i+k])
+				self.scount += k
+				if self.scount == self.pstep:
+					self.process()
+					self.scount = 0
+			i += k
 				
 	@abc.abstractmethod
 	def process(self):
@@ -733,20 +747,26 @@ class SlidingWindow(object):
 		"""
 		self.wsize = wsize
 		self.pstep = pstep
-		self.ldata = ldata
+		self.ldata = np.asarray(ldata)
 		self.lsize = len(ldata)
 		self.beg = 0
 		
+	def windows(self):
+		"""
+		all remaining windows as 2D read only strided view, one window per row, without copying
+		
+		"""
+		if self.lsize - self.beg < self.wsize:
+			return np.empty((0, self.wsize), dtype=self.ldata.dtype)
+		return slidingWindowView(self.ldata[self.beg:], self.wsize, self.pstep)
+		
 	def windowGen(self):
 		"""
-		get window worth of data
+		get window worth of data, as read only view
 		
 		"""
-		end = self.beg + self.wsize
-		while end <= self.lsize:
-			wdata = self.ldata[self.beg:end]
+		for wdata in self.windows():
 			self.beg += self.pstep
-			end = self.beg + self.wsize
 			yield wdata
 		
 def loadDataFile(file, delim, cols, colIndices):
@@ -940,6 +960,246 @@ def findMinDistances(X1, X2, algo="L2"):
 
 	return minDist
 
+def slidingWindowView(data, wsize, step=1):
+	"""
+	read only 2D view of all windows of a 1D array, without copying
+	
+	Parameters
+		data : 1D data array
+		wsize : window size
+		step : step between windows
+	"""
+	data = np.ascontiguousarray(data)
+	nwin = (len(data) - wsize) // step + 1
+	assertGreater(nwin, 0, "window size larger than data size")
+	st = data.strides[0]
+	return np.lib.stride_tricks.as_strided(data, shape=(nwin, wsize), strides=(step * st, st), writeable=False)
+
+def templateMatchCounts(data, m, r, ntempl=None, blockSize=None):
+	"""
+	for each template i.e sub sequence of length m, counts templates within Chebyshev distance r 
+	including itself. Templates are sorted by first element so that each block of templates is 
+	only compared with templates whose first element is within r
+	
+	Parameters
+		data : 1D data array
+		m : template length
+		r : distance threshold
+		ntempl : no of templates from the start to use, all if None
+		blockSize : no of templates per block
+	"""
+	data = np.asarray(data, dtype=float)
+	templ = slidingWindowView(data, m)
+	if ntempl is not None:
+		templ = templ[:ntempl]
+	nt = len(templ)
+	if blockSize is None:
+		blockSize = max(1, 4000000 // nt)
+	
+	order = np.argsort(templ[:, 0], kind="stable")
+	stempl = templ[order]
+	first = stempl[:, 0]
+	
+	#margin so that round off in bounds does not exclude any match
+	margin = 1.0e-9 * (np.max(np.abs(first)) + r)
+	counts = np.empty(nt, dtype=int)
+	for beg in range(0, nt, blockSize):
+		end = min(beg + blockSize, nt)
+		lo = np.searchsorted(first, first[beg] - r - margin, side="left")
+		hi = np.searchsorted(first, first[end - 1] + r + margin, side="right")
+		cand = stempl[lo:hi]
+		dist = np.abs(stempl[beg:end, 0][:, None] - cand[:, 0][None, :])
+		for k in range(1, m):
+			np.maximum(dist, np.abs(stempl[beg:end, k][:, None] - cand[:, k][None, :]), out=dist)
+		counts[order[beg:end]] = np.count_nonzero(dist <= r, axis=1)
+	return counts
+
+def approximateEntropy(data, m, r):
+	"""
+	approximate entropy (ref: wikipedia)
+	
+	Parameters
+		data : 1D data array
+		m : length of compared run of data
+		r : filtering level
+	"""
+	def phi(m):
+		counts = templateMatchCounts(data, m, r)
+		nt = len(counts)
+		return sum(np.log(counts / nt)) / nt
+	return abs(phi(m + 1) - phi(m))
+
+def sampleEntropy(data, m, r):
+	"""
+	sample entropy (ref: wikipedia)
+	
+	Parameters
+		data : 1D data array
+		m : length of compared run of data
+		r : filtering level
+	"""
+	#same no of templates for both lengths and self matches excluded
+	ntempl = len(data) - m
+	b = np.sum(templateMatchCounts(data, m, r, ntempl) - 1)
+	a = np.sum(templateMatchCounts(data, m + 1, r, ntempl) - 1)
+	assertGreater(a, 0, "no matching templates of length m + 1, increase r")
+	return -log(a / b)
+
+def slidingDotProduct(query, data):
+	"""
+	dot product of a query with all windows of same size in data, using FFT
+	
+	Parameters
+		query : query sub sequence
+		data : 1D data array
+	"""
+	query = np.asarray(query, dtype=float)
+	data = np.asarray(data, dtype=float)
+	m = len(query)
+	n = len(data)
+	size = 1 << (n + m - 1).bit_length()
+	prod = np.fft.irfft(np.fft.rfft(data, size) * np.fft.rfft(query[::-1], size), size)
+	return prod[m - 1:n]
+
+class MatrixProfile:
+	"""
+	matrix profile i.e for each sub sequence the distance to its nearest non trivial neighbor, 
+	computed with STOMP. The first row of dot products is found with FFT and each next row is 
+	updated from the previous one in O(n)
+	"""
+	def __init__(self, data, wsize, znorm=False, exclZone=None):
+		"""
+		initializer
+		
+		Parameters
+			data : 1D data array
+			wsize : sub sequence size
+			znorm : if True distance between z normalized sub sequences, otherwise euclidean
+			exclZone : neighbors closer than this are trivial matches, defaults to window size
+		"""
+		self.data = np.asarray(data, dtype=float)
+		self.wsize = wsize
+		self.znorm = znorm
+		self.exclZone = wsize if exclZone is None else exclZone
+		self.nwin = len(self.data) - wsize + 1
+		assertGreater(self.nwin, self.exclZone, "data too small for window size")
+		self.profile = None
+		self.index = None
+		
+	def build(self):
+		"""
+		builds matrix profile and matrix profile index
+		"""
+		x = self.data
+		w = self.wsize
+		n = self.nwin
+		
+		#window sums and sum of squares with prefix sums
+		csum = np.concatenate(([0.0], np.cumsum(x)))
+		csumSq = np.concatenate(([0.0], np.cumsum(x * x)))
+		wsum = csum[w:] - csum[:-w]
+		wsumSq = csumSq[w:] - csumSq[:-w]
+		if self.znorm:
+			mean = wsum / w
+			sd = np.sqrt(np.maximum(wsumSq / w - mean * mean, 0))
+			sd[sd < 1.0e-12] = 1.0e-12
+		
+		qtFirst = slidingDotProduct(x[:w], x)
+		qt = qtFirst.copy()
+		qtPrev = np.empty(n)
+		dsq = np.empty(n)
+		tmp = np.empty(n - 1)
+		xhead = x[:n - 1]
+		xtail = x[w:w + n - 1]
+		self.profile = np.empty(n)
+		self.index = np.empty(n, dtype=int)
+		for i in range(n):
+			if i > 0:
+				#dot products for this row from previous row
+				qt, qtPrev = qtPrev, qt
+				np.multiply(xhead, x[i - 1], out=tmp)
+				np.subtract(qtPrev[:-1], tmp, out=qt[1:])
+				np.multiply(xtail, x[i + w - 1], out=tmp)
+				np.add(qt[1:], tmp, out=qt[1:])
+				qt[0] = qtFirst[i]
+			if self.znorm:
+				#2 w (1 - correlation)
+				np.multiply(mean, w * mean[i], out=dsq)
+				np.subtract(qt, dsq, out=dsq)
+				np.divide(dsq, sd, out=dsq)
+				np.multiply(dsq, -2.0 / sd[i], out=dsq)
+				np.add(dsq, 2.0 * w, out=dsq)
+			else:
+				np.multiply(qt, -2.0, out=dsq)
+				np.add(dsq, wsumSq, out=dsq)
+				np.add(dsq, wsumSq[i], out=dsq)
+			beg = max(0, i - self.exclZone + 1)
+			dsq[beg:i + self.exclZone] = np.inf
+			j = np.argmin(dsq)
+			self.index[i] = j
+			self.profile[i] = sqrt(min(max(dsq[j], 0.0), 4.0 * w)) if self.znorm else sqrt(max(dsq[j], 0.0))
+		return self.profile, self.index
+	
+	def getProfile(self):
+		"""
+		returns matrix profile and index, building if necessary
+		"""
+		if self.profile is None:
+			self.build()
+		return self.profile, self.index
+		
+	def getDiscords(self, count=1):
+		"""
+		returns top discords i.e sub sequences farthest from their nearest neighbors, as list of 
+		(offset, distance), skipping trivial matches of already selected ones
+		
+		Parameters
+			count : no of discords
+		"""
+		profile, index = self.getProfile()
+		profile = profile.copy()
+		discords = list()
+		for _ in range(count):
+			i = np.argmax(profile)
+			if profile[i] == -np.inf:
+				break
+			discords.append((int(i), float(profile[i])))
+			self.__exclude(profile, i, -np.inf)
+		return discords
+		
+	def getMotifs(self, count=1):
+		"""
+		returns top motifs i.e closest pairs of sub sequences, as list of (offset, neighbor offset, distance), 
+		skipping trivial matches of already selected ones
+		
+		Parameters
+			count : no of motifs
+		"""
+		profile, index = self.getProfile()
+		profile = profile.copy()
+		motifs = list()
+		for _ in range(count):
+			i = np.argmin(profile)
+			if profile[i] == np.inf:
+				break
+			j = index[i]
+			motifs.append((int(i), int(j), float(profile[i])))
+			self.__exclude(profile, i, np.inf)
+			self.__exclude(profile, j, np.inf)
+		return motifs
+		
+	def __exclude(self, profile, i, value):
+		"""
+		sets profile in exclusion zone of an offset to a value
+		
+		Parameters
+			profile : matrix profile
+			i : offset
+			value : value to set
+		"""
+		beg = max(0, i - self.exclZone + 1)
+		profile[beg:i + self.exclZone] = value
+
 def norm(values, po=2):
 	"""
 	norm
@@ -1594,6 +1854,8 @@ class RollingStat(object):
 	"""
 	stats for rolling windowt
 	"""
+	__slots__ = ("wstat", "wsize", "mean", "sd")
+	
 	def __init__(self, wsize):
 		"""
 		initializer
@@ -1601,11 +1863,18 @@ class RollingStat(object):
 		Parameters
 			wsize : window size
 		"""
-		self.window = list()
+		self.wstat = SlidingWindowStat.createEmpty(wsize)
 		self.wsize = wsize
 		self.mean = None
 		self.sd = None
 
+	@property
+	def window(self):
+		"""
+		window values, oldest first, as array view
+		"""
+		return self.wstat.values.get()
+
 	def add(self, value):
 		"""
 		add a value
@@ -1613,21 +1882,27 @@ class RollingStat(object):
 		Parameters
 			value : value to add
 		"""
-		self.window.append(value)
-		if len(self.window) > self.wsize:
-			self.window = self.window[1:]
+		self.wstat.add(value)
+	
+	def extend(self, values):
+		"""
+		add array of values
+		
+		Parameters
+			values : values to add
+		"""
+		self.wstat.extend(values)
 		
 	def getStat(self):
 		"""
 		get rolling window mean and std deviation
 		"""
-		assertGreater(len(self.window), 0, "window is empty")
-		if len(self.window) == 1:
-			self.mean = self.window[0]
+		assertGreater(self.getSize(), 0, "window is empty")
+		if self.getSize() == 1:
+			self.mean = self.wstat.mean
 			self.sd = 0
 		else:
-			self.mean = statistics.mean(self.window)
-			self.sd = statistics.stdev(self.window, xbar=self.mean)
+			self.mean, self.sd = self.wstat.getStat()
 		re = (self.mean, self.sd)
 		return re
 		
@@ -1635,5 +1910,5 @@ class RollingStat(object):
 		"""
 		return window size
 		"""
-		return len(self.window)
+		return self.wstat.getCurSize()
 		
\ No newline at end of file
@@ -21,11 +21,12 @@ import time
 import math
 import random
 import numpy as np
-from scipy import stats
 from random import randint
 from matumizi.util import *
 from matumizi.stats import Histogram
 
+stats = LazyImport("scipy.stats")
+
 def randomFloat(low, high):
 	"""
 	sample float within range
@@ -264,6 +265,40 @@ def sampleWithReplace(data, sampSize):
 		sampled.append(data[j])
 	return sampled
 
+def rejectSampleBatch(size, proposal, accept):
+	"""
+	vectorized rejection sampling, over samples proposals in bulk and keeps the accepted ones
+
+	Parameters
+		size : no of samples
+		proposal : function returning array of proposed samples for a given count
+		accept : function returning boolean mask of accepted samples for proposed samples
+	"""
+	samples = list()
+	remaining = size
+	accRate = 0.5
+	while remaining > 0:
+		nprop = int(1.2 * remaining / accRate) + 10
+		prop = proposal(nprop)
+		acc = prop[accept(prop)]
+		accRate = max(len(acc) / nprop, 0.01)
+		acc = acc[:remaining]
+		samples.append(acc)
+		remaining -= len(acc)
+	return np.concatenate(samples) if len(samples) > 0 else np.empty(0)
+
+def sampleIndexBatch(distr, size):
+	"""
+	samples indexes of a discrete distribution with inverse cumulative distribution lookup
+
+	Parameters
+		distr : unnormalized distr values
+		size : no of samples
+	"""
+	cdistr = np.cumsum(np.asarray(distr, dtype=float))
+	u = np.random.random(size) * cdistr[-1]
+	return np.searchsorted(cdistr, u, side="right")
+
 class CumDistr:
 	"""
 	cumulative distr
@@ -327,6 +362,18 @@ class BernoulliTrialSampler:
 		if self.retEvent:
 			res = self.events[0] if res else self.events[1]
 		return res
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		res = np.random.random(size) < self.pr
+		if self.retEvent:
+			res = np.where(res, self.events[0], self.events[1])
+		return res
 	
 class PoissonSampler:
 	"""
@@ -369,6 +416,16 @@ class PoissonSampler:
 				samp = no
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		distr = list(map(lambda n : self.calculatePr(n), range(self.maxSamp + 1)))
+		return sampleIndexBatch(distr, size)
+
 class ExponentialSampler:
 	"""
 	returns interval between events
@@ -394,6 +451,20 @@ class ExponentialSampler:
 				sampled = np.random.exponential(scale=self.interval)
 		return sampled
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		if self.maxSamp is None:
+			sampled = np.random.exponential(scale=self.interval, size=size)
+		else:
+			sampled = rejectSampleBatch(size, lambda n : np.random.exponential(scale=self.interval, size=n), 
+			lambda x : x <= self.maxSamp)
+		return sampled
+
 class UniformNumericSampler:
 	"""
 	uniform sampler for numerical values
@@ -422,6 +493,19 @@ class UniformNumericSampler:
 		samp =	sampleUniform(self.minv, self.maxv) if isinstance(self.minv, int) else randomFloat(self.minv, self.maxv)
 		return samp	
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		if isinstance(self.minv, int):
+			samp = np.random.randint(self.minv, self.maxv + 1, size)
+		else:
+			samp = np.random.uniform(self.minv, self.maxv, size)
+		return samp
+
 class UniformCategoricalSampler:
 	"""
 	uniform sampler for categorical values
@@ -444,6 +528,15 @@ class UniformCategoricalSampler:
 		"""
 		return selectRandomFromList(self.cvalues)	
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		return np.asarray(self.cvalues)[np.random.randint(0, len(self.cvalues), size)]
+
 class NormalSampler:
 	"""
 	normal sampler
@@ -477,6 +570,18 @@ class NormalSampler:
 		if self.sampleAsInt:
 			samp = round(samp)
 		return samp
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		samp =  np.random.normal(self.mean, self.stdDev, size)
+		if self.sampleAsInt:
+			samp = np.rint(samp).astype(int)
+		return samp
 				
 class LogNormalSampler:
 	"""
@@ -502,6 +607,15 @@ class LogNormalSampler:
 		"""
 		return np.random.lognormal(self.mean, self.stdDev)
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		return np.random.lognormal(self.mean, self.stdDev, size)
+
 class NormalSamplerWithTrendCycle:
 	"""
 	normal sampler with cycle and trend
@@ -544,6 +658,24 @@ class NormalSamplerWithTrendCycle:
 			self.cmean = self.mean + tr + cy
 		return s
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, with mean for each sample as per trend and cycle 
+
+		Parameters
+			size : no of samples
+		"""
+		counts = np.arange(self.count, self.count + size + 1)
+		
+		#count at which mean was last adjusted
+		acounts = (counts // self.step) * self.step
+		cy = np.asarray(self.cycle)[acounts % self.clen] if self.clen > 1 else 0
+		means = np.where(acounts > 0, self.mean + acounts * self.dmean + cy, self.mean)
+		s = np.random.normal(means[:-1], self.stdDev)
+		self.count += size
+		self.cmean = float(means[-1])
+		return s
+
 
 class NormalSamplerWithShift:
 	"""
@@ -602,6 +734,15 @@ class NormalSamplerWithShift:
 			self.nstep = randomInt(self.step[0],self. step[1])
 		return self.csampler.sample()
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, one at a time since sampling is sequential
+
+		Parameters
+			size : no of samples
+		"""
+		return np.array(randomSampledList(self, size))
+
 class ParetoSampler:
 	"""
 	pareto sampler
@@ -626,6 +767,15 @@ class ParetoSampler:
 		"""
 		return (np.random.pareto(self.shape) + 1) * self.mode
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		return (np.random.pareto(self.shape, size) + 1) * self.mode
+
 class GammaSampler:
 	"""
 	pareto sampler
@@ -650,6 +800,15 @@ class GammaSampler:
 		"""
 		return np.random.gamma(self.shape, self.scale)
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		return np.random.gamma(self.shape, self.scale, size)
+
 class GaussianRejectSampler:
 	"""
 	gaussian sampling based on rejection sampling
@@ -697,6 +856,22 @@ class GaussianRejectSampler:
 			samp = round(samp)
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		def accept(x):
+			y = np.random.uniform(self.ymin, self.ymax, len(x))
+			f = self.fmax * np.exp(-(x - self.mean) * (x - self.mean) / (2.0 * self.stdDev * self.stdDev))
+			return y < f
+		samp = rejectSampleBatch(size, lambda n : np.random.uniform(self.xmin, self.xmax, n), accept)
+		if self.sampleAsInt:
+			samp = np.rint(samp).astype(int)
+		return samp
+
 class DiscreteRejectSampler:
 	"""
 	non parametric sampling for discrete values  using given distribution based 
@@ -744,6 +919,16 @@ class DiscreteRejectSampler:
 				done = True
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		xi = sampleIndexBatch(self.distr, size)
+		return self.xmin + xi * self.step
+
 
 class TriangularRejectSampler:
 	"""
@@ -789,6 +974,19 @@ class TriangularRejectSampler:
 			
 		return samp;	
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		def accept(x):
+			y = np.random.uniform(0.0, self.vertexValue, len(x))
+			f = np.where(x < self.vertexPos, (x - self.xmin) * self.s1, (self.xmax - x) * self.s2)
+			return y < f
+		return rejectSampleBatch(size, lambda n : np.random.uniform(self.xmin, self.xmax, n), accept)
+
 class NonParamRejectSampler:
 	"""
 	non parametric sampling using given distribution based on rejection sampling	
@@ -843,6 +1041,20 @@ class NonParamRejectSampler:
 				samp = x
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, selecting bin with inverse cumulative distribution lookup and then value within bin
+
+		Parameters
+			size : no of samples
+		"""
+		bins = sampleIndexBatch(self.values, size)
+		if self.sampleAsInt:
+			samp = self.xmin + bins * self.binWidth + np.random.randint(0, self.binWidth, size)
+		else:
+			samp = self.xmin + (bins + np.random.random(size)) * self.binWidth
+		return samp
+
 class JointNonParamRejectSampler:
 	"""
 	non parametric sampling using given distribution based on rejection sampling	
@@ -894,6 +1106,19 @@ class JointNonParamRejectSampler:
 				samp = [x,y]
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, selecting cell with inverse cumulative distribution lookup and then values within cell
+
+		Parameters
+			size : no of samples
+		"""
+		ynbin = self.values.shape[1]
+		cells = sampleIndexBatch(self.values.flatten(), size)
+		x = self.xmin + (cells // ynbin + np.random.random(size)) * self.xbinWidth
+		y = self.ymin + (cells % ynbin + np.random.random(size)) * self.ybinWidth
+		return np.column_stack((x, y))
+
 
 class JointNormalSampler:
 	"""
@@ -921,6 +1146,15 @@ class JointNormalSampler:
 		samples value
 		"""
 		return list(np.random.multivariate_normal(self.mean, self.sd))
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values as 2D array
+
+		Parameters
+			size : no of samples
+		"""
+		return np.random.multivariate_normal(self.mean, self.sd, size)
 		
 		
 class MultiVarNormalSampler:
@@ -951,6 +1185,15 @@ class MultiVarNormalSampler:
 		"""
 		return list(np.random.multivariate_normal(self.mean, self.sd))
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values as 2D array
+
+		Parameters
+			size : no of samples
+		"""
+		return np.random.multivariate_normal(self.mean, self.sd, size)
+
 class CategoricalRejectSampler:
 	"""
 	non parametric sampling for categorical attributes using given distribution based 
@@ -986,6 +1229,17 @@ class CategoricalRejectSampler:
 				samp = t[0]
 		return samp
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		values = np.asarray(list(map(lambda t : t[0], self.distr)))
+		indx = sampleIndexBatch(list(map(lambda t : t[1], self.distr)), size)
+		return values[indx]
+
 
 class CategoricalSetSampler:
 	"""
@@ -1016,6 +1270,15 @@ class CategoricalSetSampler:
 				self.sampled.append(samp)
 				break
 		return samp
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, one at a time since sampling is sequential
+
+		Parameters
+			size : no of samples
+		"""
+		return np.array(randomSampledList(self, size))
 	
 	def setSampled(self, sampled):
 		"""
@@ -1067,6 +1330,20 @@ class DistrMixtureSampler:
 		#sample  sampled comp distr
 		return self.compDistr[comp].sample()
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values
+
+		Parameters
+			size : no of samples
+		"""
+		comps = np.asarray(self.mixtureWtDistr.sampleBatch(size))
+		samp = np.empty(size)
+		for comp in np.unique(comps):
+			mask = comps == comp
+			samp[mask] = self.compDistr[comp].sampleBatch(np.count_nonzero(mask))
+		return samp
+
 class AncestralSampler:
 	"""
 	ancestral sampler using conditional distribution
@@ -1097,6 +1374,15 @@ class AncestralSampler:
 			child = self.childDistr[key].sample()
 			children.append(child)
 		return (parent, children)
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values as list of tuples
+
+		Parameters
+			size : no of samples
+		"""
+		return randomSampledList(self, size)
 		
 class ClusterSampler:
 	"""
@@ -1120,6 +1406,16 @@ class ClusterSampler:
 		cluster = self.sampler.sample()
 		member = random.choice(self.clusters[cluster])
 		return (cluster, member)
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values as list of tuples
+
+		Parameters
+			size : no of samples
+		"""
+		clusters = self.sampler.sampleBatch(size)
+		return list(map(lambda c : (c, random.choice(self.clusters[c])), clusters))
 		
 	
 class MetropolitanSampler:
@@ -1184,6 +1480,15 @@ class MetropolitanSampler:
 		nextSample = self.proposalSample(1)
 		self.targetSample(nextSample)
 		return self.curSample;
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, one at a time since sampling is sequential
+
+		Parameters
+			size : no of samples
+		"""
+		return np.array(randomSampledList(self, size))
 	
 	def proposalSample(self, skip):
 		"""
@@ -1314,6 +1619,15 @@ class PermutationSampler:
 		cloned = self.values.copy()
 		shuffle(cloned, *self.numShuffles)
 		return cloned
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values as list of permutations
+
+		Parameters
+			size : no of samples
+		"""
+		return randomSampledList(self, size)
 	
 class SpikeyDataSampler:
 	"""
@@ -1389,6 +1703,15 @@ class SpikeyDataSampler:
 
 		return sampled
 
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, one at a time since sampling is sequential
+
+		Parameters
+			size : no of samples
+		"""
+		return np.array(randomSampledList(self, size))
+
 
 class EventSampler:
 	"""
@@ -1426,6 +1749,15 @@ class EventSampler:
 			sample = 0.0
 			self.count += 1
 		return sampled
+
+	def sampleBatch(self, size):
+		"""
+		samples multiple values, one at a time since sampling is sequential
+
+		Parameters
+			size : no of samples
+		"""
+		return np.array(randomSampledList(self, size))
 			
 			
 		
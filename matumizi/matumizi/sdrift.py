@@ -18,19 +18,18 @@
 import os
 import sys
 import math
-import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib
-from sklearn.neighbors import KDTree
 import random
 import jprops
 import statistics as stat
-from matplotlib import pyplot
 from .util import *
 from .mlutil import *
 from .sampler import *
 from .stats import *
 
+KDTree = LazyImport("sklearn.neighbors", "KDTree")
+pyplot = LazyImport("matplotlib.pyplot")
+
 class SupConceptDrift(object):
 	"""
 	supervised cpncept drift detection 
@@ -60,8 +59,12 @@ class SupConceptDrift(object):
 		self.diMeanMax = None
 		self.diSdMax = None
 		self.maxAccRate = None
-		self.evalues = list()
+		
+		#window as ring buffer with error count
+		self.evalues = np.zeros(wsize, dtype=np.int8)
+		self.wbeg = 0
 		self.evcount = 0
+		self.wecount = 0
 		self.scount = 0
 		
 	
@@ -77,18 +80,80 @@ class SupConceptDrift(object):
 		res = None
 		if self.evcount < self.wsize:
 			#fill window
-			#print("filling window ", self.scount, self.evcount)
-			self.evalues.append(evalue)
+			self.evalues[(self.wbeg + self.evcount) % self.wsize] = evalue
 			self.evcount += 1
+			if evalue == 1:
+				self.wecount += 1
 		else:
 			#detect and then flush window
-			#print("full window ", self.scount, self.evcount)
-			res = self.detect(self.evalues)
-			for _ in range(self.wpsize):
-				self.evalues.pop(0)
+			window = self.getWindow()
+			res = self.detect(window, self.wecount)
+			self.wecount -= np.count_nonzero(window[:self.wpsize] == 1)
+			self.wbeg = (self.wbeg + self.wpsize) % self.wsize
 			self.evcount -= self.wpsize
 		return res
 
+	def addMany(self, evalues, driftOnly=True):
+		"""
+		detects drift for a chunk of error values, equivalent to calling add for each value 
+		in sequence but with all windows in the chunk processed together
+	
+		Parameters
+			evalues : error value list or array
+			driftOnly : if True returns only results with drift
+		"""
+		assertGreaterEqual(self.wsize, 50, "minimum window size is 50")
+		evalues = np.asarray(evalues)
+		size = len(evalues)
+		
+		#detection is triggered by the value following a full window, that value is not added
+		trig = np.arange(self.wsize - self.evcount, size, self.wpsize + 1)
+		keep = np.ones(size, dtype=bool)
+		keep[trig] = False
+		values = np.concatenate((self.getWindow(), evalues[keep]))
+		starts = np.arange(len(trig)) * self.wpsize
+		
+		results = list()
+		if len(trig) > 0 and not self.warmedUp:
+			results.append(self.detect(values[:self.wsize]))
+			starts = starts[1:]
+		
+		#no window evaluation before warm up, min state not set yet
+		if len(starts) > 0 and self.warmedUp:
+			results.extend(self.detectWindows(values, starts))
+		self.setWindow(values[len(trig) * self.wpsize:])
+		self.scount += size
+		
+		res = list()
+		for i, r in zip(trig.tolist(), results):
+			if r is not None and (not driftOnly or r[-1] == 1):
+				res.append((i, r))
+		return res
+
+	def getWindow(self):
+		"""
+		returns current window values, oldest first
+		"""
+		end = self.wbeg + self.evcount
+		if end <= self.wsize:
+			window = self.evalues[self.wbeg:end]
+		else:
+			window = np.concatenate((self.evalues[self.wbeg:], self.evalues[:end - self.wsize]))
+		return window
+
+	def setWindow(self, values):
+		"""
+		sets current window values
+	
+		Parameters
+			values : window values, oldest first
+		"""
+		assertLesserEqual(len(values), self.wsize, "number of values should not exceed window size")
+		self.evalues[:len(values)] = values
+		self.wbeg = 0
+		self.evcount = len(values)
+		self.wecount = np.count_nonzero(self.evalues[:self.evcount] == 1)
+
 class DDM(SupConceptDrift):
 	"""
 	Drift Detection Method (DDM)
@@ -127,49 +192,70 @@ class DDM(SupConceptDrift):
 		self.count = 0
 		self.ecount = 0
 		
-	def detect(self, evalues):
+	def detect(self, evalues, ecount=None):
 		"""
 		detects drift in batch
 	
 		Parameters
 			evalues : error value list
+			ecount : error count for all values, computed if not provided
 		"""
+		evalues = np.asarray(evalues)
 		self.reset()
 		warmed = False
 		if not self.warmedUp:
 			assertGreaterEqual(self.wsize, self.warmUp, "window size should be greater than or equal to warmup size")
-			for i in range(self.warmUp):
-				if (evalues[i] == 1):
-					self.ecount += 1
-				self.count += 1
-			
+			self.ecount = np.count_nonzero(evalues[:self.warmUp] == 1)
+			self.count = self.warmUp
 			self.prMin = self.ecount / self.count
 			self.sdMin = math.sqrt(self.prMin * (1 - self.prMin) / self.count )
 			self.warmedUp = True
 			warmed = True
-			#print("min {:.6f},{:.6f}".format(self.prMin, self.sdMin))
 		
 		result = None
 		beg = self.warmUp if  warmed else 0
 		remain = len(evalues) - beg
 		if remain > 20:
-			for i in range(beg, len(evalues), 1):
-				if (evalues[i] == 1):
-					self.ecount += 1
-				self.count += 1
-			
-			pr = self.ecount / self.count
-			sd = math.sqrt(pr * (1 - pr) / self.count)
-			dr = 1 if (pr + sd) > (self.prMin + self.threshold * self.sdMin) else 0
-			result = (pr, sd, pr + sd, dr)
-			
-			if (pr + sd) < (self.prMin +  self.sdMin):
-				self.prMin = pr
-				self.sdMin = sd
-				#print("counts {},{}".format(self.count, self.ecount))
-				#print("min {:.6f},{:.6f}".format(self.prMin, self.sdMin))
-			
+			self.ecount = np.count_nonzero(evalues == 1) if ecount is None else ecount
+			self.count = len(evalues)
+			result = self.__evalCounts(np.array([self.ecount]), self.count)[0]
 		return result
+
+	def detectWindows(self, values, starts):
+		"""
+		detects drift in batch for multiple windows, evaluated in sequence
+	
+		Parameters
+			values : error value array
+			starts : window start indexes
+		"""
+		csum = np.concatenate(([0], np.cumsum(values == 1)))
+		ecounts = csum[starts + self.wsize] - csum[starts]
+		return self.__evalCounts(ecounts, self.wsize)
+
+	def __evalCounts(self, ecounts, count):
+		"""
+		evaluates windows in sequence given error counts, updating the minimum
+	
+		Parameters
+			ecounts : error count array, one per window
+			count : window size
+		"""
+		pr = ecounts / count
+		sd = np.sqrt(pr * (1 - pr) / count)
+		score = pr + sd
+		
+		#min state in effect for each window, updated only with strictly lower score
+		prs = np.concatenate(([self.prMin], pr))
+		sds = np.concatenate(([self.sdMin], sd))
+		scores = prs + sds
+		better = np.concatenate(([True], scores[1:] < np.minimum.accumulate(scores)[:-1]))
+		sel = np.maximum.accumulate(np.where(better, np.arange(len(scores)), 0))
+		prev = sel[:-1]
+		dr = (score > prs[prev] + self.threshold * sds[prev]).astype(int)
+		self.prMin = float(prs[sel[-1]])
+		self.sdMin = float(sds[sel[-1]])
+		return list(zip(pr.tolist(), sd.tolist(), score.tolist(), dr.tolist()))
 	
 	
 	def save(self, fpath):
@@ -246,26 +332,24 @@ class EDDM(SupConceptDrift):
 		self.sum = 0
 		self.sumSq = 0
 		
-	def detect(self, evalues):
+	def detect(self, evalues, ecount=None):
 		"""
 		detects drift in batch
 	
 		Parameters
 			evalues : error value list
+			ecount : error count for all values, not used
 		"""
+		evalues = np.asarray(evalues)
 		self.reset()
 		warmed = False
-		rstat = RunningStat()
-		lastEr = None
 		if not self.warmedUp:
-			for i in range(self.warmUp):
-				if (evalues[i] == 1):
-					if lastEr is not None:
-						dist = i - lastEr
-						rstat.add(dist)
-					lastEr = i
-			assertGreater(rstat.getCount(), 10, "not enough samples for warm up")
-			re = rstat.getStat()
+			dist = np.diff(np.flatnonzero(evalues[:self.warmUp] == 1))
+			self.count = len(dist)
+			self.sum = int(dist.sum())
+			self.sumSq = int((dist * dist).sum())
+			assertGreater(self.count, 10, "not enough samples for warm up")
+			re = RunningStat.create(self.count, float(self.sum), float(self.sumSq)).getStat()
 			
 			self.diMeanMax = re[0]
 			self.diSdMax = re[1]
@@ -277,25 +361,67 @@ class EDDM(SupConceptDrift):
 		beg = self.warmUp if  warmed else 0
 		remain = len(evalues) - beg
 		if remain > 20:
-			lastEr = None
-			for i in range(beg, len(evalues), 1):
-				if (evalues[i] == 1):
-					if lastEr is not  None:
-						dist = i - lastEr
-						re = rstat.add(dist)
-					lastEr = i	
-		
-			if rstat.getCount() > 5:
-				re = rstat.getStat()			
-				cur = re[0] + 2.0 * re[1]
-				dr = 1 if (cur / self.maxLim < self.threshold)  else 0
-				result = (re[0],re[1], cur, dr)
-				if cur > self.maxLim:
-					self.diMeanMax = re[0]
-					self.diSdMax = re[1]
-					self.maxLim = cur
+			#distances between successive errors
+			dist = np.diff(np.flatnonzero(evalues[beg:] == 1))
+			self.count += len(dist)
+			self.sum += int(dist.sum())
+			self.sumSq += int((dist * dist).sum())
+			result = self.__evalStats(np.array([self.count]), np.array([self.sum]), np.array([self.sumSq]))[0]
 		return result
 
+	def detectWindows(self, values, starts):
+		"""
+		detects drift in batch for multiple windows, evaluated in sequence
+	
+		Parameters
+			values : error value array
+			starts : window start indexes
+		"""
+		epos = np.flatnonzero(values == 1)
+		dist = np.diff(epos)
+		csum = np.concatenate(([0], np.cumsum(dist)))
+		csumSq = np.concatenate(([0], np.cumsum(dist * dist)))
+		
+		#distances within a window are between its first and last error
+		lo = np.searchsorted(epos, starts)
+		hi = np.maximum(np.searchsorted(epos, starts + self.wsize) - 1, lo)
+		return self.__evalStats(hi - lo, csum[hi] - csum[lo], csumSq[hi] - csumSq[lo])
+
+	def __evalStats(self, counts, sums, sumSqs):
+		"""
+		evaluates windows in sequence given error distance stats, updating the maximum
+	
+		Parameters
+			counts : error distance count array, one per window
+			sums : error distance sum array
+			sumSqs : error distance sum of squares array
+		"""
+		results = [None] * len(counts)
+		valid = np.flatnonzero(counts > 5)
+		if len(valid) == 0:
+			return results
+		
+		counts = counts[valid]
+		mean = sums[valid].astype(float) / counts
+		t = sumSqs[valid].astype(float) / (counts - 1) - mean * mean * counts / (counts - 1)
+		sd = np.sqrt(t)
+		cur = mean + 2.0 * sd
+		
+		#max state in effect for each window, updated only with strictly higher limit
+		means = np.concatenate(([self.diMeanMax], mean))
+		sds = np.concatenate(([self.diSdMax], sd))
+		lims = np.concatenate(([self.maxLim], cur))
+		better = np.concatenate(([True], lims[1:] > np.maximum.accumulate(lims)[:-1]))
+		sel = np.maximum.accumulate(np.where(better, np.arange(len(lims)), 0))
+		dr = (cur / lims[sel[:-1]] < self.threshold).astype(int)
+		self.diMeanMax = float(means[sel[-1]])
+		self.diSdMax = float(sds[sel[-1]])
+		self.maxLim = float(lims[sel[-1]])
+		
+		for i, r in zip(valid.tolist(), zip(mean.tolist(), sd.tolist(), cur.tolist(), dr.tolist())):
+			results[i] = r
+		return results
+
 	def save(self, fpath):
 		"""
 		save EDDM algorithm state
@@ -364,20 +490,19 @@ class FHDDM(SupConceptDrift):
 		obj.maxAccRate = ws["maxAccRate"]
 		return obj
 		
-	def detect(self, evalues):
+	def detect(self, evalues, ecount=None):
 		"""
 		detects drift in batch
 	
 		Parameters
 			evalues : error value list
+			ecount : error count for all values, computed if not provided
 		"""
+		evalues = np.asarray(evalues)
 		warmed = False
 		if not self.warmedUp:
 			assertGreaterEqual(self.wsize, self.warmUp, "window size should be greater than or equal to warmup size")
-			accCount = 0
-			for i in range(self.warmUp):
-				if evalues[i] == 0:
-					accCount += 1
+			accCount = np.count_nonzero(evalues[:self.warmUp] == 0)
 			self.maxAccRate = accCount / self.warmUp
 			self.warmedUp = True
 			warmed = True
@@ -386,18 +511,40 @@ class FHDDM(SupConceptDrift):
 		beg = self.warmUp if  warmed else 0
 		remain = len(evalues) - beg
 		if remain > 20:
-			accCount = 0
-			for i in range(beg, len(evalues), 1):
-				if (evalues[i] == 0):
-					accCount += 1 
-			accRate = accCount / remain
-			if accRate > self.maxAccRate:
-				self.maxAccRate = accRate
-			dr = 1 if (self.maxAccRate - accRate) > self.threshold else 0
-			result = (accRate, dr)
-
+			if warmed or ecount is None:
+				accCount = np.count_nonzero(evalues[beg:] == 0)
+			else:
+				accCount = remain - ecount
+			result = self.__evalCounts(np.array([accCount]), remain)[0]
 		return result
 
+	def detectWindows(self, values, starts):
+		"""
+		detects drift in batch for multiple windows, evaluated in sequence
+	
+		Parameters
+			values : error value array
+			starts : window start indexes
+		"""
+		csum = np.concatenate(([0], np.cumsum(values == 0)))
+		accCounts = csum[starts + self.wsize] - csum[starts]
+		return self.__evalCounts(accCounts, self.wsize)
+
+	def __evalCounts(self, accCounts, count):
+		"""
+		evaluates windows in sequence given correct prediction counts, updating the maximum
+	
+		Parameters
+			accCounts : correct prediction count array, one per window
+			count : window size
+		"""
+		accRate = accCounts / count
+		maxAccRate = np.maximum.accumulate(np.concatenate(([self.maxAccRate], accRate)))[1:]
+		dr = ((maxAccRate - accRate) > self.threshold).astype(int)
+		if len(maxAccRate) > 0:
+			self.maxAccRate = float(maxAccRate[-1])
+		return list(zip(accRate.tolist(), dr.tolist()))
+
 	def save(self, fpath):
 		"""
 		save FHDDM algorithm state
@@ -479,6 +626,21 @@ class ECDD():
 			res = (self.z, dr)
 			
 		return res
+
+	def addMany(self, evalues, driftOnly=True):
+		"""
+		detects drift for a chunk of error values
+	
+		Parameters
+			evalues : error value list or array
+			driftOnly : if True returns only results with drift
+		"""
+		res = list()
+		for i, evalue in enumerate(evalues):
+			r = self.add(evalue)
+			if r is not None and (not driftOnly or r[-1] == 1):
+				res.append((i, r))
+		return res
 		
 	def save(self, fpath):
 		"""
@@ -560,6 +722,19 @@ class MultiSupConceptDrift(object):
 			re = self.detectors[k].add(evalues[k])
 			res[k] = re
 		return res
+
+	def addMany(self, evalues, driftOnly=True):
+		"""
+		detects drift for a chunk of error values for all labels
+	
+		Parameters
+			evalues : error value list or array for all labels
+			driftOnly : if True returns only results with drift
+		"""
+		res = dict()
+		for k in evalues.keys():
+			res[k] = self.detectors[k].addMany(evalues[k], driftOnly)
+		return res
 		
 	def save(self, fpath):
 		"""
@@ -604,5 +779,382 @@ class MultiSupConceptDrift(object):
 				exitWithMsg("invalid drift detector type")
 		return mdet
 
+class SupConceptDriftEngine(object):
+	"""
+	supervised concept drift detection for many models or segments with the same detector type. 
+	Detector state for all models is held in arrays and one call updates all models. Models
+	receive error values in lock step, so results match those of separate detectors.
+	"""
+	def __init__(self, labels, detype):
+		"""
+		initializer
+	
+		Parameters
+			labels : list of model or segment names
+			detype : detector type
+		"""
+		self.labels = labels
+		self.detype = detype
+		self.nmodel = len(labels)
+		self.scount = 0
+		self.ckptPath = None
+		self.ckptInterval = None
+	
+	def create(self, warmUp, wsize=300, wpsize=30, threshold=0.8, confLevel=0.2, expf=0.7, fprate=100):
+		"""
+		creates detector state for all models
+		
+		Parameters
+			warmUp : warmup length
+			wsize : window size
+			wpsize : window processing step size
+			threshold : threshold
+			confLevel : confidence level for FHDDM
+			expf : exponential factor for ECDD
+			fprate : false positive rate for drift for ECDD
+		"""
+		nmodel = self.nmodel
+		self.warmUp = warmUp
+		self.warmedUp = False
+		if self.detype in ("ddm", "eddm", "fhddm"):
+			assertGreaterEqual(warmUp, 50, "minimum warmup size is 50")
+			assertGreaterEqual(wsize, 50, "minimum window size is 50")
+			self.wsize = wsize
+			self.wpsize = wpsize
+			
+			#time major ring buffer, one column per model
+			self.evalues = np.zeros((wsize, nmodel), dtype=np.int8)
+			self.wbeg = 0
+			self.evcount = 0
+			self.wecount = np.zeros(nmodel, dtype=int)
+			if self.detype == "ddm":
+				self.threshold = threshold
+				self.prMin = np.zeros(nmodel)
+				self.sdMin = np.zeros(nmodel)
+			elif self.detype == "eddm":
+				self.threshold = threshold
+				self.diMeanMax = np.zeros(nmodel)
+				self.diSdMax = np.zeros(nmodel)
+				self.maxLim = np.zeros(nmodel)
+			else:
+				self.confLevel = confLevel
+				self.threshold = math.sqrt(0.5 * math.log(1 / confLevel) / wsize )
+				self.maxAccRate = np.zeros(nmodel)
+		elif self.detype == "ecdd":
+			self.expf = expf
+			self.fprate = fprate
+			self.count = 0
+			self.pr = np.zeros(nmodel)
+			self.z = np.zeros(nmodel)
+		else:
+			exitWithMsg("invalid drift detector type")
+		
+	def setCheckpoint(self, fpath, interval):
+		"""
+		enables periodic checkpointing
+		
+		Parameters
+			fpath : file path for model checkpointing
+			interval : checkpointing interval as number of add calls
+		"""
+		self.ckptPath = fpath
+		self.ckptInterval = interval
+
+	def add(self, evalues):
+		"""
+		detects drift online for all models. Returns None if no detection was done, otherwise a 
+		tuple of arrays, one element per model, with the same content as the detector result
+	
+		Parameters
+			evalues : error value list or array, one per model in label order
+		"""
+		evalues = np.asarray(evalues)
+		assertEqual(len(evalues), self.nmodel, "there should be one error value per model")
+		self.scount += 1
+		if self.detype == "ecdd":
+			res = self.__addEcdd(evalues)
+		else:
+			res = self.__addWindowed(evalues)
+		
+		if self.ckptInterval is not None and self.scount % self.ckptInterval == 0:
+			self.save(self.ckptPath)
+		return res
+
+	def getDrifted(self, res):
+		"""
+		returns labels of models with drift
+	
+		Parameters
+			res : result returned by add
+		"""
+		return [] if res is None else [self.labels[i] for i in np.flatnonzero(res[-1])]
+
+	def getWindow(self):
+		"""
+		returns current window values for all models, oldest first
+		"""
+		end = self.wbeg + self.evcount
+		if end <= self.wsize:
+			window = self.evalues[self.wbeg:end]
+		else:
+			window = np.concatenate((self.evalues[self.wbeg:], self.evalues[:end - self.wsize]))
+		return window
+
+	def __addWindowed(self, evalues):
+		"""
+		adds error values for window based detectors
+	
+		Parameters
+			evalues : error value array
+		"""
+		res = None
+		if self.evcount < self.wsize:
+			#fill window
+			self.evalues[(self.wbeg + self.evcount) % self.wsize] = evalues
+			self.evcount += 1
+			self.wecount += (evalues == 1)
+		else:
+			#detect and then flush window
+			window = self.getWindow()
+			if self.detype == "ddm":
+				res = self.__detectDdm(window)
+			elif self.detype == "eddm":
+				res = self.__detectEddm(window)
+			else:
+				res = self.__detectFhddm(window)
+			self.wecount -= np.count_nonzero(window[:self.wpsize] == 1, axis=0)
+			self.wbeg = (self.wbeg + self.wpsize) % self.wsize
+			self.evcount -= self.wpsize
+		return res
+
+	def __detectDdm(self, window):
+		"""
+		DDM detection for all models
+	
+		Parameters
+			window : window values
+		"""
+		warmed = False
+		if not self.warmedUp:
+			assertGreaterEqual(self.wsize, self.warmUp, "window size should be greater than or equal to warmup size")
+			ecount = np.count_nonzero(window[:self.warmUp] == 1, axis=0)
+			self.prMin = ecount / self.warmUp
+			self.sdMin = np.sqrt(self.prMin * (1 - self.prMin) / self.warmUp)
+			self.warmedUp = True
+			warmed = True
+		
+		result = None
+		count = len(window)
+		beg = self.warmUp if  warmed else 0
+		if count - beg > 20:
+			pr = self.wecount / count
+			sd = np.sqrt(pr * (1 - pr) / count)
+			score = pr + sd
+			dr = (score > self.prMin + self.threshold * self.sdMin).astype(int)
+			result = (pr, sd, score, dr)
+			
+			better = score < self.prMin + self.sdMin
+			self.prMin = np.where(better, pr, self.prMin)
+			self.sdMin = np.where(better, sd, self.sdMin)
+		return result
+
+	def __detectEddm(self, window):
+		"""
+		EDDM detection for all models
+	
+		Parameters
+			window : window values
+		"""
+		warmed = False
+		if not self.warmedUp:
+			count, dsum, dsumSq = self.__errDistStats(window[:self.warmUp])
+			assertGreater(count.min(), 10, "not enough samples for warm up")
+			self.diMeanMax, self.diSdMax = self.__meanSd(count, dsum, dsumSq)
+			self.maxLim = self.diMeanMax + 2.0 * self.diSdMax
+			self.warmedUp = True
+			warmed = True
+		
+		result = None
+		beg = self.warmUp if  warmed else 0
+		if len(window) - beg > 20:
+			stats = self.__errDistStats(window[beg:])
+			if warmed:
+				count, dsum, dsumSq = [s + t for s, t in zip(stats, (count, dsum, dsumSq))]
+			else:
+				count, dsum, dsumSq = stats
+			
+			#models without enough errors are not evaluated, with nan result
+			valid = count > 5
+			with np.errstate(divide="ignore", invalid="ignore"):
+				mean, sd = self.__meanSd(count, dsum, dsumSq)
+				cur = mean + 2.0 * sd
+				dr = (valid & (cur / self.maxLim < self.threshold)).astype(int)
+			mean[~valid] = np.nan
+			sd[~valid] = np.nan
+			cur[~valid] = np.nan
+			result = (mean, sd, cur, dr)
 			
-		
\ No newline at end of file
+			better = valid & (cur > self.maxLim)
+			self.diMeanMax = np.where(better, mean, self.diMeanMax)
+			self.diSdMax = np.where(better, sd, self.diSdMax)
+			self.maxLim = np.where(better, cur, self.maxLim)
+		return result
+
+	def __errDistStats(self, values):
+		"""
+		count, sum and sum of squares of distance between successive errors for all models
+	
+		Parameters
+			values : window values
+		"""
+		size = len(values)
+		epos = np.flatnonzero(values.T == 1)
+		models = epos // size
+		dist = np.diff(epos)
+		same = models[1:] == models[:-1]
+		dist = dist[same]
+		models = models[1:][same]
+		count = np.bincount(models, minlength=self.nmodel)
+		dsum = np.bincount(models, weights=dist, minlength=self.nmodel)
+		dsumSq = np.bincount(models, weights=dist * dist, minlength=self.nmodel)
+		return (count, dsum, dsumSq)
+
+	def __meanSd(self, count, dsum, dsumSq):
+		"""
+		mean and std deviation from count, sum and sum of squares, as in RunningStat
+	
+		Parameters
+			count : count array
+			dsum : sum array
+			dsumSq : sum of squares array
+		"""
+		mean = dsum / count
+		t = dsumSq / (count - 1) - mean * mean * count / (count - 1)
+		return (mean, np.sqrt(t))
+
+	def __detectFhddm(self, window):
+		"""
+		FHDDM detection for all models
+	
+		Parameters
+			window : window values
+		"""
+		warmed = False
+		if not self.warmedUp:
+			assertGreaterEqual(self.wsize, self.warmUp, "window size should be greater than or equal to warmup size")
+			self.maxAccRate = np.count_nonzero(window[:self.warmUp] == 0, axis=0) / self.warmUp
+			self.warmedUp = True
+			warmed = True
+		
+		result = None
+		beg = self.warmUp if  warmed else 0
+		remain = len(window) - beg
+		if remain > 20:
+			if warmed:
+				accCount = np.count_nonzero(window[beg:] == 0, axis=0)
+			else:
+				accCount = remain - self.wecount
+			accRate = accCount / remain
+			self.maxAccRate = np.maximum(self.maxAccRate, accRate)
+			dr = ((self.maxAccRate - accRate) > self.threshold).astype(int)
+			result = (accRate, dr)
+		return result
+
+	def __addEcdd(self, evalues):
+		"""
+		ECDD detection for all models
+	
+		Parameters
+			evalues : error value array
+		"""
+		self.count += 1
+		t = self.count
+		self.pr = self.pr * t / (t + 1) + evalues / (t + 1)
+		sd = self.pr * (1.0 - self.pr)
+		e = 1.0 - self.expf
+		sdz = np.sqrt(sd * self.expf * (1.0 - e ** (2 * t)) / (2.0 - self.expf))
+		self.z = (1 - self.expf) * self.z + self.expf * evalues
+		
+		res = None
+		if self.count > self.warmUp:
+			pr = self.pr
+			if self.fprate == 100:
+				cl = 2.76 - 6.23 * pr + 18.12 * pr ** 3 - 312.45 * pr ** 5 + 1002.18 + pr ** 7
+			elif self.fprate == 400:
+				cl = 3.97 - 6.56 * pr + 48.73 * pr ** 3 - 330.13 * pr ** 5 + 848.18 + pr ** 7
+			else:
+				exitWithMsg("invalid false positive rate")	
+			dr = (self.z > pr + cl * sdz).astype(int)
+			res = (self.z.copy(), dr)
+		return res
+
+	def save(self, fpath):
+		"""
+		save state for all models, in the same format as MultiSupConceptDrift
+		
+		Parameters
+			fpath : file path for model checkpointing
+		"""
+		agdet = dict()
+		agdet["labels"] = self.labels
+		agdet["detype"] = self.detype
+		saveObject(agdet, fpath + "_aggr.mod")
+		for i, la in enumerate(self.labels):
+			ws = dict()
+			ws["warmUp"] = self.warmUp
+			if self.detype == "ecdd":
+				ws["count"] = self.count
+				ws["pr"] = float(self.pr[i])
+				ws["expf"] = self.expf
+				ws["z"] = float(self.z[i])
+				ws["fprate"] = self.fprate
+			else:
+				ws["warmedUp"] = self.warmedUp
+				ws["wsize"] = self.wsize
+				ws["wpsize"] = self.wpsize
+				if self.detype == "ddm":
+					ws["threshold"] = self.threshold
+					ws["prMin"] = float(self.prMin[i])
+					ws["sdMin"] = float(self.sdMin[i])
+				elif self.detype == "eddm":
+					ws["threshold"] = self.threshold
+					ws["diMeanMax"] = float(self.diMeanMax[i])
+					ws["diSdMax"] = float(self.diSdMax[i])
+					ws["maxLim"] = float(self.maxLim[i])
+				else:
+					ws["confLevel"] = self.confLevel
+					ws["maxAccRate"] = float(self.maxAccRate[i])
+			saveObject(ws, fpath + "_" + la + ".mod")
+
+	@classmethod
+	def restore(cls, fpath):
+		"""
+		factory method to restore state for all models, saved by this class or MultiSupConceptDrift
+	
+		Parameters
+			fpath : file path for saved model
+		"""
+		agdet = restoreObject(fpath + "_aggr.mod")
+		engine = cls(agdet["labels"], agdet["detype"])
+		wss = [restoreObject(fpath + "_" + la + ".mod") for la in engine.labels]
+		ws = wss[0]
+		if engine.detype == "ecdd":
+			engine.create(ws["warmUp"], expf=ws["expf"], fprate=ws["fprate"])
+			engine.count = ws["count"]
+			engine.pr = np.array([w["pr"] for w in wss])
+			engine.z = np.array([w["z"] for w in wss])
+		else:
+			threshold = ws.get("threshold", 0.8)
+			confLevel = ws.get("confLevel", 0.2)
+			engine.create(ws["warmUp"], ws["wsize"], ws["wpsize"], threshold, confLevel)
+			engine.warmedUp = ws["warmedUp"]
+			if engine.detype == "ddm":
+				engine.prMin = np.array([w["prMin"] for w in wss])
+				engine.sdMin = np.array([w["sdMin"] for w in wss])
+			elif engine.detype == "eddm":
+				engine.diMeanMax = np.array([w["diMeanMax"] for w in wss])
+				engine.diSdMax = np.array([w["diSdMax"] for w in wss])
+				engine.maxLim = np.array([w["maxLim"] for w in wss])
+			else:
+				engine.maxAccRate = np.array([w["maxAccRate"] for w in wss])
+		return engine
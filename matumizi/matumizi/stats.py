@@ -20,10 +20,11 @@ import random
 import time
 import math
 import numpy as np
-from scipy import stats
 import statistics 
 from .util import *
 
+stats = LazyImport("scipy.stats")
+
 """
 histogram class
 """
@@ -391,18 +392,118 @@ class RunningStat:
 		s = (self.count, self.sum, self.sumSq)
 		return s
 		
+class RingBuffer:
+	"""
+	array backed fixed size window of values. Values are kept contiguous in a buffer twice 
+	the window size and compacted when the end of buffer is reached, so that the window is 
+	always available as an array view
+	"""
+	__slots__ = ("size", "buf", "end", "count")
+	
+	def __init__(self, size, dtype=float):
+		"""
+		initializer
+		
+		Parameters
+			size : window size
+			dtype : value data type
+		"""
+		self.size = size
+		self.buf = np.zeros(2 * size, dtype=dtype)
+		self.end = 0
+		self.count = 0
+	
+	def add(self, value):
+		"""
+		adds new value, returning value removed from the window if the window was full
+		
+		Parameters
+			value : value to add
+		"""
+		old = None
+		if self.count == self.size:
+			old = self.buf[self.end - self.size].item()
+		else:
+			self.count += 1
+		if self.end == len(self.buf):
+			self.__compact(self.size - 1)
+		self.buf[self.end] = value
+		self.end += 1
+		return old
+	
+	def extend(self, values):
+		"""
+		adds array of values, returning values removed from the window 
+		
+		Parameters
+			values : values to add
+		"""
+		values = np.asarray(values)
+		size = len(values)
+		nold = max(self.count + size - self.size, 0)
+		old = self.get()[:nold].copy()
+		if size >= self.size:
+			self.buf[:self.size] = values[-self.size:]
+			self.end = self.size
+			self.count = self.size
+		else:
+			if self.end + size > len(self.buf):
+				self.__compact(self.count - nold)
+			self.buf[self.end:self.end + size] = values
+			self.end += size
+			self.count = min(self.count + size, self.size)
+		return old
+	
+	def get(self):
+		"""
+		returns window values, oldest first, as array view
+		"""
+		return self.buf[self.end - self.count:self.end]
+	
+	def getCount(self):
+		"""
+		returns number of values in window
+		"""
+		return self.count
+	
+	def isFull(self):
+		"""
+		returns True if window is full
+		"""
+		return self.count == self.size
+	
+	def clear(self):
+		"""
+		removes all values
+		"""
+		self.end = 0
+		self.count = 0
+	
+	def __compact(self, nkeep):
+		"""
+		moves latest values to beginning of buffer
+		
+		Parameters
+			nkeep : number of latest values to keep
+		"""
+		if nkeep > 0:
+			self.buf[:nkeep] = self.buf[self.end - nkeep:self.end].copy()
+		self.end = nkeep
+
 class SlidingWindowStat:
 	"""
-	sliding window stats
+	sliding window stats, with mean and variance updated incrementally (Welford)
 	"""
+	__slots__ = ("count", "values", "mean", "m2")
+	
 	def __init__(self):
 		"""
 		initializer
 		"""
-		self.sum = 0.0
-		self.sumSq = 0.0
 		self.count = 0
 		self.values = None
+		self.mean = 0.0
+		self.m2 = 0.0
 	
 	@staticmethod
 	def create(values, sum, sumSq):
@@ -410,14 +511,14 @@ class SlidingWindowStat:
     	creates iinstance	
      	
 		Parameters
+			values : list of values
 			sum : sum of values
 			sumSq : sum of valure squared
 		"""
-		sws = SlidingWindowStat()
-		sws.sum = sum
-		sws.sumSq = sumSq
-		self.values = values.copy()
-		sws.count = len(self.values)
+		sws = SlidingWindowStat.createEmpty(len(values))
+		sws.values.extend(values)
+		sws.mean = sum / sws.count
+		sws.m2 = max(sumSq - sum * sum / sws.count, 0.0)
 		return sws
 		
 	@staticmethod
@@ -428,12 +529,8 @@ class SlidingWindowStat:
 		Parameters
 			values : list of values
 		"""
-		sws = SlidingWindowStat()
-		sws.values = values.copy()
-		for v in sws.values:
-			sws.sum += v
-			sws.sumSq += v * v		
-		sws.count = len(sws.values)
+		sws = SlidingWindowStat.createEmpty(len(values))
+		sws.extend(values)
 		return sws
 
 	@staticmethod
@@ -446,7 +543,7 @@ class SlidingWindowStat:
 		"""
 		sws = SlidingWindowStat()
 		sws.count = count
-		sws.values = list()
+		sws.values = RingBuffer(count)
 		return sws
 
 	def add(self, value):
@@ -456,24 +553,60 @@ class SlidingWindowStat:
 		Parameters
 			value : value to add
 		"""
-		self.values.append(value)		
-		if len(self.values) > self.count:
-			self.sum += value - self.values[0]
-			self.sumSq += (value * value) - (self.values[0] * self.values[0])
-			self.values.pop(0)
+		old = self.values.add(value)
+		if old is None:
+			delta = value - self.mean
+			self.mean += delta / self.values.getCount()
+			self.m2 += delta * (value - self.mean)
 		else:
-			self.sum += value
-			self.sumSq += (value * value)
+			mean = self.mean + (value - old) / self.count
+			self.m2 += (value - old) * (value - mean + old - self.mean)
+			self.mean = mean
+	
+	def extend(self, values):
+		"""
+		adds array of values
 		
+		Parameters
+			values : values to add
+		"""
+		values = np.asarray(values, dtype=float)
+		if len(values) == 0:
+			return
+		n = self.values.getCount()
+		old = self.values.extend(values)
+		if len(values) >= self.count or len(old) == n:
+			#whole window replaced
+			window = self.values.get()
+			self.mean = window.mean()
+			self.m2 = ((window - window.mean()) ** 2).sum()
+			return
+		
+		if len(old) > 0:
+			#remove old values
+			no = len(old)
+			mo = old.mean()
+			nr = n - no
+			mr = (n * self.mean - no * mo) / nr
+			self.m2 -= ((old - mo) ** 2).sum() + no * nr / n * (mo - mr) ** 2
+			self.mean = mr
+			n = nr
+			
+		#add new values
+		nv = len(values)
+		mv = values.mean()
+		nt = n + nv
+		delta = mv - self.mean
+		self.mean += delta * nv / nt
+		self.m2 += ((values - mv) ** 2).sum() + delta * delta * n * nv / nt
 
 	def getStat(self):
 		"""
 		calculate mean and std deviation 
 		"""
-		mean = self.sum /self. count
-		t = self.sumSq / (self.count - 1) - mean * mean * self.count / (self.count - 1)
-		sd = math.sqrt(t)
-		re = (mean, sd)
+		n = self.values.getCount()
+		sd = math.sqrt(max(self.m2, 0.0) / (n - 1))
+		re = (self.mean, sd)
 		return re
 
 	def addGetStat(self,value):
@@ -494,13 +627,14 @@ class SlidingWindowStat:
 		"""
 		return count
 		"""
-		return len(self.values)
+		return self.values.getCount()
 		
 	def getState(self):
 		"""
 		return state
 		"""
-		s = (self.count, self.sum, self.sumSq)
+		n = self.values.getCount()
+		s = (self.count, self.mean * n, self.m2 + n * self.mean * self.mean)
 		return s
 
 class SlidingWindowAverage:
@@ -569,6 +703,270 @@ class SlidingWindowAverage:
 		
 		return bvalues, evalues
 		
+class QuantileSketch:
+	"""
+	mergeable quantile sketch with log scale buckets having bounded relative error for quantiles,
+	along with running moments. No of buckets for positive and for negative values is each bounded. 
+	Beyond the bound the lowest magnitude buckets are collapsed into one, after which relative error 
+	holds only for values of larger magnitude
+	"""
+	def __init__(self, relAcc=0.01, minValue=1.0e-9, maxBuckets=2048):
+		"""
+		initializer
+		
+		Parameters
+			relAcc : relative accuracy for quantiles
+			minValue : values with magnitude below this are counted as zero
+			maxBuckets : max no of buckets for positive and for negative values
+		"""
+		assertGreater(maxBuckets, 1, "max no of buckets should be greater than 1")
+		self.relAcc = relAcc
+		self.minValue = minValue
+		self.maxBuckets = maxBuckets
+		self.gamma = (1.0 + relAcc) / (1.0 - relAcc)
+		self.lgamma = math.log(self.gamma)
+		self.posBuckets = dict()
+		self.negBuckets = dict()
+		
+		#lowest bucket key after collapse, lower keys are mapped to it
+		self.posFloor = None
+		self.negFloor = None
+		self.zeroCount = 0
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = None
+		self.max = None
+		
+	def add(self, value):
+		"""
+		adds new value
+		
+		Parameters
+			value : value to add
+		"""
+		if value > self.minValue:
+			k = math.ceil(math.log(value) / self.lgamma)
+			if self.posFloor is not None and k < self.posFloor:
+				k = self.posFloor
+			self.posBuckets[k] = self.posBuckets.get(k, 0) + 1
+			if len(self.posBuckets) > self.maxBuckets:
+				self.posFloor = self.__collapse(self.posBuckets)
+		elif value < -self.minValue:
+			k = math.ceil(math.log(-value) / self.lgamma)
+			if self.negFloor is not None and k < self.negFloor:
+				k = self.negFloor
+			self.negBuckets[k] = self.negBuckets.get(k, 0) + 1
+			if len(self.negBuckets) > self.maxBuckets:
+				self.negFloor = self.__collapse(self.negBuckets)
+		else:
+			self.zeroCount += 1
+		
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+		self.min = value if self.min is None else min(self.min, value)
+		self.max = value if self.max is None else max(self.max, value)
+		
+	def addMany(self, values):
+		"""
+		adds array of values
+		
+		Parameters
+			values : values to add
+		"""
+		values = np.asarray(values, dtype=float).ravel()
+		if len(values) == 0:
+			return
+		self.posFloor = self.__addBuckets(self.posBuckets, values[values > self.minValue], self.posFloor)
+		self.negFloor = self.__addBuckets(self.negBuckets, -values[values < -self.minValue], self.negFloor)
+		self.zeroCount += np.count_nonzero(np.abs(values) <= self.minValue)
+		
+		mean = np.mean(values)
+		m2 = np.sum((values - mean) ** 2)
+		self.__mergeMoments(len(values), mean, m2, np.min(values), np.max(values))
+		
+	def __addBuckets(self, buckets, values, floor):
+		"""
+		adds positive values to buckets, returns lowest bucket key after collapse
+		
+		Parameters
+			buckets : bucket counts
+			values : positive values
+			floor : lowest bucket key after collapse
+		"""
+		keys = np.ceil(np.log(values) / self.lgamma).astype(int)
+		if floor is not None:
+			keys = np.maximum(keys, floor)
+		keys, counts = np.unique(keys, return_counts=True)
+		for k, c in zip(keys.tolist(), counts.tolist()):
+			buckets[k] = buckets.get(k, 0) + c
+		if len(buckets) > self.maxBuckets:
+			floor = self.__collapse(buckets)
+		return floor
+	
+	def __collapse(self, buckets):
+		"""
+		collapses lowest buckets into one to bring no of buckets down to max, returns the key of 
+		the collapsed bucket
+		
+		Parameters
+			buckets : bucket counts
+		"""
+		keys = sorted(buckets.keys())
+		n = len(keys) - self.maxBuckets
+		floor = keys[n]
+		for k in keys[:n]:
+			buckets[floor] += buckets.pop(k)
+		return floor
+	
+	def __mergeMoments(self, count, mean, m2, minv, maxv):
+		"""
+		merges moments of another set of values
+		
+		Parameters
+			count : count of values
+			mean : mean of values
+			m2 : sum of squared deviation from mean
+			minv : min value
+			maxv : max value
+		"""
+		tcount = self.count + count
+		delta = mean - self.mean
+		self.mean += delta * count / tcount
+		self.m2 += m2 + delta * delta * self.count * count / tcount
+		self.count = tcount
+		self.min = minv if self.min is None else min(self.min, minv)
+		self.max = maxv if self.max is None else max(self.max, maxv)
+		
+	def merge(self, other):
+		"""
+		merges another sketch with same relative accuracy
+		
+		Parameters
+			other : other sketch
+		"""
+		assertEqual(self.gamma, other.gamma, "sketches with different relative accuracy can not be merged")
+		if other.count == 0:
+			return
+		self.posFloor = self.__mergeBuckets(self.posBuckets, other.posBuckets, self.posFloor)
+		self.negFloor = self.__mergeBuckets(self.negBuckets, other.negBuckets, self.negFloor)
+		self.zeroCount += other.zeroCount
+		self.__mergeMoments(other.count, other.mean, other.m2, other.min, other.max)
+		
+	def __mergeBuckets(self, buckets, obuckets, floor):
+		"""
+		merges buckets of another sketch, returns lowest bucket key after collapse
+		
+		Parameters
+			buckets : bucket counts
+			obuckets : bucket counts of other sketch
+			floor : lowest bucket key after collapse
+		"""
+		for k, c in obuckets.items():
+			if floor is not None and k < floor:
+				k = floor
+			buckets[k] = buckets.get(k, 0) + c
+		if len(buckets) > self.maxBuckets:
+			floor = self.__collapse(buckets)
+		return floor
+		
+	def getDistr(self):
+		"""
+		returns list of (value, count) for buckets in ascending order of value
+		"""
+		distr = list()
+		for k in sorted(self.negBuckets.keys(), reverse=True):
+			distr.append((-self.__bucketValue(k), self.negBuckets[k]))
+		if self.zeroCount > 0:
+			distr.append((0.0, self.zeroCount))
+		for k in sorted(self.posBuckets.keys()):
+			distr.append((self.__bucketValue(k), self.posBuckets[k]))
+		return distr
+	
+	def __bucketValue(self, k):
+		"""
+		representative value of a bucket
+		
+		Parameters
+			k : bucket key
+		"""
+		return 2.0 * math.pow(self.gamma, k) / (self.gamma + 1.0)
+	
+	def getQuantile(self, q):
+		"""
+		returns approximate quantile
+		
+		Parameters
+			q : quantile as fraction
+		"""
+		assertWithinRange(q, 0.0, 1.0, "invalid quantile")
+		assertGreater(self.count, 0, "no values in sketch")
+		if q == 0.0:
+			return self.min
+		if q == 1.0:
+			return self.max
+		rank = q * (self.count - 1)
+		cum = 0
+		value = self.max
+		for v, c in self.getDistr():
+			cum += c
+			if cum > rank:
+				value = v
+				break
+		return min(max(value, self.min), self.max)
+	
+	def getCumDistr(self, value):
+		"""
+		returns approximate fraction of values less than given value
+		
+		Parameters
+			value : value
+		"""
+		count = 0
+		for v, c in self.getDistr():
+			if v >= value:
+				break
+			count += c
+		return count / self.count if self.count > 0 else 0.0
+		
+	def getCount(self):
+		"""
+		return count
+		"""
+		return self.count
+	
+	def getSum(self):
+		"""
+		return sum
+		"""
+		return self.mean * self.count
+	
+	def getMean(self):
+		"""
+		return mean
+		"""
+		return self.mean
+	
+	def getStdDev(self):
+		"""
+		return sample std deviation
+		"""
+		return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+	
+	def getMin(self):
+		"""
+		return min
+		"""
+		return self.min
+		
+	def getMax(self):
+		"""
+		return max
+		"""
+		return self.max
+		
 def basicStat(ldata):
 	"""
 	mean and std dev
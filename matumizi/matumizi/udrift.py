@@ -18,20 +18,19 @@
 import os
 import sys
 import math
-import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib
-from sklearn.neighbors import KDTree
 import random
 import jprops
 import statistics as stat
-from matplotlib import pyplot
-from sklearn.decomposition import PCA
 from .util import *
 from .mlutil import *
 from .sampler import *
 from .stats import *
 
+KDTree = LazyImport("sklearn.neighbors", "KDTree")
+PCA = LazyImport("sklearn.decomposition", "PCA")
+pyplot = LazyImport("matplotlib.pyplot")
+
 """
 data or label drift detection
 """
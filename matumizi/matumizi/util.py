@@ -16,6 +16,10 @@
 
 import os
 import sys
+import re
+import csv
+import glob
+import hashlib
 from random import randint
 import random
 import time
@@ -23,17 +27,61 @@ import uuid
 import statistics 
 from datetime import datetime
 import math
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib import cm
-from matplotlib.ticker import LinearLocator
-from mpl_toolkits import mplot3d
+import importlib
 import numpy as np
 import logging
 import logging.handlers
 import pickle
 from contextlib import contextmanager
+from collections import OrderedDict
+
+class LazyImport:
+	"""
+	proxy for a module or a module attribute, imported on first use so that heavy optional
+	dependencies are loaded only by code that needs them
+	"""
+	def __init__(self, modName, attrName=None):
+		"""
+		initializer
+		
+		Parameters
+			modName : module name
+			attrName : attribute name within module, if not module itself
+		"""
+		self.__dict__["modName"] = modName
+		self.__dict__["attrName"] = attrName
+		self.__dict__["obj"] = None
+	
+	def load(self):
+		"""
+		imports if not already imported and returns module or attribute
+		"""
+		obj = self.__dict__["obj"]
+		if obj is None:
+			obj = importlib.import_module(self.modName)
+			if self.attrName is not None:
+				obj = getattr(obj, self.attrName)
+			self.__dict__["obj"] = obj
+		return obj
+	
+	def __getattr__(self, name):
+		return getattr(self.load(), name)
+	
+	def __setattr__(self, name, value):
+		setattr(self.load(), name, value)
+	
+	def __call__(self, *args, **kwargs):
+		return self.load()(*args, **kwargs)
+		
+	def __repr__(self):
+		name = self.modName if self.attrName is None else self.modName + "." + self.attrName
+		return "lazy import of " + name
+
+pd = LazyImport("pandas")
+plt = LazyImport("matplotlib.pyplot")
+cm = LazyImport("matplotlib.cm")
+LinearLocator = LazyImport("matplotlib.ticker", "LinearLocator")
+mplot3d = LazyImport("mpl_toolkits.mplot3d")
 
 tokens = ["0","1","2","3","4","5","6","7","8","9","A","B","C","D","E","F","G","H","I","J","K","L","M",
 	"N","O","P","Q","R","S","T","U","V","W","X","Y","Z","0","1","2","3","4","5","6","7","8","9"]
@@ -950,11 +998,7 @@ def getFileColumnAsString(dirPath, index, delim=","):
 		index : index
 		delim : delemeter
 	"""
-	fields = list()
-	for rec in fileRecGen(dirPath, delim):
-		fields.append(rec[index])	
-	#print(fields)	
-	return fields
+	return fileColumnCache.get(dirPath, delim).getStringColumn(index).tolist()
 
 def getFileColumnsAsString(dirPath, indexes, delim=","):
 	"""
@@ -966,12 +1010,8 @@ def getFileColumnsAsString(dirPath, indexes, delim=","):
 		delim : delemeter
 
 	"""
-	nindex = len(indexes)
-	columns = list(map(lambda i : list(), range(nindex)))
-	for rec in fileRecGen(dirPath, delim):
-		for i in range(nindex):
-			columns[i].append(rec[indexes[i]])	
-	return columns
+	cfile = fileColumnCache.get(dirPath, delim)
+	return list(map(lambda i : cfile.getStringColumn(i).tolist(), indexes))
 
 def getFileColumnAsFloat(dirPath, cindex, delim=","):
 	"""
@@ -983,9 +1023,18 @@ def getFileColumnAsFloat(dirPath, cindex, delim=","):
 		delim : delemeter
 
 	"""
-	#print("{}  {}".format(dirPath, index))
-	fields = getFileColumnAsString(dirPath, cindex, delim)
-	return list(map(lambda v:float(v), fields))
+	return fileColumnCache.get(dirPath, delim).getFloatColumn(cindex).tolist()
+
+def getFileColumnAsFloatArray(dirPath, cindex, delim=","):
+	"""
+	get float fileds from a file as read only array
+	
+	Parameters
+		dirPath : file path
+		cindex : column index
+		delim : delemeter
+	"""
+	return fileColumnCache.get(dirPath, delim).getFloatColumn(cindex)
 	
 def getFileColumnAsInt(dirPath, index, delim=","):
 	"""
@@ -996,8 +1045,7 @@ def getFileColumnAsInt(dirPath, index, delim=","):
 		index : index
 		delim : delemeter
 	"""
-	fields = getFileColumnAsString(dirPath, index, delim)
-	return list(map(lambda v:int(v), fields))
+	return fileColumnCache.get(dirPath, delim).getIntColumn(index).tolist()
 
 def getFileAsIntMatrix(dirPath, columns, delim=","):
 	"""
@@ -1009,10 +1057,12 @@ def getFileAsIntMatrix(dirPath, columns, delim=","):
 		columns : indexes of columns
 		delim : delemeter
 	"""
-	mat = list()
-	for rec in  fileSelFieldsRecGen(dirPath, columns, delim):
-		mat.append(asIntList(rec))
-	return mat
+	if type(columns) == str:
+		columns = strToIntArray(columns, delim)
+	cfile = fileColumnCache.get(dirPath, delim)
+	cfile.prefetch(columns)
+	cols = list(map(lambda c : cfile.getIntColumn(c), columns))
+	return np.column_stack(cols).tolist() if len(cols) > 0 else list()
 
 def getFileAsFloatMatrix(dirPath, columns, delim=","):
 	"""
@@ -1024,10 +1074,12 @@ def getFileAsFloatMatrix(dirPath, columns, delim=","):
 		columns : indexes of columns
 		delim : delemeter
 	"""
-	mat = list()
-	for rec in  fileSelFieldsRecGen(dirPath, columns, delim):
-		mat.append(asFloatList(rec))
-	return mat
+	if type(columns) == str:
+		columns = strToIntArray(columns, delim)
+	cfile = fileColumnCache.get(dirPath, delim)
+	cfile.prefetch(columns)
+	cols = list(map(lambda c : cfile.getFloatColumn(c), columns))
+	return np.column_stack(cols).tolist() if len(cols) > 0 else list()
 	
 def getFileAsFloatColumn(dirPath):
 	"""
@@ -2210,6 +2262,8 @@ def surfacePlot(x,y,z,xlabel,ylabel,zlabel):
 		ylabel : y label
 		zlabel : z label
 	"""
+	#registers 3d projection
+	mplot3d.load()
 	fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
 	y,x = np.meshgrid(y,x)
 	surf = ax.plot_surface(x, y, z, cmap=cm.coolwarm,linewidth=0, antialiased=False)
@@ -2562,3 +2616,342 @@ class DummyVarGenerator:
 		return encRow
 		
 		
+
+class ColumnarFile:
+	"""
+	delim separated file parsed into columns as requested, with numeric column types inferred. Float and 
+	int columns can also be saved as .npy files in a cache directory and memory mapped, keyed by file path, 
+	modification time and size, so that later runs don't parse the file at all. Rows with more fields than 
+	the first row are allowed. Negative column indexes count from the end of each row, with lines split 
+	in python when rows don't all have the same num of fields
+	"""
+	def __init__(self, fpath, delim=",", cacheDir=None, cache=None):
+		"""
+		initializer
+		
+		Parameters
+			fpath : file path
+			delim : delemeter
+			cacheDir : directory for .npy column cache
+			cache : columnar file cache holding this file, told when memory size grows
+		"""
+		self.fpath = os.path.abspath(fpath)
+		self.delim = delim
+		self.cacheDir = cacheDir
+		self.cache = cache
+		fstat = os.stat(self.fpath)
+		self.stamp = (fstat.st_mtime_ns, fstat.st_size)
+		self.ncol = None
+		self.ragged = None
+		self.parsed = dict()
+		self.strColumns = dict()
+		self.typedColumns = dict()
+		self.memSize = 0
+	
+	def isStale(self):
+		"""
+		True if file modified since parsed
+		"""
+		fstat = os.stat(self.fpath)
+		return (fstat.st_mtime_ns, fstat.st_size) != self.stamp
+	
+	def getNumColumns(self):
+		"""
+		num of columns as in the first line
+		"""
+		if self.ncol is None:
+			with open(self.fpath, "r") as fp:
+				line = fp.readline().rstrip("\r\n")
+			self.ncol = len(line.split(self.delim)) if len(line) > 0 else 0
+		return self.ncol
+	
+	def isRagged(self):
+		"""
+		True if rows don't all have the same num of fields
+		"""
+		if self.ragged is None:
+			ndelim = None
+			self.ragged = False
+			with open(self.fpath, "r") as fp:
+				for line in fp:
+					n = line.count(self.delim)
+					if ndelim is None:
+						ndelim = n
+					elif n != ndelim:
+						self.ragged = True
+						break
+		return self.ragged
+	
+	def getMemSize(self):
+		"""
+		approximate memory size in bytes of columns held in memory, memory mapped columns excluded
+		"""
+		return self.memSize
+	
+	def prefetch(self, indexes):
+		"""
+		parses columns not parsed yet in one pass over the file
+		
+		Parameters
+			indexes : column indexes, negative counting from end
+		"""
+		if self.stamp[1] == 0:
+			return
+		indexes = list(map(lambda i : self.__colIndex(i), indexes))
+		indexes = list(filter(lambda i : i not in self.parsed and i not in self.strColumns and 
+		(i, typeFloat) not in self.typedColumns and (i, typeInt) not in self.typedColumns, indexes))
+		if len(indexes) > 1:
+			self.parsed.update(self.__readColumns(sorted(set(indexes)), False))
+	
+	def getStringColumn(self, index):
+		"""
+		string column as read only object array of field strings
+		
+		Parameters
+			index : column index, negative counting from end
+		"""
+		if self.stamp[1] == 0:
+			return np.empty(0, dtype=object)
+		index = self.__colIndex(index)
+		col = self.strColumns.get(index)
+		if col is None:
+			col = self.parsed.pop(index, None)
+			if col is None or col.dtype != object:
+				#numeric inferred columns parsed again as field strings
+				col = self.__readColumns([index], True)[index]
+			col.flags.writeable = False
+			self.strColumns[index] = col
+			self.__addMemSize(col.nbytes + sum(map(len, col)) + 49 * len(col))
+		return col
+	
+	def getFloatColumn(self, index):
+		"""
+		float column as read only array
+		
+		Parameters
+			index : column index, negative counting from end
+		"""
+		return self.__getTypedColumn(index, typeFloat)
+	
+	def getIntColumn(self, index):
+		"""
+		int column as read only array
+		
+		Parameters
+			index : column index, negative counting from end
+		"""
+		return self.__getTypedColumn(index, typeInt)
+	
+	def __getTypedColumn(self, index, dtype):
+		"""
+		typed column from memory, .npy cache or parsed data in that order
+		
+		Parameters
+			index : column index
+			dtype : data type
+		"""
+		if self.stamp[1] == 0:
+			return np.empty(0, dtype=np.float64 if dtype == typeFloat else np.int64)
+		index = self.__colIndex(index)
+		key = (index, dtype)
+		col = self.typedColumns.get(key)
+		if col is None:
+			cpath = self.__cachePath(index, dtype)
+			if cpath is not None and os.path.exists(cpath):
+				col = np.load(cpath, mmap_mode="r")
+				self.parsed.pop(index, None)
+			else:
+				col = self.parsed.pop(index, None)
+				if col is None:
+					col = self.__readColumns([index], False)[index]
+				if dtype == typeFloat and col.dtype.kind in "if":
+					col = col.astype(np.float64)
+				elif dtype == typeInt and col.dtype.kind == "i":
+					col = col.astype(np.int64)
+				else:
+					#not inferred as the type, converted same as float() or int() on field strings
+					scol = col if col.dtype == object else self.getStringColumn(index)
+					conv = float if dtype == typeFloat else int
+					ctype = np.float64 if dtype == typeFloat else np.int64
+					col = np.fromiter(map(conv, scol), dtype=ctype, count=len(scol))
+				if cpath is not None:
+					self.__save(cpath, col)
+					col = np.load(cpath, mmap_mode="r")
+			col.flags.writeable = False
+			self.typedColumns[key] = col
+			if not isinstance(col, np.memmap):
+				self.__addMemSize(col.nbytes)
+		return col
+	
+	def __addMemSize(self, size):
+		"""
+		adds to memory size and lets the cache enforce its bound
+		
+		Parameters
+			size : size in bytes
+		"""
+		self.memSize += size
+		if self.cache is not None:
+			self.cache.trim()
+	
+	def __readColumns(self, indexes, asString):
+		"""
+		parses columns in one pass, returning dictionary of column index and array. Only the given columns 
+		are converted. Lines are split in python when the parser rejects the file or for negative indexes, 
+		which are resolved for each row
+		
+		Parameters
+			indexes : column indexes, negative only for ragged file
+			asString : if True field strings otherwise with numeric type inferred
+		"""
+		try:
+			if min(indexes) < 0:
+				raise pd.errors.ParserError("negative column index")
+			if asString:
+				df = self.__read(usecols=indexes, dtype=str)
+				columns = dict(map(lambda i : (i, df[i].to_numpy(dtype=object)), indexes))
+			else:
+				df = self.__read(usecols=indexes, float_precision="round_trip")
+				columns = dict(map(lambda i : (i, df[i].to_numpy()), indexes))
+		except pd.errors.ParserError:
+			fields = dict(map(lambda i : (i, list()), indexes))
+			for rec in fileRecGen(self.fpath, self.delim):
+				for i in indexes:
+					fields[i].append(rec[i])
+			columns = dict(map(lambda i : (i, np.array(fields[i], dtype=object)), indexes))
+		return columns
+	
+	def __read(self, **kwargs):
+		"""
+		reads file with fields as they are, no quote, NA or blank line handling
+		
+		Parameters
+			kwargs : additional read parameters
+		"""
+		if len(self.delim) == 1:
+			sep, engine = self.delim, "c"
+		else:
+			sep, engine = re.escape(self.delim), "python"
+			kwargs.pop("float_precision", None)
+		return pd.read_csv(self.fpath, sep=sep, engine=engine, header=None, quoting=csv.QUOTE_NONE, na_filter=False, 
+		skip_blank_lines=False, **kwargs)
+	
+	def __colIndex(self, index):
+		"""
+		validated column index, non negative unless file is ragged
+		
+		Parameters
+			index : column index
+		"""
+		ncol = self.getNumColumns()
+		if index < -ncol or index >= ncol:
+			raise IndexError("column index {} out of range for {} columns".format(index, ncol))
+		return index if index < 0 and self.isRagged() else index % ncol
+	
+	def __cachePath(self, index, dtype):
+		"""
+		.npy cache file path for a column
+		
+		Parameters
+			index : column index
+			dtype : data type
+		"""
+		if self.cacheDir is None:
+			return None
+		fname = "{}_{}_{}_{}_{}.npy".format(self.__cacheKey(), self.stamp[0], self.stamp[1], index, dtype)
+		return os.path.join(self.cacheDir, fname)
+	
+	def __cacheKey(self):
+		"""
+		cache key for file path and delemeter
+		"""
+		return hashlib.md5((self.fpath + "|" + self.delim).encode()).hexdigest()
+	
+	def __save(self, cpath, col):
+		"""
+		saves column in .npy cache, removing cached columns for earlier versions of the file
+		
+		Parameters
+			cpath : .npy cache file path
+			col : column array
+		"""
+		os.makedirs(self.cacheDir, exist_ok=True)
+		stamp = "_{}_{}_".format(self.stamp[0], self.stamp[1])
+		for fpath in glob.glob(os.path.join(self.cacheDir, self.__cacheKey() + "_*.npy")):
+			if stamp not in os.path.basename(fpath):
+				os.remove(fpath)
+		
+		#written to temp file first for concurrent readers
+		tpath = "{}.{}.tmp".format(cpath, os.getpid())
+		with open(tpath, "wb") as fp:
+			np.save(fp, col)
+		os.replace(tpath, cpath)
+
+class ColumnarFileCache:
+	"""
+	LRU cache of columnar files, a file parsed again only when modified. Memory is bounded by num of 
+	files and by total size of columns held in memory
+	"""
+	def __init__(self, maxFiles=4, cacheDir=None, maxBytes=268435456):
+		"""
+		initializer
+		
+		Parameters
+			maxFiles : max num of files kept in memory, 0 for no caching
+			cacheDir : directory for .npy column cache, no disk cache if None
+			maxBytes : max total size in bytes of columns kept in memory
+		"""
+		self.maxFiles = maxFiles
+		self.cacheDir = cacheDir
+		self.maxBytes = maxBytes
+		self.files = OrderedDict()
+	
+	def configure(self, maxFiles=4, cacheDir=None, maxBytes=268435456):
+		"""
+		sets cache parameters, clearing files in memory
+		
+		Parameters
+			maxFiles : max num of files kept in memory, 0 for no caching
+			cacheDir : directory for .npy column cache, no disk cache if None
+			maxBytes : max total size in bytes of columns kept in memory
+		"""
+		self.maxFiles = maxFiles
+		self.cacheDir = cacheDir
+		self.maxBytes = maxBytes
+		self.clear()
+	
+	def get(self, fpath, delim=","):
+		"""
+		gets columnar file, parsing again if modified since last parsed
+		
+		Parameters
+			fpath : file path
+			delim : delemeter
+		"""
+		if self.maxFiles == 0:
+			return ColumnarFile(fpath, delim, self.cacheDir)
+		key = (os.path.abspath(fpath), delim)
+		cfile = self.files.pop(key, None)
+		if cfile is None or cfile.isStale():
+			cfile = ColumnarFile(fpath, delim, self.cacheDir, self)
+		self.files[key] = cfile
+		self.trim()
+		return cfile
+	
+	def trim(self):
+		"""
+		drops least recently used files until within num of files and size bounds. A file bigger than 
+		the size bound is dropped too, the caller still having its columns
+		"""
+		size = sum(map(lambda f : f.getMemSize(), self.files.values()))
+		while len(self.files) > self.maxFiles or (len(self.files) > 0 and size > self.maxBytes):
+			_, cfile = self.files.popitem(last=False)
+			size -= cfile.getMemSize()
+	
+	def clear(self):
+		"""
+		clears files in memory
+		"""
+		self.files.clear()
+
+fileColumnCache = ColumnarFileCache()
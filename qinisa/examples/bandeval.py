@@ -0,0 +1,133 @@
+#!/usr/local/bin/python3
+
+# avenir-python: Machine Learning
+# Author: Pranab Ghosh
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you
+# may not use this file except in compliance with the License. You may
+# obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+import random
+import math
+import numpy as np
+import argparse
+import functools
+from matumizi.util import *
+from matumizi.mlutil import *
+from matumizi.sampler import *
+from qinisa.mab import *
+from qinisa.cmab import *
+from qinisa.beval import *
+from qinisa.exprun import *
+
+"""
+Comparison of MAB and CMAB algorithms with logged decisions and with multi seed simulation
+"""
+
+def createPolicy(algo, actions, nfeat, ntplay):
+	"""
+	creates bandit policy
+
+	Parameters
+		algo : bandit algo
+		actions : action names
+		nfeat : feature size
+		ntplay : total num of plays
+	"""
+	if algo == "rg":
+		model = RandomGreedy(actions, 20, True, None, None, 0.8, "loglin")
+	elif algo == "ucb":
+		model = UpperConfBound(actions, 20, True, None, None)
+	elif algo == "ts":
+		model = ThompsonSampling(actions, 20, True, None, None)
+	elif algo == "exp3":
+		model = ExponentialWeight(actions, 20, True, None, None, 0.2)
+	elif algo == "smix":
+		model = SoftMix(actions, 20, True, None, None, 0.6)
+	elif algo == "linucb":
+		model = LinUpperConfBound(actions, nfeat, ntplay, reg=1.0, pthresh=0.05)
+	elif algo == "lints":
+		model = LinThompsonSampling(actions, nfeat, 0.1, 0.5, 0.05)
+	elif algo == "dlinucb":
+		model = DisjointLinUpperConfBound(actions, nfeat, 0.5)
+	else:
+		exitWithMsg("invalid bandit algo " + algo)
+	return model
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--op', type=str, default = "eval", help = "operation")
+	parser.add_argument('--algos', type=str, default = "rg,ucb,ts,exp3,smix", help = "comma separated bandit algos")
+	parser.add_argument('--naction', type=int, default = 5, help = "num of actions")
+	parser.add_argument('--nfeat', type=int, default = 4, help = "feature size")
+	parser.add_argument('--nevent', type=int, default = 10000, help = "num of logged events")
+	parser.add_argument('--bsize', type=int, default = 1, help = "num of events decided together")
+	parser.add_argument('--rstep', type=int, default = 1000, help = "num of events between regret curve points")
+	parser.add_argument('--logfp', type=str, default = "./output/bandlog.txt", help = "logged decisions file")
+	parser.add_argument('--nseed', type=int, default = 10, help = "num of seeds for multi seed runs")
+	parser.add_argument('--nworkers', type=int, default = 4, help = "num of worker processes")
+	parser.add_argument('--cpdir', type=str, default = "none", help = "checkpoint directory")
+	args = parser.parse_args()
+
+	actions = list(map(lambda i : "a" + str(i+1), range(args.naction)))
+	if args.op == "gen":
+		#uniform random logging policy, reward linear in action features plus noise
+		weights = np.random.uniform(0.1, 1.0, (args.naction, args.nfeat)) / args.nfeat
+		noise = NormalSampler(0, 0.05)
+		prob = 1.0 / args.naction
+		with open(args.logfp, "w") as fh:
+			for i in range(args.nevent):
+				feat = np.random.uniform(0.4, 1.0, (args.naction, args.nfeat))
+				ai = randomInt(0, args.naction - 1)
+				re = rangeLimit(np.dot(weights[ai], feat[ai]) + noise.sample(), 0, 1.0)
+				rec = [genID(10), actions[ai], "{:.3f}".format(re), "{:.6f}".format(prob)]
+				rec.append(floatArrayToString(feat.flatten()))
+				fh.write(",".join(rec) + "\n")
+
+	elif args.op == "eval":
+		policies = dict(map(lambda a : (a, createPolicy(a, actions, args.nfeat, args.nevent)), args.algos.split(",")))
+		evaluator = ReplayEvaluator(policies, actions, bsize=args.bsize, rstep=args.rstep)
+		report = evaluator.evaluate(args.logfp)
+
+		for algo, re in report.items():
+			print("{}  matched {}  replay reward {:.3f}  ips reward {:.3f}  snips reward {:.3f}  decisions per sec {:.0f}".format(algo,
+			re["matched"], re["replayReward"], re["ipsReward"], re["snipsReward"], re["decPerSec"]))
+			for c in re["curve"]:
+				print("events {}  replay reward {:.3f}  ips reward {:.3f}  regret {}".format(c[0], c[1], c[2],
+				"none" if c[3] is None else "{:.3f}".format(c[3])))
+
+	elif args.op == "mseed":
+		#simulated environment with multiple seeds
+		mparams = {"rg" : ("RandomGreedy", [0.8, "loglin"]), "ucb" : ("UpperConfBound", []), "ts" : ("ThompsonSampling", []), 
+		"exp3" : ("ExponentialWeight", [0.2]), "smix" : ("SoftMix", [0.6])}
+		configs = list()
+		for algo in args.algos.split(","):
+			assertInList(algo, list(mparams.keys()), "multi seed comparison supported for MAB only")
+			cls, params = mparams[algo]
+			configs.append({"name" : algo, "module" : "mab", "algo" : cls, "args" : [actions, 20, True, None, None] + params})
+		means = list(map(lambda i : 0.3 + 0.4 * i / args.naction, range(args.naction)))
+		envFun = functools.partial(SimBanditEnv, actions, means, 0.1)
+		cpDir = None if args.cpdir == "none" else args.cpdir
+		runner = ExperimentRunner(configs, envFun, range(args.nseed), args.nevent, rstep=args.rstep, nworkers=args.nworkers, cpDir=cpDir)
+		results = runner.run()
+		
+		for algo, re in results.items():
+			print("{}  num of runs {}".format(algo, re["nrun"]))
+			for j, step in enumerate(re["steps"]):
+				rw = re["reward"]
+				rg = re["regret"]
+				print("steps {}  reward {:.3f} ({:.3f} {:.3f})  regret {:.3f} ({:.3f} {:.3f})".format(step, rw[0][j], rw[1][j], rw[2][j], 
+				rg[0][j], rg[1][j], rg[2][j]))
+
+	else:
+		exitWithMsg("invalid operation " + args.op)
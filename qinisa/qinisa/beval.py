@@ -0,0 +1,226 @@
+#!/usr/local/bin/python3
+
+# Author: Pranab Ghosh
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you
+# may not use this file except in compliance with the License. You may
+# obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+import time
+import math
+import numpy as np
+from matumizi.util import *
+from .rlba import *
+
+"""
+Offline evaluation of multi arm bandit and contextual multi arm bandit with logged decisions
+"""
+
+class PolicyEvalStat:
+	"""
+	evaluation stats for a policy
+	"""
+
+	def __init__(self):
+		"""
+		initializer
+		"""
+		self.ndec = 0
+		self.nmatch = 0
+		self.treward = 0
+		self.ipsSum = 0
+		self.ipsWeight = 0
+		self.etime = 0
+		self.curve = list()
+
+	def getReplayReward(self):
+		"""
+		average reward for events where policy action matched logged action
+		"""
+		return self.treward / self.nmatch if self.nmatch > 0 else 0
+
+	def getIpsReward(self):
+		"""
+		inverse propensity score (IPS) and self normalized IPS estimate of policy average reward
+		"""
+		ips = self.ipsSum / self.ndec if self.ndec > 0 else 0
+		snips = self.ipsSum / self.ipsWeight if self.ipsWeight > 0 else 0
+		return (ips, snips)
+
+	def getDecisionRate(self):
+		"""
+		decisions per sec
+		"""
+		return self.ndec / self.etime if self.etime > 0 else 0
+
+class ReplayEvaluator:
+	"""
+	evaluates many bandit policies side by side in one pass over logged decisions, with replay i.e only
+	events where policy action matches logged action are rewarded and with inverse propensity score (IPS).
+	Each log record has decision ID, action, reward, logging policy probability for the action and optionally
+	context fields for contextual bandits
+	"""
+
+	def __init__(self, policies, actions, bsize=1, rstep=100, featFun=None):
+		"""
+		initializer
+
+		Parameters
+			policies : dictionary of policy name and policy object
+			actions : action names
+			bsize : num of logged events decided together, with rewards set after the whole batch
+			rstep : num of logged events between regret curve points
+			featFun : function to create contextual policy features from context fields, returning
+			features or tuple of shared features and features. Default is 1 row of features per action
+		"""
+		assertGreater(bsize, 0, "batch size should be positive")
+		self.policies = policies
+		self.actions = actions
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
+		self.bsize = bsize
+		self.rstep = rstep
+		self.featFun = (lambda ctx : np.array(ctx, dtype=float).reshape(len(actions), -1)) if featFun is None else featFun
+		self.stats = dict(map(lambda pn : (pn, PolicyEvalStat()), policies.keys()))
+		self.nevent = 0
+
+		#logged reward for each action, for regret of policies without their own
+		self.lreward = np.zeros(len(actions))
+		self.lcount = np.zeros(len(actions), dtype=np.int64)
+
+	def evaluate(self, fpath, delim=",", maxEvents=None):
+		"""
+		evaluates policies with logged decisions file and returns report
+
+		Parameters
+			fpath : logged decisions file path
+			delim : field delimiter
+			maxEvents : max num of logged events to use, all if None
+		"""
+		events = list()
+		for rec in fileRecGen(fpath, delim):
+			if maxEvents is not None and self.nevent + len(events) == maxEvents:
+				break
+			ctx = rec[4:]
+			feat = self.featFun(ctx) if len(ctx) > 0 else None
+			events.append((rec[0], rec[1], float(rec[2]), float(rec[3]), feat))
+			if len(events) == self.bsize:
+				self.addEvents(events)
+				events = list()
+		if len(events) > 0:
+			self.addEvents(events)
+		return self.getReport()
+
+	def addEvents(self, events):
+		"""
+		evaluates policies with a batch of logged events
+
+		Parameters
+			events : list of decision ID, action, reward, logging probability and features
+		"""
+		decIds = list(map(lambda e : e[0], events))
+		for ev in events:
+			i = self.aindex[ev[1]]
+			self.lreward[i] += ev[2]
+			self.lcount[i] += 1
+
+		for pname, policy in self.policies.items():
+			st = self.stats[pname]
+			stime = time.perf_counter()
+			anames = self.__decide(policy, events, decIds)
+
+			matched = list()
+			unmatched = list()
+			for aname, ev in zip(anames, events):
+				if aname == ev[1]:
+					matched.append((ev[0], ev[2]))
+					st.treward += ev[2]
+					st.ipsSum += ev[2] / ev[3]
+					st.ipsWeight += 1.0 / ev[3]
+				else:
+					unmatched.append(ev[0])
+			if len(matched) > 0:
+				policy.setRewards(matched)
+			policy.cancelDecisions(unmatched)
+			st.etime += time.perf_counter() - stime
+			st.ndec += len(events)
+			st.nmatch += len(matched)
+
+		nevent = self.nevent + len(events)
+		if int(nevent / self.rstep) > int(self.nevent / self.rstep):
+			for pname, policy in self.policies.items():
+				st = self.stats[pname]
+				st.curve.append((nevent, st.getReplayReward(), st.getIpsReward()[0], self.__getRegret(policy, st)))
+		self.nevent = nevent
+
+	def getReport(self):
+		"""
+		returns dictionary of policy name and dictionary of evaluation results
+		"""
+		report = dict()
+		for pname, policy in self.policies.items():
+			st = self.stats[pname]
+			ips, snips = st.getIpsReward()
+			re = dict()
+			re["events"] = st.ndec
+			re["matched"] = st.nmatch
+			re["replayReward"] = st.getReplayReward()
+			re["ipsReward"] = ips
+			re["snipsReward"] = snips
+			re["regret"] = self.__getRegret(policy, st)
+			re["decPerSec"] = st.getDecisionRate()
+			re["curve"] = st.curve
+			report[pname] = re
+		return report
+
+	def __decide(self, policy, events, decIds):
+		"""
+		decisions of a policy for a batch of logged events, returns action names
+
+		Parameters
+			policy : policy object
+			events : list of logged events
+			decIds : decision ID list
+		"""
+		if isinstance(policy, MultiArmBandit):
+			decisions = policy.getDecisions(len(events), decIds)
+			anames = list(map(lambda d : d[1], decisions))
+		elif hasattr(policy, "getDecisions"):
+			feats = list(map(lambda e : e[4], events))
+			if isinstance(feats[0], tuple):
+				feats = tuple(map(lambda j : np.array(list(map(lambda f : f[j], feats))), range(len(feats[0]))))
+			else:
+				feats = (np.array(feats),)
+			decisions = policy.getDecisions(*feats, decIds=decIds)
+			anames = list(map(lambda d : d[1], decisions))
+		else:
+			anames = list()
+			for ev in events:
+				feat = ev[4] if isinstance(ev[4], tuple) else (ev[4],)
+				anames.append(policy.getDecision(*feat, decId=ev[0])[1])
+		return anames
+
+	def __getRegret(self, policy, st):
+		"""
+		regret of a policy, with policy getRegret if available otherwise against best logged action
+
+		Parameters
+			policy : policy object
+			st : policy evaluation stats
+		"""
+		if st.nmatch == 0:
+			return None
+		if isinstance(policy, MultiArmBandit):
+			return policy.getRegret()[2]
+		lavr = np.zeros(len(self.actions))
+		np.divide(self.lreward, self.lcount, out=lavr, where=self.lcount > 0)
+		return float(lavr.max()) - st.getReplayReward()
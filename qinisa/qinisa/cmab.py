@@ -22,10 +22,37 @@ import numpy as np
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.sampler import *
+from .rlba import *
 
 """
 Contextual multi arm bandit
 """
+def rankOneInvUpdate(inva, x):
+	"""
+	Sherman Morrison update of matrix inverse in place, for outer product of x added to the matrix
+	
+	Parameters
+		inva : matrix inverse
+		x : vector
+	"""
+	u = np.matmul(inva, x)
+	inva -= np.outer(u, u) / (1.0 + np.dot(x, u))
+
+def lowRankInvUpdate(inva, x):
+	"""
+	Woodbury update of matrix inverse in place, for x.T * x added to the matrix
+	
+	Parameters
+		inva : matrix inverse
+		x : matrix with one vector per row
+	"""
+	if len(x) == 1:
+		rankOneInvUpdate(inva, x[0])
+	else:
+		u = np.matmul(x, inva)
+		s = np.identity(len(x)) + np.matmul(u, x.T)
+		inva -= np.matmul(u.T, np.linalg.solve(s, u))
+
 class LinUpperConfBound(object):
 	"""
 	linear upper conf bound multi arm bandit (lin ucb1)
@@ -49,6 +76,7 @@ class LinUpperConfBound(object):
 		"""
 		self.actions = actions
 		self.naction = len(actions)
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
 		self.totPlays = totPlays
 		self.nfeat = nfeat
 		self.reg = reg
@@ -58,7 +86,11 @@ class LinUpperConfBound(object):
 		self.b = np.zeros(nfeat) if b is None else b
 		self.horizon = horizon
 		self.alpha = 1 + sqrt(0.5 * math.log(2 * horizon * self.naction / pthresh)) if alpha is None else alpha
-		self.sactions = dict()
+		self.pending = PendingDecisions()
+		
+		#inverse of a updated incrementally and linear params
+		self.inva = np.linalg.inv(self.a)
+		self.theta = np.matmul(self.inva, self.b)
 		
 		self.logger = None
 		if logFilePath is not None: 		
@@ -72,48 +104,92 @@ class LinUpperConfBound(object):
 		Parameters
 			features : features for all actions with 1 row per action
 		"""
-		inva = np.linalg.inv(self.a)
-		theta = np.matmul(inva, self.b)
-		
-		sact = None
-		smax = None
-		saf = None
-		for i in range(np.shape(features)[0]):
-			af = features[i]
-			af = np.array(af)
-			aft = np.transpose(af)
-			t = np.matmul(aft, inva)
-			t = np.matmul(t, af)
-			s = np.dot(aft, theta) + self.alpha * sqrt(t)
-			
-			if smax is None or s > smax:
-				smax = s
-				sact = self.actions[i]
-				saf = af	
-				
-		self.sactions[sact] = saf
+		return self.getDecision(features)[1]
+	
+	def getDecision(self, features, decId=None):
+		"""
+		next play return decision ID and selected action. Decision is kept pending until reward is set
+
+		Parameters
+			features : features for all actions with 1 row per action
+			decId : decision ID, generated if None
+		"""
+		#reward upper bound for all actions
+		features = np.asarray(features, dtype=float)
+		t = np.einsum("ij,jk,ik->i", features, self.inva, features, optimize=True)
+		scores = np.matmul(features, self.theta) + self.alpha * np.sqrt(np.maximum(t, 0))
+		i = scores.argmax()
+		smax = scores[i]
+		sact = self.actions[i]
+		
+		decId = self.pending.add(i, features[i].copy(), decId)
 		if self.logger is not None:
 			self.logger.info("play count {}  action {}  reward upper bound {:.3f}".format(self.totPlays + 1, sact,  smax))
 
 		self.totPlays += 1
-		return sact
+		return (decId, sact)
 		
 
 	def setReward(self, aname, reward):
 		"""
-		reward feedback for action
+		reward feedback for action, for the oldest pending decision of the action
 			
 		Parameters
 			aname : action name
 			reward : reward value
 		"""
-		af = self.sactions[aname]
-		aft = np.transpose(af)
-		self.a = np.add(self.a, np.matmul(af, aft))
-		self.b = np.add(self.b, af * reward)
+		dec = self.pending.popAction(self.aindex[aname])
+		assertNotNone(dec, "no pending decision for action " + aname)
+		af = dec[1]
+		self.__addRewards(af[np.newaxis], np.array([reward]))
 		if self.logger is not None:
 			self.logger.info("action {}  feature {}  actual reward {:.3f}".format(aname, floatArrayToString(af, delem=None), reward))
-		self.sactions.pop(aname)
+	
+	def cancelDecisions(self, decIds):
+		"""
+		cancels pending decisions that were not acted on, reversing their play counts. Returns num of 
+		decisions cancelled
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		found, _, _ = self.pending.popMany(decIds)
+		self.totPlays -= len(found)
+		return len(found)
+	
+	def setRewards(self, batch):
+		"""
+		reward feedback for many decisions together, possibly delayed. Rewards for decisions not 
+		pending any more are ignored. Returns num of rewards applied
+			
+		Parameters
+			batch : list of decision ID and reward value
+		"""
+		found, _, feats = self.pending.popMany(list(map(lambda dr : dr[0], batch)))
+		if len(found) > 0:
+			rewards = np.array(list(map(lambda dr : dr[1], batch)), dtype=float)[found]
+			self.__addRewards(np.array(feats), rewards)
+		if self.logger is not None:
+			self.logger.info("{} rewards applied out of {}".format(len(found), len(batch)))
+		return len(found)
+	
+	def __addRewards(self, feats, rewards):
+		"""
+		updates model with rewards
+			
+		Parameters
+			feats : features for rewarded actions with 1 row per reward
+			rewards : reward value array
+		"""
+		self.a = np.add(self.a, np.matmul(feats.T, feats))
+		self.b = np.add(self.b, np.matmul(rewards, feats))
+		
+		#inverse with low rank update unless there are more rewards than features
+		if len(feats) < self.nfeat:
+			lowRankInvUpdate(self.inva, feats)
+		else:
+			self.inva = np.linalg.inv(self.a)
+		self.theta = np.matmul(self.inva, self.b)
 	
 	def save(self, fpath):
 		"""
@@ -183,6 +259,7 @@ class LinThompsonSampling(object):
 		"""
 		self.actions = actions
 		self.naction = len(actions)
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
 		self.totPlays = 0 if totPlays is None else totPlays
 		self.nfeat = nfeat
 		self.subgaus = subgaus
@@ -192,7 +269,10 @@ class LinThompsonSampling(object):
 		self.mean = np.zeros(nfeat) if mean is None else mean
 		self.f = np.zeros(nfeat) if f is None else f
 		
-		self.sactions = dict()
+		#square root factor r of inverse of b i.e. r * r.T = inverse b, updated incrementally
+		self.r = np.linalg.inv(np.linalg.cholesky(self.b)).T
+		
+		self.pending = PendingDecisions()
 		
 		self.logger = None
 		if logFilePath is not None: 		
@@ -206,48 +286,96 @@ class LinThompsonSampling(object):
 		Parameters
 			features : features for all actions with 1 row per action
 		"""
+		return self.getDecision(features)[1]
+	
+	def getDecision(self, features, decId=None):
+		"""
+		next play return decision ID and selected action. Decision is kept pending until reward is set
+
+		Parameters
+			features : features for all actions with 1 row per action
+			decId : decision ID, generated if None
+		"""
 		self.totPlays += 1
 		v = self.subgaus *  sqrt(24 * self.nfeat * math.log(self.totPlays  / self.pthresh) / self.eps)
-		v2 = v * v
-		invb = np.linalg.inv(self.b)
-		sd = invb * v2
-		mu = np.random.multivariate_normal(self.mean, sd)
-		sact = None
-		smax = None
-		saf = None
-		for i in range(np.shape(features)[0]):
-			af = features[i]
-			af = np.array(af)
-			aft = np.transpose(af)
-			s = np.dot(aft, mu)
-			
-			if smax is None or s > smax:
-				smax = s
-				sact = self.actions[i]
-				saf = af	
+		
+		#sample is v * r * standard normal, covariance v^2 * inverse b
+		mu = self.mean + v * np.matmul(self.r, np.random.standard_normal(self.nfeat))
+		
+		#expected reward for all actions
+		features = np.asarray(features, dtype=float)
+		scores = np.matmul(features, mu)
+		i = scores.argmax()
+		smax = scores[i]
+		sact = self.actions[i]
 
-		self.sactions[sact] = saf
+		decId = self.pending.add(i, features[i].copy(), decId)
 		if self.logger is not None:
 			self.logger.info("play count {}  action {}  expected reward {:.3f}".format(self.totPlays, sact,  smax))
-		return sact
+		return (decId, sact)
 
 	def setReward(self, aname, reward):
 		"""
-		reward feedback for action
+		reward feedback for action, for the oldest pending decision of the action
 			
 		Parameters
 			aname : action name
 			reward : reward value
 		"""
-		af = self.sactions[aname]
-		taf = np.transpose(af)
-		self.b = np.add(self.b, np.matmul(taf, af))
+		dec = self.pending.popAction(self.aindex[aname])
+		assertNotNone(dec, "no pending decision for action " + aname)
+		af = dec[1]
+		self.b = np.add(self.b, np.outer(af, af))
 		self.f = np.add(self.f, af * reward)
-		invb = np.linalg.inv(self.b)
-		self.mean = np.matmul(invb, f)
+		
+		#rank one update of square root factor, r * (I - beta * u * u.T) where u = r.T * af
+		u = np.matmul(self.r.T, af)
+		us = np.dot(u, u)
+		beta = (1.0 - 1.0 / sqrt(1.0 + us)) / us if us > 0 else 0
+		self.r -= beta * np.outer(np.matmul(self.r, u), u)
+		self.mean = np.matmul(self.r, np.matmul(self.r.T, self.f))
 		if self.logger is not None:
 			self.logger.info("action {}  feature {}  reward {:.3f}".format(aname, floatArrayToString(af, delem=None), reward))
-		self.sactions.pop(aname)
+	
+	def cancelDecisions(self, decIds):
+		"""
+		cancels pending decisions that were not acted on, reversing their play counts. Returns num of 
+		decisions cancelled
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		found, _, _ = self.pending.popMany(decIds)
+		self.totPlays -= len(found)
+		return len(found)
+	
+	def setRewards(self, batch):
+		"""
+		reward feedback for many decisions together, possibly delayed. Rewards for decisions not 
+		pending any more are ignored. Returns num of rewards applied
+			
+		Parameters
+			batch : list of decision ID and reward value
+		"""
+		found, _, feats = self.pending.popMany(list(map(lambda dr : dr[0], batch)))
+		if len(found) > 0:
+			rewards = np.array(list(map(lambda dr : dr[1], batch)), dtype=float)[found]
+			feats = np.array(feats)
+			self.b = np.add(self.b, np.matmul(feats.T, feats))
+			self.f = np.add(self.f, np.matmul(rewards, feats))
+			
+			#low rank update of square root factor, r * (I + w.T * (1 / sqrt(1 + l) - 1) * w) where v = feats * r,
+			#v * v.T = q * l * q.T and w = l^-1/2 * q.T * v with orthonormal rows
+			v = np.matmul(feats, self.r)
+			l, q = np.linalg.eigh(np.matmul(v, v.T))
+			nz = l > l.max() * 1e-12 if l.max() > 0 else np.zeros(len(l), dtype=bool)
+			l = l[nz]
+			w = np.matmul(q[:, nz].T, v) / np.sqrt(l)[:, np.newaxis]
+			self.r += np.matmul(np.matmul(self.r, w.T) * (1.0 / np.sqrt(1.0 + l) - 1.0), w)
+			self.mean = np.matmul(self.r, np.matmul(self.r.T, self.f))
+		if self.logger is not None:
+			self.logger.info("{} rewards applied out of {}".format(len(found), len(batch)))
+		return len(found)
 		
 	def save(self, fpath):
 		"""
@@ -259,11 +387,11 @@ class LinThompsonSampling(object):
 		mod = dict()
 		mod["actions"] = self.actions
 		mod["nfeat"] = self.nfeat
-		mode["subgaus"] = self.subgaus
+		mod["subgaus"] = self.subgaus
 		mod["eps"] = self.eps
 		mod["pthresh"] = self.pthresh
 		mod["b"] = self.b
-		mode["mean"] = self.mean
+		mod["mean"] = self.mean
 		mod["f"] = self.f
 		mod["totPlays"] = self.totPlays
 		saveObject(mod, fpath)
@@ -281,11 +409,11 @@ class LinThompsonSampling(object):
 		mod = restoreObject(fpath)
 		actions = mod["actions"]
 		nfeat = mod["nfeat"]
-		subgaus = mode["subgaus"]
+		subgaus = mod["subgaus"]
 		eps = mod["eps"]
 		pthresh = mod["pthresh"]
 		b = mod["b"]
-		mean = mode["mean"]
+		mean = mod["mean"]
 		f = mod["f"]
 		totPlays = mod["totPlays"]
 		linThSamp = LinThompsonSampling(actions, nfeat, subgaus, eps, pthresh,totPlays=totPlays, b=b, mean=mean, f=f, logFilePath=logFilePath, logLevName=logLevName)
@@ -293,5 +421,421 @@ class LinThompsonSampling(object):
 		if linThSamp.logger is not None:
 			linThSamp.logger.info("restored model from cherckpoint")
 		return linThSamp
+
+class DisjointLinUpperConfBound(object):
+	"""
+	linear upper conf bound multi arm bandit with separate linear model for each action (disjoint lin ucb). 
+	Model params for all actions are stacked arrays, with first dimension for action
+	"""
+	
+	def __init__(self, actions, nfeat, alpha, reg=1.0, totPlays=0, a=None, b=None, logFilePath=None, logLevName=None):
+		"""
+		initializer
+		
+		Parameters
+			actions : action names
+			nfeat : feature size
+			alpha : constant
+			reg ; regularizing param (lambda)
+			totPlays : total plays so far
+			a : regression matrix for each action
+			b : regression vector for each action
+			logFilePath : log file path set None for no logging
+			logLevName : log level e.g. info, debug
+		"""
+		self.actions = actions
+		self.naction = len(actions)
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
+		self.nfeat = nfeat
+		self.alpha = alpha
+		self.reg = reg
+		self.totPlays = totPlays
+		self.a = np.tile(np.identity(nfeat) * reg, (self.naction, 1, 1)) if a is None else a
+		self.b = np.zeros((self.naction, nfeat)) if b is None else b
+		
+		#inverse of a and linear params for each action
+		self.inva = np.linalg.inv(self.a)
+		self.theta = np.einsum("kij,kj->ki", self.inva, self.b)
+		self.pending = PendingDecisions()
+		
+		self.logger = None
+		if logFilePath is not None: 		
+			self.logger = createLogger(__name__, logFilePath, logLevName)
+			self.logger.info("******** stating new  session of " + "DisjointLinUpperConfBound")
+	
+	def getAction(self, features):
+		"""
+		next play return selected action
+		
+		Parameters
+			features : features for all actions with 1 row per action or features shared by all actions
+		"""
+		return self.getActions(np.asarray(features, dtype=float)[np.newaxis])[0]
+	
+	def getActions(self, features):
+		"""
+		next plays for a batch of requests, return selected actions
+		
+		Parameters
+			features : features with shape (num of requests, num of actions, feature size) or 
+			(num of requests, feature size) if same features for all actions
+		"""
+		return list(map(lambda d : d[1], self.getDecisions(features)))
+	
+	def getDecisions(self, features, decIds=None):
+		"""
+		next plays for a batch of requests, return decision ID and selected action for each. Decisions 
+		are kept pending until reward is set
+		
+		Parameters
+			features : features with shape (num of requests, num of actions, feature size) or 
+			(num of requests, feature size) if same features for all actions
+			decIds : decision ID list, generated if None
+		"""
+		features = np.asarray(features, dtype=float)
+		if features.ndim == 2:
+			features = np.broadcast_to(features[:, np.newaxis, :], (len(features), self.naction, self.nfeat))
 		
-		
\ No newline at end of file
+		#reward upper bound for all requests and actions
+		t = np.einsum("nki,kij,nkj->nk", features, self.inva, features, optimize=True)
+		scores = np.einsum("nkd,kd->nk", features, self.theta) + self.alpha * np.sqrt(np.maximum(t, 0))
+		indexes = scores.argmax(axis=1)
+		
+		decisions = list()
+		for j, i in enumerate(indexes.tolist()):
+			sact = self.actions[i]
+			decId = self.pending.add(i, features[j, i].copy(), None if decIds is None else decIds[j])
+			self.totPlays += 1
+			if self.logger is not None:
+				self.logger.info("play count {}  action {}  reward upper bound {:.3f}".format(self.totPlays, sact, scores[j, i]))
+			decisions.append((decId, sact))
+		return decisions
+	
+	def setReward(self, aname, reward):
+		"""
+		reward feedback for action, for the oldest pending decision of the action
+			
+		Parameters
+			aname : action name
+			reward : reward value
+		"""
+		i = self.aindex[aname]
+		dec = self.pending.popAction(i)
+		assertNotNone(dec, "no pending decision for action " + aname)
+		af = dec[1]
+		self.a[i] += np.outer(af, af)
+		self.b[i] += af * reward
+		rankOneInvUpdate(self.inva[i], af)
+		self.theta[i] = np.matmul(self.inva[i], self.b[i])
+		if self.logger is not None:
+			self.logger.info("action {}  feature {}  actual reward {:.3f}".format(aname, floatArrayToString(af, delem=None), reward))
+	
+	def cancelDecisions(self, decIds):
+		"""
+		cancels pending decisions that were not acted on, reversing their play counts. Returns num of 
+		decisions cancelled
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		found, _, _ = self.pending.popMany(decIds)
+		self.totPlays -= len(found)
+		return len(found)
+	
+	def setRewards(self, batch):
+		"""
+		reward feedback for many decisions together, possibly delayed. Rewards for decisions not 
+		pending any more are ignored. Returns num of rewards applied
+			
+		Parameters
+			batch : list of decision ID and reward value
+		"""
+		found, indexes, feats = self.pending.popMany(list(map(lambda dr : dr[0], batch)))
+		if len(found) > 0:
+			rewards = np.array(list(map(lambda dr : dr[1], batch)), dtype=float)[found]
+			feats = np.array(feats)
+			np.add.at(self.a, indexes, np.einsum("ni,nj->nij", feats, feats))
+			np.add.at(self.b, indexes, feats * rewards[:, np.newaxis])
+			
+			#inverse and linear params for rewarded actions
+			ract = np.unique(indexes)
+			self.inva[ract] = np.linalg.inv(self.a[ract])
+			self.theta[ract] = np.einsum("kij,kj->ki", self.inva[ract], self.b[ract])
+		if self.logger is not None:
+			self.logger.info("{} rewards applied out of {}".format(len(found), len(batch)))
+		return len(found)
+	
+	def save(self, fpath):
+		"""
+		saves object
+				
+		Parameters
+			fpath : file path
+		"""
+		mod = dict()
+		mod["actions"] = self.actions
+		mod["nfeat"] = self.nfeat
+		mod["alpha"] = self.alpha
+		mod["reg"] = self.reg
+		mod["a"] = self.a
+		mod["b"] = self.b
+		mod["totPlays"] = self.totPlays
+		saveObject(mod, fpath)
+		
+		if self.logger is not None:
+			self.logger.info("cherckpointed model")
+		
+	@staticmethod
+	def create(fpath, logFilePath=None, logLevName=None):
+		"""
+		restores object
+				
+		Parameters
+			fpath : file path
+			logFilePath : log file path set None for no logging
+			logLevName : log level e.g. info, debug
+		"""
+		mod = restoreObject(fpath)
+		linUcb = DisjointLinUpperConfBound(mod["actions"], mod["nfeat"], mod["alpha"], reg=mod["reg"], totPlays=mod["totPlays"], 
+		a=mod["a"], b=mod["b"], logFilePath=logFilePath, logLevName=logLevName)
+		
+		if linUcb.logger is not None:
+			linUcb.logger.info("restored model from cherckpoint")
+		return linUcb
+
+class HybridLinUpperConfBound(object):
+	"""
+	linear upper conf bound multi arm bandit with linear model params shared by all actions for shared features 
+	and separate for each action for action features (hybrid lin ucb). Action model params are stacked arrays, 
+	with first dimension for action
+	"""
+	
+	def __init__(self, actions, nsfeat, nfeat, alpha, reg=1.0, totPlays=0, a0=None, b0=None, a=None, bm=None, b=None, 
+	logFilePath=None, logLevName=None):
+		"""
+		initializer
+		
+		Parameters
+			actions : action names
+			nsfeat : shared feature size
+			nfeat : action feature size
+			alpha : constant
+			reg ; regularizing param (lambda)
+			totPlays : total plays so far
+			a0 : regression matrix for shared features
+			b0 : regression vector for shared features
+			a : regression matrix for each action
+			bm : shared and action feature cross matrix for each action
+			b : regression vector for each action
+			logFilePath : log file path set None for no logging
+			logLevName : log level e.g. info, debug
+		"""
+		self.actions = actions
+		self.naction = len(actions)
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
+		self.nsfeat = nsfeat
+		self.nfeat = nfeat
+		self.alpha = alpha
+		self.reg = reg
+		self.totPlays = totPlays
+		self.a0 = np.identity(nsfeat) * reg if a0 is None else a0
+		self.b0 = np.zeros(nsfeat) if b0 is None else b0
+		self.a = np.tile(np.identity(nfeat) * reg, (self.naction, 1, 1)) if a is None else a
+		self.bm = np.zeros((self.naction, nfeat, nsfeat)) if bm is None else bm
+		self.b = np.zeros((self.naction, nfeat)) if b is None else b
+		
+		self.inva = np.linalg.inv(self.a)
+		self.__setParams()
+		self.pending = PendingDecisions()
+		
+		self.logger = None
+		if logFilePath is not None: 		
+			self.logger = createLogger(__name__, logFilePath, logLevName)
+			self.logger.info("******** stating new  session of " + "HybridLinUpperConfBound")
+	
+	def getAction(self, sfeatures, features):
+		"""
+		next play return selected action
+		
+		Parameters
+			sfeatures : shared features
+			features : features for all actions with 1 row per action or features shared by all actions
+		"""
+		sfeatures = np.asarray(sfeatures, dtype=float)[np.newaxis]
+		return self.getActions(sfeatures, np.asarray(features, dtype=float)[np.newaxis])[0]
+	
+	def getActions(self, sfeatures, features):
+		"""
+		next plays for a batch of requests, return selected actions
+		
+		Parameters
+			sfeatures : shared features with shape (num of requests, shared feature size)
+			features : features with shape (num of requests, num of actions, feature size) or 
+			(num of requests, feature size) if same features for all actions
+		"""
+		return list(map(lambda d : d[1], self.getDecisions(sfeatures, features)))
+	
+	def getDecisions(self, sfeatures, features, decIds=None):
+		"""
+		next plays for a batch of requests, return decision ID and selected action for each. Decisions 
+		are kept pending until reward is set
+		
+		Parameters
+			sfeatures : shared features with shape (num of requests, shared feature size)
+			features : features with shape (num of requests, num of actions, feature size) or 
+			(num of requests, feature size) if same features for all actions
+			decIds : decision ID list, generated if None
+		"""
+		z = np.asarray(sfeatures, dtype=float)
+		x = np.asarray(features, dtype=float)
+		if x.ndim == 2:
+			x = np.broadcast_to(x[:, np.newaxis, :], (len(x), self.naction, self.nfeat))
+		
+		#variance terms, with c = inverse a * bm for each action
+		cx = np.einsum("kdj,nkd->nkj", self.c, x, optimize=True)
+		t1 = np.einsum("ni,ij,nj->n", z, self.inva0, z, optimize=True)
+		t2 = np.einsum("ni,ij,nkj->nk", z, self.inva0, cx, optimize=True)
+		t3 = np.einsum("nki,kij,nkj->nk", x, self.inva, x, optimize=True)
+		t4 = np.einsum("nki,ij,nkj->nk", cx, self.inva0, cx, optimize=True)
+		s = t1[:, np.newaxis] - 2 * t2 + t3 + t4
+		
+		#reward upper bound for all requests and actions
+		scores = np.matmul(z, self.beta)[:, np.newaxis] + np.einsum("nkd,kd->nk", x, self.theta) + self.alpha * np.sqrt(np.maximum(s, 0))
+		indexes = scores.argmax(axis=1)
+		
+		decisions = list()
+		for j, i in enumerate(indexes.tolist()):
+			sact = self.actions[i]
+			decId = self.pending.add(i, (z[j].copy(), x[j, i].copy()), None if decIds is None else decIds[j])
+			self.totPlays += 1
+			if self.logger is not None:
+				self.logger.info("play count {}  action {}  reward upper bound {:.3f}".format(self.totPlays, sact, scores[j, i]))
+			decisions.append((decId, sact))
+		return decisions
+	
+	def setReward(self, aname, reward):
+		"""
+		reward feedback for action, for the oldest pending decision of the action
+			
+		Parameters
+			aname : action name
+			reward : reward value
+		"""
+		i = self.aindex[aname]
+		dec = self.pending.popAction(i)
+		assertNotNone(dec, "no pending decision for action " + aname)
+		zf, af = dec[1]
+		
+		#shared params with action contribution removed, action params updated and then added back
+		self.a0 += np.matmul(self.bm[i].T, self.c[i])
+		self.b0 += np.matmul(self.c[i].T, self.b[i])
+		self.a[i] += np.outer(af, af)
+		self.bm[i] += np.outer(af, zf)
+		self.b[i] += af * reward
+		rankOneInvUpdate(self.inva[i], af)
+		self.c[i] = np.matmul(self.inva[i], self.bm[i])
+		self.a0 += np.outer(zf, zf) - np.matmul(self.bm[i].T, self.c[i])
+		self.b0 += zf * reward - np.matmul(self.c[i].T, self.b[i])
+		self.__setParams(False)
+		if self.logger is not None:
+			self.logger.info("action {}  feature {}  actual reward {:.3f}".format(aname, floatArrayToString(af, delem=None), reward))
+	
+	def cancelDecisions(self, decIds):
+		"""
+		cancels pending decisions that were not acted on, reversing their play counts. Returns num of 
+		decisions cancelled
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		found, _, _ = self.pending.popMany(decIds)
+		self.totPlays -= len(found)
+		return len(found)
+	
+	def setRewards(self, batch):
+		"""
+		reward feedback for many decisions together, possibly delayed. Rewards for decisions not 
+		pending any more are ignored. Returns num of rewards applied
+			
+		Parameters
+			batch : list of decision ID and reward value
+		"""
+		found, indexes, feats = self.pending.popMany(list(map(lambda dr : dr[0], batch)))
+		if len(found) > 0:
+			rewards = np.array(list(map(lambda dr : dr[1], batch)), dtype=float)[found]
+			zf = np.array(list(map(lambda f : f[0], feats)))
+			af = np.array(list(map(lambda f : f[1], feats)))
+			ract = np.unique(indexes)
+			
+			#shared params with contribution of rewarded actions removed, action params updated and then added back
+			self.a0 += np.einsum("kji,kjl->il", self.bm[ract], self.c[ract])
+			self.b0 += np.einsum("kji,kj->i", self.c[ract], self.b[ract])
+			np.add.at(self.a, indexes, np.einsum("ni,nj->nij", af, af))
+			np.add.at(self.bm, indexes, np.einsum("ni,nj->nij", af, zf))
+			np.add.at(self.b, indexes, af * rewards[:, np.newaxis])
+			self.inva[ract] = np.linalg.inv(self.a[ract])
+			self.c[ract] = np.matmul(self.inva[ract], self.bm[ract])
+			self.a0 += np.matmul(zf.T, zf) - np.einsum("kji,kjl->il", self.bm[ract], self.c[ract])
+			self.b0 += np.matmul(rewards, zf) - np.einsum("kji,kj->i", self.c[ract], self.b[ract])
+			self.__setParams(False)
+		if self.logger is not None:
+			self.logger.info("{} rewards applied out of {}".format(len(found), len(batch)))
+		return len(found)
+	
+	def __setParams(self, withAction=True):
+		"""
+		sets shared inverse and linear params
+		
+		Parameters
+			withAction : if True inverse a * bm for each action also set
+		"""
+		if withAction:
+			self.c = np.matmul(self.inva, self.bm)
+		
+		#shared feature size is small, inverted directly
+		self.inva0 = np.linalg.inv(self.a0)
+		self.beta = np.matmul(self.inva0, self.b0)
+		self.theta = np.einsum("kij,kj->ki", self.inva, self.b - np.matmul(self.bm, self.beta))
+	
+	def save(self, fpath):
+		"""
+		saves object
+				
+		Parameters
+			fpath : file path
+		"""
+		mod = dict()
+		mod["actions"] = self.actions
+		mod["nsfeat"] = self.nsfeat
+		mod["nfeat"] = self.nfeat
+		mod["alpha"] = self.alpha
+		mod["reg"] = self.reg
+		mod["a0"] = self.a0
+		mod["b0"] = self.b0
+		mod["a"] = self.a
+		mod["bm"] = self.bm
+		mod["b"] = self.b
+		mod["totPlays"] = self.totPlays
+		saveObject(mod, fpath)
+		
+		if self.logger is not None:
+			self.logger.info("cherckpointed model")
+		
+	@staticmethod
+	def create(fpath, logFilePath=None, logLevName=None):
+		"""
+		restores object
+				
+		Parameters
+			fpath : file path
+			logFilePath : log file path set None for no logging
+			logLevName : log level e.g. info, debug
+		"""
+		mod = restoreObject(fpath)
+		linUcb = HybridLinUpperConfBound(mod["actions"], mod["nsfeat"], mod["nfeat"], mod["alpha"], reg=mod["reg"], 
+		totPlays=mod["totPlays"], a0=mod["a0"], b0=mod["b0"], a=mod["a"], bm=mod["bm"], b=mod["b"], logFilePath=logFilePath, 
+		logLevName=logLevName)
+		
+		if linUcb.logger is not None:
+			linUcb.logger.info("restored model from cherckpoint")
+		return linUcb
@@ -0,0 +1,333 @@
+#!/usr/local/bin/python3
+
+# Author: Pranab Ghosh
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you
+# may not use this file except in compliance with the License. You may
+# obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+import random
+import math
+import multiprocessing
+import hashlib
+import pickle
+import numpy as np
+from matumizi.util import *
+from .rlba import *
+from . import mab
+from . import cmab
+from . import reinfl
+
+"""
+Multi seed experiments with MAB, contextual MAB and RL algorithms run in parallel
+"""
+
+#config argument placeholder replaced with environment of the run
+ENV = "__env__"
+
+def createModel(config, env):
+	"""
+	creates model for an experiment config. Supported are MAB, contextual MAB and from reinfl TempDifferenceControl 
+	and its sub classes, other reinfl classes being for policy evaluation with no per step reward to compare
+
+	Parameters
+		config : dictionary with name, module (mab, cmab or reinfl), algo class name, args and kwargs
+		env : environment
+	"""
+	modules = {"mab" : mab, "cmab" : cmab, "reinfl" : reinfl}
+	module = modules.get(config["module"])
+	assertNotNone(module, "invalid module " + str(config["module"]))
+	cls = getattr(module, config["algo"], None)
+	assertNotNone(cls, "invalid algo " + config["algo"])
+	if module is reinfl:
+		assertEqual(issubclass(cls, reinfl.TempDifferenceControl), True, "unsupported reinfl algo " + config["algo"] + 
+		", only TempDifferenceControl and its sub classes supported")
+	args = list(map(lambda a : env if isinstance(a, str) and a == ENV else a, config.get("args", list())))
+	kwargs = dict(map(lambda kv : (kv[0], env if isinstance(kv[1], str) and kv[1] == ENV else kv[1]), 
+	config.get("kwargs", dict()).items()))
+	return cls(*args, **kwargs)
+
+def stepModel(model, env):
+	"""
+	one play of a model with environment returning reward and action
+
+	Parameters
+		model : model object
+		env : environment
+	"""
+	if isinstance(model, MultiArmBandit):
+		aname = model.getAction()[0]
+		re = env.getReward(aname)
+		model.setReward(aname, re)
+	elif isinstance(model, reinfl.TempDifferenceControl):
+		model.getAction(env)
+		nst, re = env.getReward(model.state, model.action)
+		aname = model.action
+		model.setReward(re, nst)
+		if model.gstate is not None and nst == model.gstate:
+			model.state = model.istate
+	else:
+		#contextual with features or tuple of shared features and features
+		feat = env.getContext()
+		aname = model.getAction(*feat) if isinstance(feat, tuple) else model.getAction(feat)
+		re = env.getReward(aname)
+		model.setReward(aname, re)
+	return (re, aname)
+
+def getConfigHash(config, envFun):
+	"""
+	hash of experiment config and environment creation function, for checkpoint file name
+
+	Parameters
+		config : experiment config
+		envFun : environment creation function
+	"""
+	return hashlib.md5(pickle.dumps((config, envFun))).hexdigest()[:12]
+
+def runExperiment(args):
+	"""
+	runs an experiment config for one seed in a worker process, with its own random streams. Model, 
+	environment and random states are checkpointed with MultiArmBandit.save and a run resumes from its
+	checkpoint if there is one with the same config, seed, num of steps and curve step, otherwise starts over
+
+	Parameters
+		args : config, environment creation function, seed, num of steps, curve step, checkpoint file path, checkpoint step
+	"""
+	(config, envFun, seed, nstep, rstep, cpPath, cpStep) = args
+	cp = None
+	cpKey = (getConfigHash(config, envFun), seed, nstep, rstep)
+	if cpPath is not None and os.path.exists(cpPath):
+		cp = MultiArmBandit.restore(cpPath)
+		if cp.get("key") != cpKey:
+			#stale checkpoint from a different run
+			cp = None
+	if cp is not None:
+		model, env, step, treward, tregret, curve = cp["model"], cp["env"], cp["step"], cp["treward"], cp["tregret"], cp["curve"]
+		random.setstate(cp["rstate"])
+		np.random.set_state(cp["nrstate"])
+	else:
+		#separate streams for algo and environment
+		algoSeq, envSeq = np.random.SeedSequence(seed).spawn(2)
+		random.seed(int(algoSeq.generate_state(1)[0]))
+		np.random.seed(algoSeq.generate_state(4))
+		env = envFun(np.random.default_rng(envSeq))
+		model = createModel(config, env)
+		step, treward, tregret, curve = 0, 0, 0, list()
+
+	#pseudo regret with expected reward of selected action if environment provides it
+	optReward = getattr(env, "getOptReward", None)
+	expReward = getattr(env, "getExpReward", None)
+	while step < nstep:
+		re, aname = stepModel(model, env)
+		treward += re
+		if optReward is not None:
+			tregret += optReward() - (re if expReward is None else expReward(aname))
+		step += 1
+
+		if step % rstep == 0:
+			if optReward is not None:
+				regret = tregret / step
+			elif isinstance(model, MultiArmBandit):
+				regret = model.getRegret()[2]
+			else:
+				regret = np.nan
+			curve.append((step, treward / step, regret))
+
+		if cpPath is not None and (step % cpStep == 0 or step == nstep):
+			cp = dict()
+			cp["key"] = cpKey
+			cp["model"], cp["env"], cp["step"], cp["treward"], cp["tregret"], cp["curve"] = model, env, step, treward, tregret, curve
+			cp["rstate"] = random.getstate()
+			cp["nrstate"] = np.random.get_state()
+			
+			#written to temp file and renamed, so that a killed run does not leave a partial checkpoint
+			tmpPath = cpPath + ".tmp"
+			MultiArmBandit.save(cp, tmpPath)
+			os.replace(tmpPath, cpPath)
+	return (config["name"], seed, np.array(curve, dtype=float).reshape(-1, 3))
+
+class ExperimentRunner:
+	"""
+	runs experiment configs for a range of seeds across a process pool and aggregates average reward and 
+	regret curves with confidence bands
+	"""
+
+	def __init__(self, configs, envFun, seeds, nstep, rstep=100, nworkers=None, cpDir=None, cpStep=1000, zval=1.96):
+		"""
+		initializer
+
+		Parameters
+			configs : list of dictionary with name, module (mab, cmab or reinfl), algo class name, args and kwargs. 
+			Any arg with value ENV is replaced with the environment. From reinfl only TempDifferenceControl and 
+			its sub classes are supported
+			envFun : picklable function creating environment given numpy random generator
+			seeds : seed list
+			nstep : num of steps in each run
+			rstep : num of steps between curve points
+			nworkers : num of worker processes, all cpus if None and no pool if 1
+			cpDir : checkpoint directory, no checkpoint if None
+			cpStep : num of steps between checkpoints
+			zval : normal distr z value for confidence band
+		"""
+		names = list(map(lambda c : c["name"], configs))
+		assertEqual(len(set(names)), len(names), "config names should be unique")
+		self.configs = configs
+		self.envFun = envFun
+		self.seeds = list(seeds)
+		self.nstep = nstep
+		self.rstep = rstep
+		self.nworkers = multiprocessing.cpu_count() if nworkers is None else nworkers
+		self.cpDir = cpDir
+		self.cpStep = cpStep
+		self.zval = zval
+		self.curves = None
+
+	def run(self):
+		"""
+		runs all configs and seeds and returns aggregated results
+		"""
+		wargs = list()
+		for config in self.configs:
+			for seed in self.seeds:
+				cpPath = None if self.cpDir is None else os.path.join(self.cpDir, "{}_{}_{}.mod".format(config["name"], 
+				seed, getConfigHash(config, self.envFun)))
+				wargs.append((config, self.envFun, seed, self.nstep, self.rstep, cpPath, self.cpStep))
+
+		if self.nworkers > 1:
+			with multiprocessing.Pool(self.nworkers) as pool:
+				results = pool.map(runExperiment, wargs)
+		else:
+			results = list(map(runExperiment, wargs))
+
+		self.curves = dict(map(lambda c : (c["name"], dict()), self.configs))
+		for (name, seed, curve) in results:
+			self.curves[name][seed] = curve
+		return self.getResults()
+
+	def getResults(self):
+		"""
+		returns dictionary of config name and dictionary with steps and mean, lower and upper confidence 
+		bound of average reward and regret
+		"""
+		results = dict()
+		for name, scurves in self.curves.items():
+			curves = np.stack(list(map(lambda s : scurves[s], self.seeds)))
+			nrun = len(curves)
+			re = dict()
+			re["nrun"] = nrun
+			re["steps"] = curves[0, :, 0].astype(int)
+			for j, metric in [(1, "reward"), (2, "regret")]:
+				mean = curves[:, :, j].mean(axis=0)
+				hw = self.zval * curves[:, :, j].std(axis=0, ddof=1) / math.sqrt(nrun) if nrun > 1 else np.zeros(len(mean))
+				re[metric] = (mean, mean - hw, mean + hw)
+			results[name] = re
+		return results
+
+class SimBanditEnv:
+	"""
+	simulated MAB environment with normally distributed reward for each action, limited to 0 and 1
+	"""
+
+	def __init__(self, actions, means, sd, rng):
+		"""
+		initializer
+
+		Parameters
+			actions : action names
+			means : reward mean for each action
+			sd : reward std deviation
+			rng : numpy random generator
+		"""
+		self.means = dict(zip(actions, means))
+		self.best = max(means)
+		self.sd = sd
+		self.rng = rng
+
+	def getReward(self, aname):
+		"""
+		returns reward for action
+
+		Parameters
+			aname : action name
+		"""
+		return float(np.clip(self.rng.normal(self.means[aname], self.sd), 0, 1.0))
+
+	def getExpReward(self, aname):
+		"""
+		returns expected reward of action before limiting, for pseudo regret
+
+		Parameters
+			aname : action name
+		"""
+		return self.means[aname]
+
+	def getOptReward(self):
+		"""
+		returns expected reward of best action
+		"""
+		return self.best
+
+class SimContextBanditEnv:
+	"""
+	simulated contextual MAB environment, with features for each action uniformly distributed and reward 
+	linear in features plus normally distributed noise
+	"""
+
+	def __init__(self, actions, weights, sd, rng):
+		"""
+		initializer
+
+		Parameters
+			actions : action names
+			weights : linear weights for each action with 1 row per action
+			sd : reward noise std deviation
+			rng : numpy random generator
+		"""
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(actions)))
+		self.weights = np.asarray(weights, dtype=float)
+		self.sd = sd
+		self.rng = rng
+		self.features = None
+
+	def getContext(self):
+		"""
+		returns features for next play with 1 row per action
+		"""
+		self.features = self.rng.uniform(0, 1.0, self.weights.shape)
+		return self.features
+
+	def getReward(self, aname):
+		"""
+		returns reward for action with current features
+
+		Parameters
+			aname : action name
+		"""
+		i = self.aindex[aname]
+		return float(np.dot(self.weights[i], self.features[i]) + self.rng.normal(0, self.sd))
+
+	def getExpReward(self, aname):
+		"""
+		returns expected reward of action with current features
+
+		Parameters
+			aname : action name
+		"""
+		i = self.aindex[aname]
+		return float(np.dot(self.weights[i], self.features[i]))
+
+	def getOptReward(self):
+		"""
+		returns expected reward of best action with current features
+		"""
+		return float((self.weights * self.features).sum(axis=1).max())
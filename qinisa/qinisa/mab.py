@@ -53,30 +53,19 @@ class UpperConfBound(MultiArmBandit):
 		"""
 		next play return selected action
 		"""
-		sact = None
+		sact = self.getUntriedAction()
 		scmax = 0
-		for act in self.actions:
-			#print(str(act))
-			if act.nplay == 0:
-				sact = act
-				self.logger.info("untried action found")
-				break
-			else:		
-				if self.transientAction or act.available:
-					if act.isRewarded():
-						s1 = act.getRewardStat()
-						if self.tuned:
-							v = s1[1] * s1[1] + sqrt(2 * math.log(self.totPlays) / act.nplay)
-							s2 = sqrt(math.log(self .totPlays) / act.nplay) + min(.25, v)
-						else:
-							s2 = sqrt(2 * math.log(self.totPlays) / act.nplay)
-						sc  = s1[0] + s2
-					
-						self.logger.info("action {}  plays total {}  this action {}".format(act.name, self.totPlays, act.nplay))
-						self.logger.info("ucb score components {:.3f}  {:.3f}".format(s1[0],s2))
-						if sc > scmax:
-							scmax = sc
-							sact = act
+		if sact is None:
+			#ucb scores for all actions
+			mean, sd = self.arms.getRewardStat()
+			nplay = self.arms.nplay
+			if self.tuned:
+				v = sd * sd + np.sqrt(2 * math.log(self.totPlays) / nplay)
+				s2 = np.sqrt(math.log(self.totPlays) / nplay) + np.minimum(.25, v)
+			else:
+				s2 = np.sqrt(2 * math.log(self.totPlays) / nplay)
+			sact, scmax = self.selectMaxScore(mean + s2, self.getSelectable())
+			
 		if sact is None:
 			self.logger.info("all actions not rewarded yet")
 			sact = selectRandomFromList(self.actions)
@@ -145,7 +134,8 @@ class ThompsonSampling(MultiArmBandit):
 			logFilePath : log file path set None for no logging
 			logLevName : log level e.g. info, debug
 		"""
-		self.shapeFac = dict(map(lambda a : (a, [1,1]), actions))
+		#beta distr shape factors, one row per action
+		self.shapeFac = np.ones((len(actions), 2))
 		super(ThompsonSampling, self).__init__(actions, wsize, transientAction,logFilePath, logLevName, __name__, "ThompsonSampling")
 		
 		
@@ -153,28 +143,13 @@ class ThompsonSampling(MultiArmBandit):
 		"""
 		next play return selected action
 		"""
-		sact = None
+		sact = self.getUntriedAction()
 		sc = 0
-		for act in self.actions:
-			#any action not tried yet
-			if act.nplay == 0:
-				sact = act
-				self.logger.info("untried action found")
-				break
 		
-		if sact is None:
+		if sact is None and self.arms.isRewarded().all():
 			#sample reward
-			for act in self.actions:
-				if act.isRewarded():
-					sf = self.shapeFac[act.name]
-					p = np.random.beta(sf[0], sf[1])
-					if p > sc:
-						sc = p
-						sact = act
-				else:
-					sact = None
-					sc = 0
-					break
+			p = np.random.beta(self.shapeFac[:,0], self.shapeFac[:,1])
+			sact, sc = self.selectMaxScore(p, True)
 					
 		if sact is None:
 			#select random
@@ -184,7 +159,30 @@ class ThompsonSampling(MultiArmBandit):
 		self.actFinalize(sact, sc)
 		re = (sact.name, sc)	
 		return re
-
+	
+	def getActions(self, n):
+		"""
+		next n plays returns selected actions, with reward sampled for all plays and actions together
+		
+		Parameters
+			n : num of plays
+		"""
+		indexes = self.getUntriedActions(n)
+		scores = [0] * len(indexes)
+		m = n - len(indexes)
+		if m > 0:
+			if len(indexes) == 0 and self.arms.isRewarded().all():
+				#sample reward
+				p = np.random.beta(self.shapeFac[:,0], self.shapeFac[:,1], size=(m, self.naction))
+				sindexes = p.argmax(axis=1)
+				scores.extend(p[np.arange(m), sindexes].tolist())
+			else:
+				#select random
+				sindexes = np.random.randint(0, self.naction, m)
+				scores.extend([0] * m)
+			indexes = np.concatenate((indexes, sindexes))
+		return self.actFinalizeMany(indexes, scores)
+	
 	def setReward(self, aname, reward):
 		"""
 		reward feedback for action
@@ -194,12 +192,25 @@ class ThompsonSampling(MultiArmBandit):
 			reward : reward value
 		"""
 		super().setReward(aname, reward)
-		sf = self.shapeFac[aname]
+		sf = self.shapeFac[self.raction.index]
 		if random.random() < reward:
 			sf[0] += 1
 		else:
 			sf[1] += 1
 		self.logger.info("action {} beta distr factors {} {}".format(aname, sf[0], sf[1]))	
+	
+	def addRewards(self, indexes, rewards):
+		"""
+		reward feedback for many actions together
+			
+		Parameters
+			indexes : action index array
+			rewards : reward value array
+		"""
+		super().addRewards(indexes, rewards)
+		success = np.random.random(len(rewards)) < rewards
+		np.add.at(self.shapeFac[:,0], indexes, success)
+		np.add.at(self.shapeFac[:,1], indexes, ~success)
 		
 class ExponentialWeight(MultiArmBandit):
 	"""
@@ -220,11 +231,10 @@ class ExponentialWeight(MultiArmBandit):
 		"""
 		super(ExponentialWeight, self).__init__(actions, wsize, transientAction,logFilePath, logLevName, __name__, "ExponentialWeight")
 		assertWithinRange(gama, 0, 0.5, "gama should not be greater that 0.5")
-		self.weights = list(map(lambda a : [a, 1.0], actions))
+		self.weights = np.ones(self.naction)
+		self.tweight = float(self.naction)
 		self.gama = gama
 		self.distr = None
-		self.sampler = None
-		self.__getActionDistr()
 
 	def getAction(self):
 		"""
@@ -236,13 +246,24 @@ class ExponentialWeight(MultiArmBandit):
 		
 		if sact is None:
 			#sample reward
-			aname = self.sampler.sample()
-			self.logger.info("sampled action " + aname)
-			sact = self.getActionByName(aname)
+			sact = self.actions[self.__sample(1)[0]]
+			self.logger.info("sampled action " + sact.name)
 		
 		self.actFinalize(sact, sc)
 		re = (sact.name, sc)	
 		return re
+	
+	def getActions(self, n):
+		"""
+		next n plays returns selected actions, with all plays sampled together
+		
+		Parameters
+			n : num of plays
+		"""
+		indexes = self.getUntriedActions(n)
+		if len(indexes) < n:
+			indexes = np.concatenate((indexes, self.__sample(n - len(indexes))))
+		return self.actFinalizeMany(indexes, [0] * n)
 
 	def setReward(self, aname, reward):
 		"""
@@ -253,26 +274,51 @@ class ExponentialWeight(MultiArmBandit):
 			reward : reward value
 		"""
 		super().setReward(aname, reward)
-		for d in self.distr:
-			if d[0] == aname:
-				rn = reward / d[1]
-				break
-				
-		for w in self.weights:
-			if w[0] == aname:
-				w[1] *= math.exp(self.gama * rn / self.naction)
-				break
-		self.__getActionDistr()
+		i = self.raction.index
+		rn = reward / self.__getProb(i)
+		w = self.weights[i]
+		self.weights[i] = w * math.exp(self.gama * rn / self.naction)
+		self.tweight += self.weights[i] - w
+		self.distr = None
 	
-	def __getActionDistr(self):
+	def addRewards(self, indexes, rewards):
 		"""
-		action probability distribution
-		"""	
-		tw = 0
-		for w in self.weights:
-			tw += w[1]
-		self.distr = list(map(lambda w : (w[0], (1.0 - self.gama) * w[1] / tw + self.gama / self.naction), self.weights))
-		self.sampler = CategoricalRejectSampler(self.distr)
+		reward feedback for many actions together. Rewards are normalized with action probability 
+		before the batch, as if they were set together
+			
+		Parameters
+			indexes : action index array
+			rewards : reward value array
+		"""
+		super().addRewards(indexes, rewards)
+		prob = (1.0 - self.gama) * self.weights / self.tweight + self.gama / self.naction
+		rn = np.bincount(indexes, weights=rewards / prob[indexes], minlength=self.naction)
+		self.weights *= np.exp(self.gama * rn / self.naction)
+		self.tweight = self.weights.sum()
+		self.distr = None
+	
+	def __getProb(self, i):
+		"""
+		action probability
+		
+		Parameters
+			i : action index
+		"""
+		return (1.0 - self.gama) * self.weights[i] / self.tweight + self.gama / self.naction
+	
+	def __sample(self, n):
+		"""
+		samples action indexes from action probability distribution, which is calculated only after 
+		weights have changed
+		
+		Parameters
+			n : num of samples
+		"""
+		if self.distr is None:
+			self.tweight = self.weights.sum()
+			self.distr = np.cumsum((1.0 - self.gama) * self.weights / self.tweight + self.gama / self.naction)
+		indexes = np.searchsorted(self.distr, np.random.random(n) * self.distr[-1], side="right")
+		return np.minimum(indexes, self.naction - 1)
 
 class SoftMix(MultiArmBandit):
 	"""
@@ -293,11 +339,11 @@ class SoftMix(MultiArmBandit):
 		"""
 		super(SoftMix, self).__init__(actions, wsize, transientAction,logFilePath, logLevName, __name__, "SoftMix")
 		assertWithinRange(d, 0, 1.0, "d should be between 0 and 1.0")
-		self.weights = list(map(lambda a : [a, 0], actions))
+		self.weights = np.zeros(self.naction)
 		self.d = d
 		self.ds = d * d
 		self.distr = None
-		self.sampler = None		
+		self.cdistr = None
 		self.__getActionDistr()
 		
 	def getAction(self):
@@ -308,14 +354,25 @@ class SoftMix(MultiArmBandit):
 		sc = 0
 		
 		if sact is None:
-			aname = self.sampler.sample()
-			self.logger.info("sampled action " + aname)
-			sact = self.getActionByName(aname)
+			sact = self.actions[self.__sample(1)[0]]
+			self.logger.info("sampled action " + sact.name)
 		
 		self.actFinalize(sact, sc)
 		re = (sact.name, sc)	
 		return re	
 	
+	def getActions(self, n):
+		"""
+		next n plays returns selected actions, with all plays sampled together
+		
+		Parameters
+			n : num of plays
+		"""
+		indexes = self.getUntriedActions(n)
+		if len(indexes) < n:
+			indexes = np.concatenate((indexes, self.__sample(n - len(indexes))))
+		return self.actFinalizeMany(indexes, [0] * n)
+	
 	def setReward(self, aname, reward):
 		"""
 		reward feedback for action
@@ -325,19 +382,28 @@ class SoftMix(MultiArmBandit):
 			reward : reward value
 		"""
 		super().setReward(aname, reward)
-		for d in self.distr:
-			if d[0] == aname:
-				rn = reward / d[1]
-				break	
+		i = self.raction.index
+		rn = reward / self.distr[i]
 		self.logger.info("weight correction {:.3f}".format(rn))			
 		
-		for w in self.weights:
-			if w[0] == aname:
-				w[1] += rn
-				break
-		self.logger.info("action weights " + str(self.weights))
+		self.weights[i] += rn
+		self.logger.debug("action weights %s", self.weights)
 		
 		self.__getActionDistr()
+	
+	def addRewards(self, indexes, rewards):
+		"""
+		reward feedback for many actions together. Rewards are normalized with action distribution 
+		before the batch, as if they were set together
+			
+		Parameters
+			indexes : action index array
+			rewards : reward value array
+		"""
+		super().addRewards(indexes, rewards)
+		self.weights += np.bincount(indexes, weights=rewards / self.distr[indexes], minlength=self.naction)
+		self.logger.debug("action weights %s", self.weights)
+		self.__getActionDistr()
 									
 	def __getActionDistr(self):
 		"""
@@ -346,12 +412,23 @@ class SoftMix(MultiArmBandit):
 		gama = min(1, 5 * self.naction * math.log(self.totPlays) / (self.ds * self.totPlays)) if self.totPlays > 1 else 1
 		eta = math.log(1 + self.d * (self.naction / gama + 1) / (2 * self.naction / gama - self.ds)) / (self.naction / gama + 1)
 		self.logger.info("gama {:.3f}  eta {:.3f}".format(gama, eta))
-			
-		mweights = list(map(lambda w : (w[0], w[1] * eta), self.weights))
-		z = sum(list(map(lambda mw : math.exp(mw[1]), mweights)))
-		self.distr = list(map(lambda w : (w[0], (1.0 - gama) * math.exp(w[1]) / z + gama / self.naction), mweights))
-		self.logger.info("action distr " + str(self.distr))
-		self.sampler = CategoricalRejectSampler(self.distr)			
+		
+		#softmax shifted by max weight for numerical stability
+		mweights = self.weights * eta
+		ew = np.exp(mweights - mweights.max())
+		self.distr = (1.0 - gama) * ew / ew.sum() + gama / self.naction
+		self.logger.debug("action distr %s", self.distr)
+		self.cdistr = np.cumsum(self.distr)
+	
+	def __sample(self, n):
+		"""
+		samples action indexes from action probability distribution
+		
+		Parameters
+			n : num of samples
+		"""
+		indexes = np.searchsorted(self.cdistr, np.random.random(n) * self.cdistr[-1], side="right")
+		return np.minimum(indexes, self.naction - 1)
 
 
 class RandomGreedyPolicy:
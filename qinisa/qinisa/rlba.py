@@ -19,30 +19,276 @@ import os
 import sys
 import random 
 import math
+import logging
+from collections import OrderedDict, deque
 import numpy as np
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.stats import *
 
+class BanditArms:
+	"""
+	multi arm bandit arm state as arrays, one element per arm, with name to index map. Windowed reward 
+	stats are kept with a ring buffer per arm, and window sum and sum of squares updated incrementally
+	"""
+	
+	def __init__(self, names, wsize):
+		"""
+		initializer
+		
+		Parameters
+			names : arm names
+			wsize : reward window size
+		"""
+		narm = len(names)
+		self.names = list(names)
+		self.aindex = dict(map(lambda ia : (ia[1], ia[0]), enumerate(self.names)))
+		assertEqual(len(self.aindex), narm, "arm names should be unique")
+		self.wsize = wsize
+		self.available = np.ones(narm, dtype=bool)
+		self.nplay = np.zeros(narm, dtype=np.int64)
+		self.nreward = np.zeros(narm, dtype=np.int64)
+		self.treward = np.zeros(narm)
+		self.rewards = np.zeros((narm, wsize))
+		self.wcount = np.zeros(narm, dtype=np.int64)
+		self.wpos = np.zeros(narm, dtype=np.int64)
+		self.wsum = np.zeros(narm)
+		self.wsumSq = np.zeros(narm)
+	
+	def getIndex(self, name):
+		"""
+		arm index for name
+		
+		Parameters
+			name : arm name
+		"""
+		i = self.aindex.get(name)
+		assertNotNone(i, "invalid action name")
+		return i
+	
+	def addReward(self, i, reward):
+		"""
+		adds reward for an arm
+		
+		Parameters
+			i : arm index
+			reward : reward value
+		"""
+		pos = self.wpos[i]
+		if self.wcount[i] == self.wsize:
+			old = self.rewards[i, pos]
+			self.wsum[i] -= old
+			self.wsumSq[i] -= old * old
+		else:
+			self.wcount[i] += 1
+		self.rewards[i, pos] = reward
+		self.wsum[i] += reward
+		self.wsumSq[i] += reward * reward
+		pos += 1
+		if pos == self.wsize:
+			#sums recalculated once per window to limit drift
+			pos = 0
+			self.wsum[i] = self.rewards[i].sum()
+			self.wsumSq[i] = (self.rewards[i] * self.rewards[i]).sum()
+		self.wpos[i] = pos
+		self.nreward[i] += 1
+		self.treward[i] += reward
+	
+	def addRewards(self, indexes, rewards):
+		"""
+		adds rewards for many arms together, same as calling addReward for each in order
+		
+		Parameters
+			indexes : arm index array
+			rewards : reward value array
+		"""
+		narm = len(self.names)
+		order = np.argsort(indexes, kind="stable")
+		indexes = indexes[order]
+		rewards = rewards[order]
+		counts = np.bincount(indexes, minlength=narm)
+		
+		#window position of each reward, only the last window size rewards of an arm are kept
+		rank = np.arange(len(indexes)) - (np.cumsum(counts) - counts)[indexes]
+		keep = rank >= counts[indexes] - self.wsize
+		pos = (self.wpos[indexes] + rank) % self.wsize
+		self.rewards[indexes[keep], pos[keep]] = rewards[keep]
+		
+		self.wcount = np.minimum(self.wcount + counts, self.wsize)
+		self.wpos = (self.wpos + counts) % self.wsize
+		rarms = counts > 0
+		self.wsum[rarms] = self.rewards[rarms].sum(axis=1)
+		self.wsumSq[rarms] = (self.rewards[rarms] * self.rewards[rarms]).sum(axis=1)
+		self.nreward += counts
+		self.treward += np.bincount(indexes, weights=rewards, minlength=narm)
+	
+	def isRewarded(self):
+		"""
+		True for arms with rewards in the window
+		"""
+		return self.wcount > 0
+	
+	def getRewardMean(self):
+		"""
+		windowed reward mean, nan for arms without reward
+		"""
+		mean = np.full(len(self.names), np.nan)
+		np.divide(self.wsum, self.wcount, out=mean, where=self.wcount > 0)
+		return mean
+	
+	def getRewardStat(self):
+		"""
+		windowed reward mean and std deviation, nan mean for arms without reward and 0 std deviation for 
+		arms with one reward
+		"""
+		mean = self.getRewardMean()
+		var = np.zeros(len(self.names))
+		np.divide(self.wsumSq - self.wsum * np.nan_to_num(mean), self.wcount - 1, out=var, where=self.wcount > 1)
+		return (mean, np.sqrt(np.maximum(var, 0)))
+
+class PendingDecisions:
+	"""
+	decisions waiting for reward keyed by decision ID, in decision order. Size is bounded and the oldest 
+	decisions are dropped when full, since some decisions never get reward. Decision IDs are also queued 
+	per action for the oldest decision of an action, with IDs no longer pending skipped lazily
+	"""
+	
+	def __init__(self, maxSize=10000):
+		"""
+		initializer
+		
+		Parameters
+			maxSize : max num of pending decisions
+		"""
+		assertGreater(maxSize, 0, "max num of pending decisions should be positive")
+		self.decisions = OrderedDict()
+		self.actDecisions = dict()
+		self.nqueued = 0
+		self.maxSize = maxSize
+		self.nextId = 0
+		self.ndropped = 0
+	
+	def add(self, i, data=None, decId=None):
+		"""
+		adds decision and returns decision ID
+		
+		Parameters
+			i : action index
+			data : any decision data needed for reward e.g. features
+			decId : decision ID, generated if None
+		"""
+		if decId is None:
+			decId = self.nextId
+			self.nextId += 1
+		self.decisions[decId] = (i, data)
+		self.decisions.move_to_end(decId)
+		self.actDecisions.setdefault(i, deque()).append(decId)
+		self.nqueued += 1
+		while len(self.decisions) > self.maxSize:
+			self.decisions.popitem(last=False)
+			self.ndropped += 1
+		
+		#rebuild action queues when mostly IDs no longer pending, amortized constant time
+		if self.nqueued > 2 * self.maxSize:
+			self.actDecisions = dict()
+			for pdecId, dec in self.decisions.items():
+				self.actDecisions.setdefault(dec[0], deque()).append(pdecId)
+			self.nqueued = len(self.decisions)
+		return decId
+	
+	def pop(self, decId):
+		"""
+		removes and returns action index and data for a decision, None if not pending
+		
+		Parameters
+			decId : decision ID
+		"""
+		return self.decisions.pop(decId, None)
+	
+	def popAction(self, i):
+		"""
+		removes and returns the oldest pending decision for an action, None if there is none
+		
+		Parameters
+			i : action index
+		"""
+		queue = self.actDecisions.get(i)
+		while queue:
+			decId = queue.popleft()
+			self.nqueued -= 1
+			dec = self.decisions.get(decId)
+			if dec is not None and dec[0] == i:
+				del self.decisions[decId]
+				return dec
+		return None
+	
+	def popMany(self, decIds):
+		"""
+		removes pending decisions, returning positions in decision ID list of those found, their action 
+		indexes and data
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		found = list()
+		indexes = list()
+		data = list()
+		for j, decId in enumerate(decIds):
+			dec = self.decisions.pop(decId, None)
+			if dec is not None:
+				found.append(j)
+				indexes.append(dec[0])
+				data.append(dec[1])
+		return (np.array(found, dtype=np.int64), np.array(indexes, dtype=np.int64), data)
+	
+	def __len__(self):
+		"""
+		num of pending decisions
+		"""
+		return len(self.decisions)
+
 class Action(object):
 	"""
-	action class for  multi arm bandit 
+	action class for  multi arm bandit, a view of one arm of bandit arm state
 	"""
 	
-	def __init__(self, name, wsize):
+	def __init__(self, name, wsize, arms=None, index=0):
 		"""
 		initializer
 		
 		Parameters
-			naction : no of actions
-			rwindow : reward window size
+			name : action name
+			wsize : reward window size
+			arms : bandit arm state, own state created if None
+			index : arm index in bandit arm state
 		"""
 		self.name = name
-		self.available = True
-		self.rwindow = RollingStat(wsize)
-		self.nplay = 0
-		self.nreward = 0
-		self.treward = 0
+		self.arms = arms if arms is not None else BanditArms([name], wsize)
+		self.index = index
+
+	@property
+	def available(self):
+		return bool(self.arms.available[self.index])
+	
+	@available.setter
+	def available(self, available):
+		self.arms.available[self.index] = available
+	
+	@property
+	def nplay(self):
+		return int(self.arms.nplay[self.index])
+	
+	@nplay.setter
+	def nplay(self, nplay):
+		self.arms.nplay[self.index] = nplay
+	
+	@property
+	def nreward(self):
+		return int(self.arms.nreward[self.index])
+	
+	@property
+	def treward(self):
+		return float(self.arms.treward[self.index])
 
 	def makeAvailable(self, available):
 		"""
@@ -60,40 +306,44 @@ class Action(object):
 		Parameters
 			reward : reward value
 		"""
-		self.rwindow.add(reward)
-		self.nreward += 1
-		self.treward += reward	
+		self.arms.addReward(self.index, reward)
 		
 	def getRewardStat(self):
 		"""
 		get average reward
 		"""
-		rs = self.rwindow.getStat() if self.rwindow.getSize() > 0 else None
+		rs = None
+		if self.isRewarded():
+			i = self.index
+			mean = self.arms.wsum[i] / self.arms.wcount[i]
+			n = self.arms.wcount[i]
+			sd = math.sqrt(max(self.arms.wsumSq[i] - self.arms.wsum[i] * mean, 0) / (n - 1)) if n > 1 else 0
+			rs = (float(mean), sd)
 		return rs
 		
 	def getRewardCount(self):
 		"""
 		get reward count
 		"""
-		return self.rwindow.getSize()
+		return int(self.arms.wcount[self.index])
 	
 	def isRewarded(self):
 		"""
 		if rewarded return true
 		"""
-		return self.rwindow.getSize() > 0
+		return self.arms.wcount[self.index] > 0
 
 	def __str__(self):
 		"""
 		content
 		"""
-		desc = "name {}  available {}  window size {}  no of play {}".format(self.name, self.available, self.rwindow.getSize(), self.nplay)
+		desc = "name {}  available {}  window size {}  no of play {}".format(self.name, self.available, self.getRewardCount(), self.nplay)
 		return desc
 	
 
 class MultiArmBandit:
 	"""
-	multi arm bandit base
+	multi arm bandit base, with arm state as arrays
 	"""
 	
 	def __init__(self, actions, wsize, transientAction,logFilePath, logLevName, mname, clname):
@@ -110,16 +360,20 @@ class MultiArmBandit:
 			clname : class name
 		"""
 		assertGreater(wsize, 9, "window size should be at least 10")
-		self.actions = list(map(lambda aname : Action(aname, wsize), actions))
+		self.arms = BanditArms(actions, wsize)
+		self.actions = list(map(lambda ia : Action(ia[1], wsize, self.arms, ia[0]), enumerate(actions)))
 		self.naction = len(actions)
 		self.totPlays = 0
 		self.transientAction = transientAction
 		self.raction = None
+		self.pending = PendingDecisions()
 		
-		self.logger = None
 		if logFilePath is not None: 		
 			self.logger = createLogger(mname, logFilePath, logLevName)
 			self.logger.info("******** stating new  session of " + clname)
+		else:
+			#no handler, messages below warning dropped
+			self.logger = logging.getLogger(mname)
 	
 			
 	def getAction(self):
@@ -136,18 +390,85 @@ class MultiArmBandit:
 		re = (sact.name, scmax)	
 		return re
 	
+	def getActions(self, n):
+		"""
+		next n plays returns selected actions, same as n calls to getAction without reward in between
+		
+		Parameters
+			n : num of plays
+		"""
+		return list(map(lambda i : self.getAction(), range(n)))
+	
+	def getDecision(self, decId=None):
+		"""
+		next play returns decision ID, selected action and score. Decision is kept pending until 
+		reward is set with setRewards
+		
+		Parameters
+			decId : decision ID, generated if None
+		"""
+		aname, sc = self.getAction()
+		decId = self.pending.add(self.arms.aindex[aname], decId=decId)
+		return (decId, aname, sc)
+	
+	def getDecisions(self, n, decIds=None):
+		"""
+		next n plays returns decision ID, selected action and score for each
+		
+		Parameters
+			n : num of plays
+			decIds : decision ID list, generated if None
+		"""
+		decisions = list()
+		for j, (aname, sc) in enumerate(self.getActions(n)):
+			decId = self.pending.add(self.arms.aindex[aname], decId=None if decIds is None else decIds[j])
+			decisions.append((decId, aname, sc))
+		return decisions
+	
+	def cancelDecisions(self, decIds):
+		"""
+		cancels pending decisions that were not acted on, reversing their play counts
+		
+		Parameters
+			decIds : decision ID list
+		"""
+		_, indexes, _ = self.pending.popMany(decIds)
+		if len(indexes) > 0:
+			np.subtract.at(self.arms.nplay, indexes, 1)
+			self.totPlays -= len(indexes)
+			if not self.transientAction:
+				self.arms.available[indexes] = True
+		return len(indexes)
+	
+	def setMaxPending(self, maxSize):
+		"""
+		sets max num of decisions waiting for reward
+		
+		Parameters
+			maxSize : max num of pending decisions
+		"""
+		assertGreater(maxSize, 0, "max num of pending decisions should be positive")
+		self.pending.maxSize = maxSize
+	
 	def getUntriedAction(self):
 		"""
 		next untried action
 		"""
 		sact = None
-		for act in self.actions:
-			#any action not tried yet
-			if act.nplay == 0:
-				sact = act
-				self.logger.info("untried action found")
-				break
+		untried = np.flatnonzero(self.arms.nplay == 0)
+		if len(untried) > 0:
+			sact = self.actions[untried[0]]
+			self.logger.info("untried action found")
 		return sact
+	
+	def getUntriedActions(self, n):
+		"""
+		indexes of up to n untried actions
+		
+		Parameters
+			n : max num of actions
+		"""
+		return np.flatnonzero(self.arms.nplay == 0)[:n]
 		
 	def getActionByName(self, aname):
 		"""
@@ -156,12 +477,8 @@ class MultiArmBandit:
 		Parameters
 			aname : action name
 		"""
-		sact = None
-		for act in self.actions:
-			if act.name == aname:
-				sact = act
-				break
-		return sact
+		i = self.arms.aindex.get(aname)
+		return self.actions[i] if i is not None else None
 		
 	def getActionScore(self, act):
 		"""
@@ -173,67 +490,106 @@ class MultiArmBandit:
 		s = act.getRewardStat()
 		sc = s[0] if s is not None else None
 		return sc
-		
+	
+	def getSelectable(self):
+		"""
+		True for actions that are rewarded and available
+		"""
+		sel = self.arms.isRewarded()
+		return sel if self.transientAction else sel & self.arms.available
+	
 	def getBestAction(self):
 		"""
 		return action with best average reward
 		
 		"""
-		sact = None
+		sact = self.getUntriedAction()
 		scmax = 0
 
-		for act in self.actions:
-			#any untried
-			if act.nplay == 0:
-				sact = act
-				break
-		
 		if sact is None:
-			for act in self.actions:
-				if self.transientAction or act.available:
-					if act.isRewarded():
-						sc  = self.getActionScore(act)
-					
-						self.logger.info("action {}  plays total {}  this action {}".format(act.name, self.totPlays, act.nplay))
-						if sc > scmax:
-							scmax = sc
-							sact = act
+			scores = self.arms.getRewardMean()
+			sact, sc = self.selectMaxScore(scores, self.getSelectable())
+			if sact is not None:
+				scmax = sc
 		r = (sact, scmax)
 		return r
+	
+	def selectMaxScore(self, scores, sel):
+		"""
+		first action with max positive score among selectable actions, None if there is none
+		
+		Parameters
+			scores : action scores
+			sel : boolean array for selectable actions
+		"""
+		sact = None
+		sc = 0
+		scores = np.where(sel, scores, -np.inf)
+		i = scores.argmax()
+		if scores[i] > 0:
+			sact = self.actions[i]
+			sc = float(scores[i])
+		return (sact, sc)
 							
 	def setReward(self, aname, reward):
 		"""
-		reward feedback for action
+		reward feedback for action, for the oldest pending decision of the action if there is any
 			
 		Parameters
 			act : action
 			reward : reward value
 		"""
-		acts = list(filter(lambda act : act.name == aname, self.actions))
-		assertEqual(len(acts), 1, "invalid action name")
-		act = acts[0]
+		i = self.arms.getIndex(aname)
+		self.pending.popAction(i)
+		act = self.actions[i]
 		self.raction = act
 		act.addReward(reward)
 		if not self.transientAction:
 			act.makeAvailable(True)
 		self.logger.info("action {}  reward {:.3f}".format(act, reward))
 
+	def setRewards(self, batch):
+		"""
+		reward feedback for many decisions together, possibly delayed. Rewards for decisions not 
+		pending any more are ignored. Returns num of rewards applied
+			
+		Parameters
+			batch : list of decision ID and reward value
+		"""
+		found, indexes, _ = self.pending.popMany(list(map(lambda dr : dr[0], batch)))
+		if len(found) < len(batch):
+			self.logger.info("{} rewards without pending decision ignored".format(len(batch) - len(found)))
+		if len(found) > 0:
+			rewards = np.array(list(map(lambda dr : dr[1], batch)), dtype=float)[found]
+			self.addRewards(indexes, rewards)
+		return len(found)
+	
+	def addRewards(self, indexes, rewards):
+		"""
+		reward feedback for many actions together
+			
+		Parameters
+			indexes : action index array
+			rewards : reward value array
+		"""
+		self.arms.addRewards(indexes, rewards)
+		if not self.transientAction:
+			self.arms.available[indexes] = True
+		self.raction = self.actions[indexes[-1]]
+		self.logger.info("{} rewards for {} actions".format(len(rewards), len(np.unique(indexes))))
+
 	def getRegret(self):
 		"""
 		gets regret
 		"""
 		#actual reward
-		nreward = 0
-		treward = 0
-		avrmax = 0
-		for act in self.actions:
-			treward += act.treward
-			nreward += act.nreward
-			avreward = act.treward / act.nreward if act.nreward > 0 else 0
-			if avreward > avrmax:
-				avrmax = avreward
-		
-		avr =  treward / nreward
+		nreward = self.arms.nreward.sum()
+		treward = self.arms.treward.sum()
+		avreward = np.zeros(self.naction)
+		np.divide(self.arms.treward, self.arms.nreward, out=avreward, where=self.arms.nreward > 0)
+		avrmax = max(float(avreward.max()), 0)
+		
+		avr =  float(treward / nreward)
 		return (avrmax, avr, avrmax - avr)
 		
 	@staticmethod
@@ -267,6 +623,21 @@ class MultiArmBandit:
 		sact.nplay += 1
 		self.totPlays += 1
 		self.logger.info("action selected {}  score {}".format(str(sact), sc))
+	
+	def actFinalizeMany(self, indexes, scores):
+		"""
+		finalizes actions selected together, returning list of action name and score
+		
+		Parameters
+			indexes : action indexes
+			scores : action scores
+		"""
+		if not self.transientAction:
+			self.arms.available[indexes] = False
+		np.add.at(self.arms.nplay, indexes, 1)
+		self.totPlays += len(indexes)
+		self.logger.info("{} actions selected".format(len(indexes)))
+		return list(map(lambda i, sc : (self.arms.names[i], sc), indexes.tolist(), scores))
 		
 class Policy:
 	"""
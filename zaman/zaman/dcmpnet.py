@@ -17,13 +17,10 @@
 
 import os
 import sys
-import matplotlib.pyplot as plt
 from random import randint
 from datetime import datetime
 from dateutil.parser import parse
-import pandas as pd
 import numpy as np
-import joblib
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.daexp import *
@@ -18,17 +18,16 @@
 # Package imports
 import os
 import sys
-import matplotlib.pyplot as plt
 from random import randint
 from datetime import datetime
 from dateutil.parser import parse
-import pandas as pd
 import numpy as np
-from fbprophet import Prophet
-import joblib
 from matumizi.util import *
 from matumizi.mlutil import *
 
+Prophet = LazyImport("fbprophet", "Prophet")
+joblib = LazyImport("joblib")
+
 """
 fbprophet based time series forecasting
 """
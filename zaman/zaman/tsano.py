@@ -18,12 +18,10 @@
 # Package imports
 import os
 import sys
-import matplotlib.pyplot as plt
 from random import randint
 from datetime import datetime
 from dateutil.parser import parse
 import numpy as np
-from sklearn import preprocessing
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.daexp import *
@@ -34,6 +32,18 @@ from .tsfeat import *
 time series anomaly detection
 """
 
+def discretize(tsval, vmin, dsize, nbins):
+	"""
+	discretizes values to bin index, values beyond the bin range going to the end bins
+	
+	Parameters
+		tsval : time series value array
+		vmin : min value
+		dsize : bin size
+		nbins : num of bins
+	"""
+	return np.clip(np.rint((tsval - vmin) / dsize), 0, nbins - 1).astype(int)
+
 class MarkovChainAnomaly:
 	"""
 	anomaly detection with markov chain and conditional probability
@@ -64,6 +74,10 @@ class MarkovChainAnomaly:
 
 		self.config = Configuration(configFile, defValues)
 		self.verbose = self.config.getBooleanConfig("common.verbose")[0]
+		self.model = None
+		self.lstpr = None
+		self.sbin = None
+		self.lprWindow = None
 		
 	def fit(self, tsval=None):
 		"""
@@ -82,9 +96,10 @@ class MarkovChainAnomaly:
 			fpath = self.config.getStringConfig("train.data.file")[0]
 			tscol = self.config.getIntConfig("train.data.field")[0]
 			tsval = getFileColumnAsFloat(fpath, tscol)
+		tsval = np.asarray(tsval, dtype=float)
 		
-		vmax = max(tsval)
-		vmin = min(tsval)
+		vmax = tsval.max()
+		vmin = tsval.min()
 		vra = vmax - vmin
 		
 		#increase bin range for ani=omaly
@@ -92,22 +107,17 @@ class MarkovChainAnomaly:
 		vmax += vra * vmargin
 		nbins = int((vmax - vmin) / dsize) + 1
 		
-		#state tyransition probability matrix
-		stpr = np.empty(shape=(nbins,nbins))
-		stpr.fill(1)
-		for i in range(len(tsval) - 1):
-			sb = round((tsval[i] - vmin) / dsize)
-			tb = round((tsval[i+1]- vmin) / dsize)
-			stpr[sb][tb] += 1
+		#state tyransition probability matrix, with transition counts starting at 1
+		bins = discretize(tsval, vmin, dsize, nbins)
+		stpr = np.bincount(bins[:-1] * nbins + bins[1:], minlength=nbins * nbins).reshape(nbins, nbins) + 1.0
 		
 		#normalize rows
-		stpr = preprocessing.normalize(stpr, norm="l1", axis=1)
-		#for i in range(nbins):
-		#	print(stpr[i])
+		stpr /= stpr.sum(axis=1, keepdims=True)
 		
+		mod = {"vmin":vmin, "vmax":vmax, "nbins":nbins, "stpr":stpr}
+		self.__setModel(mod)
 		if toSave:
 			self.config.assertParams("train.model.file")
-			mod = {"vmin":vmin, "vmax":vmax, "nbins":nbins, "stpr":stpr}
 			saveObject(mod, mfpath)
 			
 
@@ -120,7 +130,6 @@ class MarkovChainAnomaly:
 			ts : time stamp list
 		"""
 		dsize = self.config.getFloatConfig("train.discrete.size")[0]
-		mfpath = self.config.getStringConfig("train.model.file")[0]
 		wsize = self.config.getIntConfig("pred.window.size")[0]
 		thresh = self.config.getFloatConfig("pred.ano.threshold")[0]
 		ofpath = self.config.getStringConfig("pred.output.file")[0]
@@ -136,40 +145,32 @@ class MarkovChainAnomaly:
 			ts = getFileColumnAsString(fpath, tscol)
 		
 		#restore model
-		mod = restoreObject(mfpath)
-		vmin = mod["vmin"]
-		stpr = mod["stpr"]
+		self.__loadModel()
+		vmin = self.model["vmin"]
+		nbins = self.model["nbins"]
+		
+		#log of transition probability for each transition, summed over each window of wsize - 1 transitions
+		bins = discretize(np.asarray(tsval, dtype=float), vmin, dsize, nbins)
+		ltpr = self.lstpr[bins[:-1], bins[1:]]
+		nwin = max(len(tsval) - wsize, 0)
+		clpr = np.concatenate(([0.0], np.cumsum(ltpr)))
+		wlpr = clpr[wsize - 1:wsize - 1 + nwin] - clpr[:nwin]
+		cprs = np.exp(wlpr)
 		
-		cprmin = 1.0
-		imin = 0
-		cprl = list()
 		result = list()
-		for i in range(len(tsval) - wsize):
-			cpr = 1.0
-			for j in range(wsize - 1):
-				k = i + j
-				sb = round((tsval[k] - vmin) / dsize)
-				tb = round((tsval[k+1]- vmin) / dsize)
-				cpr *= stpr[sb][tb]
-			
-			cprl.append(formatFloat(oprec, cpr))
-			if cpr < cprmin:
-				cprmin = cpr
-				imin = i
-				#print("cpr {:.6f}".format(cpr))
-			if cpr < thresh:
-				cprs = formatFloat(oprec, cpr)
-				if self.verbose:
-					print("seq anomaly {}  score {}  loc index {}".format(str(tsval[i:i+wsize]), cprs, i))
-				abeg = i 
-				aend = i + wsize - 1
-				if ts is not None:
-					abeg = ts[abeg]
-					aend = ts[aend]
-				an = [abeg, aend, cpr]
-				result.append(an)
-					
-		#print("min prob {:.6f}  loc {}".format(cprmin, imin))
+		for i in np.flatnonzero(wlpr < math.log(thresh)).tolist():
+			cpr = float(cprs[i])
+			if self.verbose:
+				print("seq anomaly {}  score {}  loc index {}".format(str(tsval[i:i+wsize]), formatFloat(oprec, cpr), i))
+			abeg = i 
+			aend = i + wsize - 1
+			if ts is not None:
+				abeg = ts[abeg]
+				aend = ts[aend]
+			an = [abeg, aend, cpr]
+			result.append(an)
+		
+		cprl = list(map(lambda cpr : formatFloat(oprec, cpr), cprs.tolist())) if ofpath is not None else None
 
 		#output
 		if ofpath is not None:
@@ -185,6 +186,50 @@ class MarkovChainAnomaly:
 						fi.write(t +  "," + v + '\n')
 				
 		return result
+
+	def score(self, value):
+		"""
+    	scores a live feed value, returning conditional probability of the window ending with the value, 
+    	or None until the window is filled
+    	
+		Parameters
+			value : time series value
+		"""
+		dsize = self.config.getFloatConfig("train.discrete.size")[0]
+		wsize = self.config.getIntConfig("pred.window.size")[0]
+		self.__loadModel()
+		if self.lprWindow is None:
+			self.lprWindow = RingBuffer(wsize - 1)
+		
+		tbin = discretize(np.array([value], dtype=float), self.model["vmin"], dsize, self.model["nbins"])[0]
+		cpr = None
+		if self.sbin is not None:
+			self.lprWindow.add(self.lstpr[self.sbin, tbin])
+			if self.lprWindow.isFull():
+				cpr = math.exp(self.lprWindow.get().sum())
+		self.sbin = tbin
+		return cpr
+
+	def __loadModel(self):
+		"""
+    	restores saved model if no model is available
+		"""
+		if self.model is None:
+			mfpath = self.config.getStringConfig("train.model.file")[0]
+			self.__setModel(restoreObject(mfpath))
+
+	def __setModel(self, mod):
+		"""
+    	sets model and resets live feed state
+    	
+		Parameters
+			mod : model
+		"""
+		self.model = mod
+		self.lstpr = np.log(mod["stpr"])
+		self.sbin = None
+		self.lprWindow = None
+
 		
 class LookAheadPredictorAnomaly:
 	"""
@@ -217,10 +262,13 @@ class LookAheadPredictorAnomaly:
 
 		self.config = Configuration(configFile, defValues)
 		self.verbose = self.config.getBooleanConfig("common.verbose")[0]
+		self.model = None
+		self.binWindow = None
+		self.countWindow = None
 		
 	def fit(self, tsval=None):
 		"""
-    	builds look ahead lists
+    	builds min and max of look ahead values for each value bin and look ahead step
     	
 		Parameters
 			tsval : time series value list
@@ -238,9 +286,10 @@ class LookAheadPredictorAnomaly:
 			fpath = self.config.getStringConfig("train.data.file")[0]
 			tscol = self.config.getIntConfig("train.data.field")[0]
 			tsval = getFileColumnAsFloat(fpath, tscol)
+		tsval = np.asarray(tsval, dtype=float)
 		
-		vmax = max(tsval)
-		vmin = min(tsval)
+		vmax = tsval.max()
+		vmin = tsval.min()
 		vra = vmax - vmin
 		
 		#increase bin range for ani=omaly
@@ -248,39 +297,21 @@ class LookAheadPredictorAnomaly:
 		vmax += vra * vmargin
 		nbins = int((vmax - vmin) / dsize) + 1
 		
-		lahead = dict()
-		for i in range(len(tsval) - wsize):
-			win = list()
-			for j in range(wsize):
-				k = i + j
-				vd = round((tsval[k] - vmin) / dsize)
-				win.append(vd)
-				
-			#look ahead values
-			for j in range(wsize - lstep):
-				v = win[j]
-				if v in lahead:
-					llist = lahead[v]
-				else:
-					llist = list(map(lambda _ : set(), range(lstep)))
-					lahead[v] = llist
-				
-				# all look ahead values	
-				for k in range(lstep):
-					nv = j + k + 1
-					llist[k].add(win[nv])
-		
-		# sabe only min and max of next value
-		for k in lahead.keys():
-			llist = lahead[v]
-			for j in range(wsiz - lstep):
-				vmin = min(llist[j])
-				vmax = max(llist[j])
-				llist[j] = [vmin, vmax]
-						
+		#look ahead value bin range for each bin and look ahead step, over all positions 
+		#within windows having all look ahead values, empty range for bins not seen
+		bins = discretize(tsval, vmin, dsize, nbins)
+		npos = max(len(bins) - lstep - 1, 0)
+		src = bins[:npos]
+		lamin = np.full((nbins, lstep), nbins)
+		lamax = np.full((nbins, lstep), -1)
+		for k in range(lstep):
+			np.minimum.at(lamin, (src, k), bins[k+1:k+1+npos])
+			np.maximum.at(lamax, (src, k), bins[k+1:k+1+npos])
+		
+		mod = {"vmin":vmin, "vmax":vmax, "nbins":nbins, "lamin":lamin, "lamax":lamax}
+		self.__setModel(mod)
 		if toSave:
 			self.config.assertParams("train.model.file")
-			mod = {"vmin":vmin, "vmax":vmax, "nbins":nbins, "lahead":lahead}
 			saveObject(mod, mfpath)
 
 
@@ -293,7 +324,6 @@ class LookAheadPredictorAnomaly:
 			ts : time stamp list
 		"""
 		dsize = self.config.getFloatConfig("train.discrete.size")[0]
-		mfpath = self.config.getStringConfig("train.model.file")[0]
 		wsize = self.config.getIntConfig("pred.window.size")[0]
 		lstep = self.config.getIntConfig("train.lookahead.step")[0]
 		thresh = self.config.getFloatConfig("pred.ano.threshold")[0]
@@ -310,51 +340,36 @@ class LookAheadPredictorAnomaly:
 			ts = getFileColumnAsString(fpath, tscol)
 		
 		#restore model
-		mod = restoreObject(mfpath)
-		vmin = mod["vmin"]
-		lahead = mod["lahead"]
-		macount = (wsize - lstep) * lstep
-		ascorel = list()
-		for i in range(len(tsval) - wsize):
-			win = list()
-			for j in range(wsize):
-				k = i + j
-				vd = round((tsval[k] - vmin) / dsize)
-				win.append(vd)
-
-			#look ahead values
-			acount = 0
-			for j in range(wsize - lstep):
-				v = win[j]
-				if v in lahead:
-					llist = lahead[v]
-				else:
-					acount += lstep
-					continue
-				
-				# check all look ahead value lists	
-				for k in range(lstep):
-					# check if outside the prediction range
-					nv = j + k + 1
-					if win[nv] < llist[k][0] or  win[nv] > llist[k][1]:
-						acount += 1
-			
-			ascore = acount / macount
-			ascorel.append(ascore)
-			if ascore > thresh:
-				ascores = formatFloat(oprec, ascore)
-				if self.verbose:
-					print("seq anomaly {}  score {}  loc index {}".format(str(tsval[i:i+wsize]), ascores, i))
-				abeg = i 
-				aend = i + wsize - 1
-				if ts is not None:
-					abeg = ts[abeg]
-					aend = ts[aend]
-				an = [abeg, aend, ascore]
-				result.append(an)
+		self.__loadModel()
+		bins = discretize(np.asarray(tsval, dtype=float), self.model["vmin"], dsize, self.model["nbins"])
+		
+		#look ahead values outside range for each position, summed over the first wsize - lstep 
+		#positions of each window
+		nwin = max(len(tsval) - wsize, 0)
+		npos = max(len(bins) - lstep, 0)
+		counts = np.zeros(npos, dtype=int)
+		for k in range(lstep):
+			counts += self.__outOfRange(bins[:npos], k, bins[k+1:k+1+npos])
+		ccounts = np.concatenate(([0], np.cumsum(counts)))
+		m = wsize - lstep
+		ascores = (ccounts[m:m+nwin] - ccounts[:nwin]) / (m * lstep)
+		
+		result = list()
+		for i in np.flatnonzero(ascores > thresh).tolist():
+			ascore = float(ascores[i])
+			if self.verbose:
+				print("seq anomaly {}  score {}  loc index {}".format(str(tsval[i:i+wsize]), formatFloat(oprec, ascore), i))
+			abeg = i 
+			aend = i + wsize - 1
+			if ts is not None:
+				abeg = ts[abeg]
+				aend = ts[aend]
+			an = [abeg, aend, ascore]
+			result.append(an)
 			
 		#output
 		if ofpath is not None:
+			ascorel = list(map(lambda ascore : formatFloat(oprec, ascore), ascores.tolist()))
 			if ts is None:
 				with open(ofpath,'w') as fi:
 					for va in ascorel:
@@ -367,6 +382,144 @@ class LookAheadPredictorAnomaly:
 						fi.write(t +  "," + v + '\n')
 		
 		return result
+
+	def update(self, value):
+		"""
+    	scores a live feed value, returning anomaly score of the window ending with the value, 
+    	or None until the window is filled
+    	
+		Parameters
+			value : time series value
+		"""
+		dsize = self.config.getFloatConfig("train.discrete.size")[0]
+		wsize = self.config.getIntConfig("pred.window.size")[0]
+		lstep = self.config.getIntConfig("train.lookahead.step")[0]
+		self.__loadModel()
+		if self.binWindow is None:
+			self.binWindow = RingBuffer(lstep + 1, dtype=int)
+			self.countWindow = RingBuffer(wsize - lstep, dtype=int)
+		
+		#count of look ahead values out of range, for the position whose look ahead values are all available
+		self.binWindow.add(discretize(np.array([value], dtype=float), self.model["vmin"], dsize, self.model["nbins"])[0])
+		ascore = None
+		if self.binWindow.isFull():
+			bins = self.binWindow.get()
+			count = np.count_nonzero(self.__outOfRange(bins[0], np.arange(lstep), bins[1:]))
+			self.countWindow.add(count)
+			if self.countWindow.isFull():
+				ascore = float(self.countWindow.get().sum()) / ((wsize - lstep) * lstep)
+		return ascore
+
+	def __outOfRange(self, sbins, k, nbins):
+		"""
+    	returns True where look ahead bin is outside the range for the bin and look ahead step
+    	
+		Parameters
+			sbins : bin
+			k : look ahead step index
+			nbins : look ahead bin
+		"""
+		return (nbins < self.model["lamin"][sbins, k]) | (nbins > self.model["lamax"][sbins, k])
+
+	def __loadModel(self):
+		"""
+    	restores saved model if no model is available
+		"""
+		if self.model is None:
+			mfpath = self.config.getStringConfig("train.model.file")[0]
+			self.__setModel(restoreObject(mfpath))
+
+	def __setModel(self, mod):
+		"""
+    	sets model and resets live feed state
+    	
+		Parameters
+			mod : model
+		"""
+		self.model = mod
+		self.binWindow = None
+		self.countWindow = None
+		
+class MatrixProfileAnomaly:
+	"""
+	sub sequence anomaly detection with matrix profile discords
+	"""
+	def __init__(self,  configFile):
+		"""
+		initilizers
+		
+		Parameters
+			configFile : config file path
+		"""
+		defValues = dict()
+		defValues["common.verbose"] = (False, None)
+		defValues["pred.data.file"] = (None, None)
+		defValues["pred.data.field"] = (None, None)
+		defValues["pred.ts.field"] = (None, None)
+		defValues["pred.window.size"] = (50, None)
+		defValues["pred.znorm"] = (False, None)
+		defValues["pred.num.discords"] = (None, None)
+		defValues["pred.ano.threshold"] = (None, None)
+		defValues["pred.output.file"] = (None, None)
+		defValues["pred.output.prec"] = (8, None)
+
+		self.config = Configuration(configFile, defValues)
+		self.verbose = self.config.getBooleanConfig("common.verbose")[0]
+		self.mprofile = None
+		
+	def predict(self, tsval=None, ts=None):
+		"""
+    	predicts anomalous sub sequences as top discords or those with matrix profile above threshold
+    	
+		Parameters
+			tsval : time series value list
+			ts : time stamp list
+		"""
+		wsize = self.config.getIntConfig("pred.window.size")[0]
+		znorm = self.config.getBooleanConfig("pred.znorm")[0]
+		ndiscords = self.config.getIntConfig("pred.num.discords")[0]
+		thresh = self.config.getFloatConfig("pred.ano.threshold")[0]
+		ofpath = self.config.getStringConfig("pred.output.file")[0]
+		oprec = self.config.getIntConfig("pred.output.prec")[0]
+		assert ndiscords is not None or thresh is not None, "either no of discords or threshold should be provided"
+		
+		if tsval is None:
+			#file path from config
+			self.config.assertParams("pred.data.file", "pred.data.field")
+			fpath = self.config.getStringConfig("pred.data.file")[0]
+			tsvcol = self.config.getIntConfig("pred.data.field")[0]
+			tsval = getFileColumnAsFloat(fpath, tsvcol)
+			tscol = self.config.getIntConfig("pred.ts.field")[0]
+			if tscol is not None:
+				ts = getFileColumnAsString(fpath, tscol)
+		
+		self.mprofile = MatrixProfile(tsval, wsize, znorm)
+		profile, index = self.mprofile.getProfile()
+		if ndiscords is not None:
+			anomalies = self.mprofile.getDiscords(ndiscords)
+		else:
+			anomalies = list(map(lambda i : (int(i), float(profile[i])), np.where(profile > thresh)[0]))
+			
+		result = list()
+		for i, score in anomalies:
+			if self.verbose:
+				print("seq anomaly score {}  loc index {}".format(formatFloat(oprec, score), i))
+			abeg = i 
+			aend = i + wsize - 1
+			if ts is not None:
+				abeg = ts[abeg]
+				aend = ts[aend]
+			an = [abeg, aend, score]
+			result.append(an)
+		
+		#output
+		if ofpath is not None:
+			with open(ofpath,'w') as fi:
+				for i, v in enumerate(profile):
+					v = formatFloat(oprec, v)
+					row = v if ts is None else ts[i] + "," + v
+					fi.write(row + '\n')
+		return result
 		
 class FeatureBasedAnomaly:
 	"""
@@ -444,7 +597,8 @@ class FeatureBasedAnomaly:
 			cutoff = self.config.getIntConfig("train.fft.cutoff")[0]
 			
 			#normal data FFT
-			for f in fextractor.featGen(dfpath, cutoff=cutoff, dformat="columnar", rowWise=False, withLabel=False, wsize=wsize):
+			wsize = self.config.getIntConfig("pred.window.size")[0]
+			for f in fextractor.featGen(dfpath, cutoff=cutoff, dformat="columnar", vcol=vcol, rowWise=False, withLabel=False, wsize=wsize):
 				self.nfeature = f
 			
 			if self.verbose:
@@ -485,76 +639,48 @@ class FeatureBasedAnomaly:
 		oprec = self.config.getIntConfig("pred.output.prec")[0]
 		dmetric = self.config.getStringConfig("pred.dist.metric")[0]
 
-		result = list()
-		
-		#histogram
+		#features for all windows as 2D array
+		pstep = 1
 		if self.config.getStringConfig("common.feat.type")[0] == "hist":
+			#histogram
 			fextractor = QuantizedFeatureExtractor()
 			nbins = self.config.getIntConfig("train.hist.nbins")[0]
-			
-			#anamolous data
-			i = 0
-			for fe in fextractor.featGen(dfpath=dfpath, vmin=self.vmin, bwidth=self.bwidth, dformat="columnar", vcol=vcol, nbins=nbins,  histType="uniform", withLabel=False, wsize=wsize):
-				if dmetric == "l1":
-					dist = manhattanDistance(fe, self.nfeature)
-				elif dmetric == "l2":
-					dist = euclideanDistance(fe, self.nfeature)
-				else:
-					exitWithMsg("invalid distance metric")
-				dist /= wsize
-					
-				ano = 1 if dist > threshold else 0
-				r = [tsv[i], dist, ano]
-				i += 1
-				result.append(r)
-		
-		#fft
+			features, _ = fextractor.featGenBlock(dfpath, self.vmin, self.bwidth, dformat="columnar", vcol=vcol, nbins=nbins, 
+			histType="uniform", withLabel=False, wsize=wsize)
+		
 		elif self.config.getStringConfig("common.feat.type")[0] == "fft":
+			#fft
 			fextractor = FourierTransformFeatureExtractor()
 			cutoff = self.config.getIntConfig("train.fft.cutoff")[0]
-			
-			for fe in fextractor.featGen(dfpath, cutoff=cutoff, dformat="columnar",  withLabel=False, wsize=wsize):
-				if dmetric == "l1":
-					dist = manhattanDistance(fe, self.nfeature)
-				elif dmetric == "l2":
-					dist = euclideanDistance(fe, self.nfeature)
-				else:
-					exitWithMsg("invalid distance metric")
-				dist /= wsize
-
-				ano = 1 if dist > threshold else 0
-				r = [tsv[i], dist, ano]
-				i += 1
-				result.append(r)
+			features, _ = fextractor.featGenBlock(dfpath, cutoff=cutoff, dformat="columnar", vcol=vcol, withLabel=False, wsize=wsize)
 
-		#sub sequence stats
 		elif self.config.getStringConfig("common.feat.type")[0] == "seqstat":
-			fextractor = IntervalFeatureExtractor()
+			#sub sequence stats
 			pstep = self.config.getIntConfig("pred.window.pstep")[0]
-
 			ifpath = self.config.getStringConfig("train.seqstat.ifpath")[0]
 			intervals = list()
-			for r in fileRecGen(args.ifpath):
+			for r in fileRecGen(ifpath):
 				intv = (int(r[0]), int(r[1]))
 				intervals.append(intv)
+			windows = SlidingWindow(getFileColumnAsFloatArray(dfpath, vcol), wsize, pstep).windows()
+			features = intervalFeatures(windows, intervals)
 			
-			for fe in fextractor.featGen(dfpath, dformat="columnar", intervals=intervals,  withLabel=False, wsize=wsize, pstep=pstep):
-				if dmetric == "l1":
-					dist = manhattanDistance(fe, self.nfeature)
-				elif dmetric == "l2":
-					dist = euclideanDistance(fe, self.nfeature)
-				else:
-					exitWithMsg("invalid distance metric")
-				dist /= wsize
-
-				ano = 1 if dist > threshold else 0
-				r = [tsv[i], dist, ano]
-				i += 1
-				result.append(r)
-			
-
 		else:
 			exitWithMsg("invalid feature technique")
+		
+		#distances from normal features for all windows
+		diff = features - np.array(self.nfeature)
+		if dmetric == "l1":
+			dist = np.abs(diff).sum(axis=1)
+		elif dmetric == "l2":
+			dist = np.sqrt((diff * diff).sum(axis=1))
+		else:
+			exitWithMsg("invalid distance metric")
+		dist /= wsize
+		ano = (dist > threshold).astype(int)
+		
+		#time stamp of window beginning
+		result = [[t, d, a] for t, d, a in zip(tsv[::pstep], dist.tolist(), ano.tolist())]
 			
 		if ofpath is not None:
 			with open(ofpath,'w') as fi:
@@ -18,20 +18,20 @@
 # Package imports
 import os
 import sys
-import matplotlib.pyplot as plt
+import bisect
 from random import randint
 from datetime import datetime
 from dateutil.parser import parse
-import pandas as pd
 import numpy as np
-from fbprophet import Prophet
-from scipy import signal
-import pywt
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.daexp import *
 from matumizi.stats import *
 
+Prophet = LazyImport("fbprophet", "Prophet")
+signal = LazyImport("scipy.signal")
+pywt = LazyImport("pywt")
+
 
 """
 time series untilities
@@ -74,24 +74,20 @@ def appEntropy(ds, m, r):
 		m : m parameter 
 		r : r parameter 
 	"""
-	def _maxdist(xi, xj):
-		return max([abs(ua - va) for ua, va in zip(xi, xj)])
-		
-	def _phi(m):
-		x = [[data[j] for j in range(i, i + m - 1 + 1)] for i in range(N - m + 1)]
-		C = [ len([1 for xj in x if _maxdist(xi, xj) <= r]) / (N - m + 1.0) for xi in x ]
-		return sum(np.log(C)) / (N - m + 1.0)
+	data = getListData(ds)
+	return approximateEntropy(data, m, r)
+
+def sampEntropy(ds, m, r):
+	"""
+	sample entropy for TS forecastability ref: https://en.wikipedia.org/wiki/Sample_entropy
 		
-	if type(ds[0]) == str:
-		# file name and col index
-		data = list(map(lambda v : float(v), fileSelFieldValueGen(ds[0], int(ds[1]))))
-	else:
-		# list
-		data = ds
-	
-	#print(data)	
-	N = len(data)
-	return abs(_phi(m + 1) - _phi(m))	
+	Parameters
+		ds : data array  actual data or file name and col index
+		m : m parameter 
+		r : r parameter 
+	"""
+	data = getListData(ds)
+	return sampleEntropy(data, m, r)
     
 def kaboudan(cnfFpath, changepoints, holidays, bsize, shTrDataFpath, shVaDataFpath):
 	"""
@@ -173,62 +169,23 @@ def meanStdDevShift(ds, wlen, rdata=None):
 		wlen : window length
 		rdata : reference data
 	"""
-	mlist = list()
-	slist = list()
-	data = getListData(ds)
-	assertGreater(len(data), wlen, "data size should be larger than window size")
-	
-	mmdiff = None
-	msdiff = None
-	means = None
-	sds = None
-	mi = None
-	si = None
-	
-	def setMax(m1, s1, m2, s2, i):
-		#max diff in mean and sd
-		nonlocal mmdiff
-		nonlocal msdiff
-		nonlocal means
-		nonlocal sds
-		nonlocal mi
-		nonlocal si
-		
-		mdiff = abs(m1 - m2)
-		sdiff = abs(s1 - s2)
-		if mmdiff is None:
-			mmdiff = mdiff
-			msdiff = sdiff
-			sds = (s1, s2)
-			means = (m1, m2)
-		else:
-			if mdiff > mmdiff:
-				mmdiff = mdiff
-				mi = i
-				sds = (s1, s2)
-			if sdiff > msdiff:
-				msdiff = sdiff
-				si = i
-				means = (m1, m2)
-	
+	rdata = getListData(rdata) if rdata is not None else None
+	scanner = TwoSampleScanner(getListData(ds), wlen, rdata)
+	locs = scanner.locations()
 	if rdata is None:
-		for i in range(len(data) - wlen):
-			#use half windows
-			beg = i
-			half = beg + int(wlen / 2)
-			end = beg + wlen
-			m1, s1 = basicStat(data[beg:half])
-			m2, s2 = basicStat(data[half:end])
-			setMax(m1, s1, m2, s2, half)
-	else:
-		#use reference data
-		rdata = getListData(rdata)
-		m1, s1 = basicStat(rdata)
-		for i in range(len(data) - wlen):
-			beg = i
-			end = beg + wlen
-			m2, s2 = basicStat(data[beg:end])
-			setMax(m1, s1, m2, s2, i)
+		#location at half window
+		locs = locs + int(wlen / 2)
+	m1, s1, m2, s2 = scanner.meanStdProfile()
+	
+	#max diff in mean and sd, first one in case of tie
+	i = np.abs(m1 - m2).argmax()
+	mmdiff = float(abs(m1[i] - m2[i]))
+	mi = int(locs[i])
+	sds = (float(s1[i]), float(s2[i]))
+	i = np.abs(s1 - s2).argmax()
+	msdiff = float(abs(s1[i] - s2[i]))
+	si = int(locs[i])
+	means = (float(m1[i]), float(m2[i]))
 
 	res = createExplResult("meanDiff", mmdiff, "meanDiffLoc", mi, "stdDeviations", sds, "sdDiff", msdiff, "sdDiffLoc", si, "means", means)
 	return res
@@ -240,53 +197,21 @@ def twoSampleStat(ds, wlen, pstep, algo, rdata=None):
 	Parameters
 		ds: file name and col index or list
 		wlen : window length
-		algo : two sample stat algorithm
+		pstep : processing step size
+		algo : two sample stat algorithm ks, wasserstein, mean or sd
 		rdata : reference data file name and col index or list
 	"""
-	maxKs = None
-	maxi = None
-	maxPvalue = None
-	data = getListData(ds)
-	
-	def setMax(res):
-		nonlocal maxKs
-		nonlocal maxi
-		nonlocal maxPvalue
-		ks = res["stat"]
-		if maxKs is None or ks > maxKs:
-			maxKs = ks
-			maxPvalue = res["pvalue"]
-			maxi = i
-	
-	
-	if rdata is None:
-		# two half windows
-		expl = DataExplorer()
-		for i in range(0, len(data) - wlen, pstep):
-			#use half windows
-			beg = i
-			half = beg + int(wlen / 2)
-			end = beg + wlen
-			__regData(data[beg:half],  "d1", expl)
-			__regData(data[half:end],  "d2", expl)
-			if algo == "ks":
-				res = expl.testTwoSampleKs("d1", "d2")
-			else:
-				exitWithMsg("invalid 2 sample statistic algo")
-			setMax(res)
+	rdata = getListData(rdata) if rdata is not None else None
+	scanner = TwoSampleScanner(getListData(ds), wlen, rdata)
+	profile = scanner.scan(algo, pstep)
+	locs = scanner.locations(pstep)
+	i = profile.argmax()
+	if algo == "ks":
+		#p value only for the max location
+		pvalue = sta.ks_2samp(*scanner.samples(locs[i]))[1]
+		res = createExplResult("maxKS", float(profile[i]), "pvalue", pvalue, "loc", int(locs[i]), "profile", profile)
 	else:
-		expl = __initDexpl(rdata, "d1")
-		for i in range(0, len(data) - wlen, pstep):
-			beg = i
-			end = beg + wlen
-			__regData(data[beg:end],  "d2", expl)
-			if algo == "ks":
-				res = expl.testTwoSampleKs("d1", "d2")
-			else:
-				exitWithMsg("invalid 2 sample statistic algo")
-			setMax(res)
-	
-	res = createExplResult("maxKS", maxKs, "pvalue", maxPvalue, "loc", maxi)
+		res = createExplResult("maxStat", float(profile[i]), "loc", int(locs[i]), "profile", profile)
 	return res
 		
 def fft(ds, srate):
@@ -426,6 +351,269 @@ def createExplResult(*values):
 	return result
 	
 
+class TwoSampleScanner(object):
+	"""
+	rolling two sample statistic scan for change point location, between the two half windows of a sliding 
+	window or between sliding window and reference data. For KS, empirical distribution difference of the 
+	two samples is kept in a segment tree over value ranks, with O(log n) update as a value enters or leaves 
+	a window. For Wasserstein, windows are kept sorted with O(w) list insert and delete as the window slides and 
+	the distance is an O(w) vectorized pass over sorted samples, w being window size. Mean and std dev shift are 
+	from prefix sums
+	"""
+	def __init__(self, data, wlen, rdata=None):
+		"""
+		initilizers
+		
+		Parameters
+			data : data list or array
+			wlen : window length
+			rdata : reference data list or array
+		"""
+		self.data = np.array(data, dtype=float)
+		self.wlen = wlen
+		self.rdata = np.array(rdata, dtype=float) if rdata is not None else None
+		assertGreater(len(self.data), wlen, "data size should be larger than window size")
+	
+	def locations(self, pstep=1):
+		"""
+		window beginning locations scanned
+		
+		Parameters
+			pstep : processing step size
+		"""
+		return np.arange(0, len(self.data) - self.wlen, pstep)
+	
+	def scan(self, algo="ks", pstep=1):
+		"""
+		statistic for all window locations
+		
+		Parameters
+			algo : two sample stat algorithm ks, wasserstein, mean or sd
+			pstep : processing step size
+		"""
+		if algo == "ks":
+			profile = self.__scanKs(pstep)
+		elif algo == "wasserstein":
+			profile = self.__scanWasserstein(pstep)
+		elif algo == "mean" or algo == "sd":
+			m1, s1, m2, s2 = self.meanStdProfile(pstep)
+			profile = np.abs(m1 - m2) if algo == "mean" else np.abs(s1 - s2)
+		else:
+			exitWithMsg("invalid 2 sample statistic algo")
+		return profile
+	
+	def meanStdProfile(self, pstep=1):
+		"""
+		mean and std dev of both samples for all window locations
+		
+		Parameters
+			pstep : processing step size
+		"""
+		locs = self.locations(pstep)
+		
+		#prefix sums of centered data
+		dmean = self.data.mean()
+		data = self.data - dmean
+		csum = np.concatenate(([0], np.cumsum(data)))
+		csumSq = np.concatenate(([0], np.cumsum(data * data)))
+		
+		def meanStd(beg, end):
+			n = end - beg
+			isum = csum[end] - csum[beg]
+			mean = isum / n
+			sd = np.sqrt(np.maximum(csumSq[end] - csumSq[beg] - mean * isum, 0) / (n - 1))
+			return (mean + dmean, sd)
+		
+		if self.rdata is None:
+			half = int(self.wlen / 2)
+			m1, s1 = meanStd(locs, locs + half)
+			m2, s2 = meanStd(locs + half, locs + self.wlen)
+		else:
+			m1, s1 = basicStat(self.rdata.tolist())
+			m1, s1 = np.full(len(locs), m1), np.full(len(locs), s1)
+			m2, s2 = meanStd(locs, locs + self.wlen)
+		return (m1, s1, m2, s2)
+	
+	def samples(self, loc):
+		"""
+		both samples for a window location
+		
+		Parameters
+			loc : window beginning location
+		"""
+		if self.rdata is None:
+			half = loc + int(self.wlen / 2)
+			samp = (self.data[loc:half], self.data[half:loc + self.wlen])
+		else:
+			samp = (self.rdata, self.data[loc:loc + self.wlen])
+		return samp
+	
+	def __scanKs(self, pstep):
+		"""
+		KS statistic for all window locations
+		
+		Parameters
+			pstep : processing step size
+		"""
+		locs = self.locations(pstep)
+		data = self.data
+		wlen = self.wlen
+		
+		#value ranks with all samples, ties sharing rank
+		adata = data if self.rdata is None else np.concatenate((data, self.rdata))
+		uvalues, ranks = np.unique(adata, return_inverse=True)
+		ranks = ranks.ravel()
+		
+		#integer weights n2 for first sample and -n1 for second, so that tree values are exact
+		if self.rdata is None:
+			n1 = int(wlen / 2)
+			n2 = wlen - n1
+			counts = n2 * np.bincount(ranks[:n1], minlength=len(uvalues))
+			counts -= n1 * np.bincount(ranks[n1:wlen], minlength=len(uvalues))
+		else:
+			n1 = len(self.rdata)
+			n2 = wlen
+			counts = n2 * np.bincount(ranks[len(data):], minlength=len(uvalues))
+			counts -= n1 * np.bincount(ranks[:wlen], minlength=len(uvalues))
+		self.__buildTree(counts)
+		
+		profile = np.empty(len(locs))
+		norm = n1 * n2
+		cur = 0
+		for j, loc in enumerate(locs.tolist()):
+			while cur < loc:
+				#slide by one
+				if self.rdata is None:
+					self.__updateTree(ranks[cur], -n2)
+					self.__updateTree(ranks[cur + n1], n2 + n1)
+				else:
+					self.__updateTree(ranks[cur], n1)
+				self.__updateTree(ranks[cur + wlen], -n1)
+				cur += 1
+			tmax = self.tmax[1]
+			tmin = -self.tmin[1]
+			profile[j] = (tmax if tmax > tmin else tmin) / norm
+		return profile
+	
+	def __buildTree(self, counts):
+		"""
+		builds segment tree with sum, max prefix sum and min prefix sum for each node
+		
+		Parameters
+			counts : weighted counts for each value rank
+		"""
+		tsize = 1
+		while tsize < len(counts):
+			tsize *= 2
+		tsum = np.zeros(2 * tsize, dtype=np.int64)
+		tmax = np.zeros(2 * tsize, dtype=np.int64)
+		tmin = np.zeros(2 * tsize, dtype=np.int64)
+		tsum[tsize:tsize + len(counts)] = counts
+		tmax[tsize:] = np.maximum(tsum[tsize:], 0)
+		tmin[tsize:] = np.minimum(tsum[tsize:], 0)
+		beg = tsize
+		while beg > 1:
+			#one tree level
+			pbeg = beg // 2
+			lsum = tsum[beg:2 * beg:2]
+			tsum[pbeg:beg] = lsum + tsum[beg + 1:2 * beg:2]
+			tmax[pbeg:beg] = np.maximum(tmax[beg:2 * beg:2], lsum + tmax[beg + 1:2 * beg:2])
+			tmin[pbeg:beg] = np.minimum(tmin[beg:2 * beg:2], lsum + tmin[beg + 1:2 * beg:2])
+			beg = pbeg
+		self.tsize = tsize
+		self.tsum = tsum.tolist()
+		self.tmax = tmax.tolist()
+		self.tmin = tmin.tolist()
+	
+	def __updateTree(self, rank, delta):
+		"""
+		updates leaf for a value rank and all its ancestors
+		
+		Parameters
+			rank : value rank
+			delta : change in weighted count
+		"""
+		tsum = self.tsum
+		tmax = self.tmax
+		tmin = self.tmin
+		i = rank + self.tsize
+		v = tsum[i] + delta
+		tsum[i] = v
+		tmax[i] = v if v > 0 else 0
+		tmin[i] = v if v < 0 else 0
+		i >>= 1
+		while i > 0:
+			l = 2 * i
+			lsum = tsum[l]
+			tsum[i] = lsum + tsum[l + 1]
+			a = tmax[l]
+			b = lsum + tmax[l + 1]
+			tmax[i] = a if a > b else b
+			a = tmin[l]
+			b = lsum + tmin[l + 1]
+			tmin[i] = a if a < b else b
+			i >>= 1
+	
+	def __scanWasserstein(self, pstep):
+		"""
+		Wasserstein distance for all window locations. Cost per window location is O(w) for keeping 
+		the samples sorted and O(w) for the distance
+		
+		Parameters
+			pstep : processing step size
+		"""
+		locs = self.locations(pstep)
+		data = self.data.tolist()
+		wlen = self.wlen
+		if self.rdata is None:
+			n1 = int(wlen / 2)
+			sorted1 = sorted(data[:n1])
+			sorted2 = sorted(data[n1:wlen])
+		else:
+			n1 = None
+			sorted1 = sorted(self.rdata.tolist())
+			sorted2 = sorted(data[:wlen])
+			usorted = np.array(sorted1)
+		ui, vi, dt = self.__quantileGrid(len(sorted1), len(sorted2))
+		
+		def remove(svalues, value):
+			del svalues[bisect.bisect_left(svalues, value)]
+		
+		profile = np.empty(len(locs))
+		cur = 0
+		for j, loc in enumerate(locs.tolist()):
+			while cur < loc:
+				#slide by one
+				if n1 is not None:
+					remove(sorted1, data[cur])
+					v = data[cur + n1]
+					remove(sorted2, v)
+					bisect.insort(sorted1, v)
+				else:
+					remove(sorted2, data[cur])
+				bisect.insort(sorted2, data[cur + wlen])
+				cur += 1
+			u = np.array(sorted1) if n1 is not None else usorted
+			profile[j] = np.dot(dt, np.abs(u[ui] - np.array(sorted2)[vi]))
+		return profile
+
+	def __quantileGrid(self, n1, n2):
+		"""
+		Wasserstein distance between sorted samples is the area between their empirical quantile functions, 
+		which are step functions with steps at i / n1 and j / n2. Returns sample indexes and width for each 
+		interval between steps, which depend only on sample sizes
+		
+		Parameters
+			n1 : first sample size
+			n2 : second sample size
+		"""
+		#steps as integers over common denominator n1 * n2
+		steps = np.union1d(np.arange(1, n1 + 1) * n2, np.arange(1, n2 + 1) * n1)
+		dt = np.diff(steps, prepend=0) / (n1 * n2)
+		ui = (steps + n2 - 1) // n2 - 1
+		vi = (steps + n1 - 1) // n1 - 1
+		return (ui, vi, dt)
+
 class MeanStdShiftDetector(SlidingWindowProcessor):
 	"""
 	online detection of mean and std deviation shift
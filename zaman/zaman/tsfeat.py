@@ -20,15 +20,18 @@ import sys
 from random import randint
 import time
 import math
+import itertools
+import multiprocessing
 from datetime import datetime
 import numpy as np
-from scipy import fft
 from matumizi.util import *
 from matumizi.mlutil import *
 from matumizi.sampler import *
 from matumizi.daexp import *
 from matumizi.stats import *
 
+fft = LazyImport("scipy.fft")
+
 """
 Time series feature extraction
 """
@@ -36,15 +39,164 @@ Time series feature extraction
 """
 interval statistics based feature extraction
 """
+def intervalFeatures(data, intervals):
+	"""
+	mean, std dev and slope for each interval for all rows of a 2D array. Uses prefix sums of value,
+	value squared and index times value so that each interval is O(1)
+	
+	Parameters
+		data : 2D data array, one sequence per row
+		intervals : interval indexes
+	"""
+	data = np.asarray(data, dtype=float)
+	nrow, rlen = data.shape
+	
+	#rows centered to limit precision loss in prefix sums
+	rmean = data.mean(axis=1, keepdims=True)
+	cdata = data - rmean
+	zero = np.zeros((nrow, 1))
+	csum = np.hstack((zero, np.cumsum(cdata, axis=1)))
+	csumSq = np.hstack((zero, np.cumsum(cdata * cdata, axis=1)))
+	csumIx = np.hstack((zero, np.cumsum(cdata * np.arange(rlen), axis=1)))
+	
+	beg = np.array([intv[0] for intv in intervals])
+	end = np.array([intv[1] for intv in intervals])
+	n = end - beg
+	isum = csum[:, end] - csum[:, beg]
+	mean = isum / n
+	sd = np.sqrt(np.maximum(csumSq[:, end] - csumSq[:, beg] - mean * isum, 0) / (n - 1))
+	
+	#least square slope with index within interval as x
+	ixsum = csumIx[:, end] - csumIx[:, beg] - beg * isum
+	slope = (ixsum - isum * (n - 1) / 2) / (n * (n * n - 1) / 12)
+	
+	features = np.empty((nrow, 3 * len(intervals)))
+	features[:, 0::3] = mean + rmean
+	features[:, 1::3] = sd
+	features[:, 2::3] = slope
+	return features
+
+def recIntervalFeatures(args):
+	"""
+	interval features for a chunk of file records, returning features and labels
+	
+	Parameters
+		args : records, intervals and label flag
+	"""
+	recs, intervals, withLabel = args
+	data, labels = recsToArray(recs, withLabel)
+	return (intervalFeatures(data, intervals), labels)
+
+def recsToArray(recs, withLabel):
+	"""
+	converts file records with numeric values to 2D array, returning array and labels
+	
+	Parameters
+		recs : list of records
+		withLabel : True if the last field is label
+	"""
+	data = np.array([rec[:-1] for rec in recs] if withLabel else recs, dtype=float)
+	labels = [rec[-1] for rec in recs] if withLabel else None
+	return (data, labels)
+
+def fileRecChunks(dfpath, bsize):
+	"""
+	generates chunks of file records
+	
+	Parameters
+		dfpath : data file path
+		bsize : num of records per chunk
+	"""
+	recs = fileRecGen(dfpath)
+	while True:
+		chunk = list(itertools.islice(recs, bsize))
+		if len(chunk) == 0:
+			break
+		yield chunk
+
+def loadTabularData(dfpath, withLabel=True, bsize=10000, mmpath=None):
+	"""
+	loads tabular numeric data with one sequence per row into 2D array, returning array and labels. 
+	If a .npy file path is provided, the array is written to it in chunks and memory mapped
+	
+	Parameters
+		dfpath : data file path
+		withLabel : True if each row is labeled
+		bsize : num of rows parsed together
+		mmpath : .npy file path for memory mapped array
+	"""
+	labels = list() if withLabel else None
+	if mmpath is None:
+		blocks = list()
+		for recs in fileRecChunks(dfpath, bsize):
+			block, blabels = recsToArray(recs, withLabel)
+			blocks.append(block)
+			if withLabel:
+				labels.extend(blabels)
+		data = np.vstack(blocks)
+	else:
+		#shape from first pass
+		nrow = 0
+		ncol = None
+		for rec in fileRecGen(dfpath):
+			if ncol is None:
+				ncol = len(rec) - 1 if withLabel else len(rec)
+			nrow += 1
+		data = np.lib.format.open_memmap(mmpath, mode="w+", dtype=float, shape=(nrow, ncol))
+		beg = 0
+		for recs in fileRecChunks(dfpath, bsize):
+			block, blabels = recsToArray(recs, withLabel)
+			data[beg:beg+len(block)] = block
+			beg += len(block)
+			if withLabel:
+				labels.extend(blabels)
+		data.flush()
+		del data
+		data = np.load(mmpath, mmap_mode="r")
+	return (data, labels)
+
+def loadWindowedData(dfpath, vcol, wsize):
+	"""
+	loads single column data as 2D read only view of all windows
+	
+	Parameters
+		dfpath : data file path
+		vcol : value column
+		wsize : window size
+	"""
+	return SlidingWindow(getFileColumnAsFloatArray(dfpath, vcol), wsize).windows()
+
+def blockFeatures(data, func, nfeat, bsize, ofpath=None):
+	"""
+	applies feature function to blocks of rows of 2D array, with output optionally to a .npy file
+	
+	Parameters
+		data : 2D data array
+		func : feature function for a block of rows
+		nfeat : num of features
+		bsize : num of rows per block
+		ofpath : output .npy file path
+	"""
+	nrow = len(data)
+	if ofpath is not None:
+		features = np.lib.format.open_memmap(ofpath, mode="w+", dtype=float, shape=(nrow, nfeat))
+	else:
+		features = np.empty((nrow, nfeat))
+	for i in range(0, nrow, bsize):
+		features[i:i+bsize] = func(np.asarray(data[i:i+bsize]))
+	if ofpath is not None:
+		features.flush()
+	return features
+
 class IntervalFeatureExtractor(object):
 	def __init__(self):
 		"""
 		Initializer
 		"""
-		self.expl = DataExplorer()
+		pass
 		
 	def featGen(self, dfpath, dformat="tabular", rowWise=True, nintervals=None, intvmin=None, intvmax=None, intervals=None, 
-	ifpath=None, overlap=False, withLabel=True, prec=3, wsize=50, pstep=1, retArr=True):
+	ifpath=None, overlap=False, withLabel=True, prec=3, wsize=50, pstep=1, retArr=True, vcol=1, bsize=10000, njobs=1):
 		"""
 		extracts mean, std dev and slope for multiple intervals
 		
@@ -63,59 +215,60 @@ class IntervalFeatureExtractor(object):
 			wsize : sliding window size
 			pstep : sliding window processing step
 			retArr ; If True returns array otherwise delem separated string
+			vcol : value column for columnar data
+			bsize : num of rows or windows processed together
+			njobs : num of processes for tabular data, processing chunks of bsize rows
 		"""
+		fsum = None
+		fcount = 0
 		if dformat == "tabular":
-			#tabluar with multiple values per row
-			allfeatures = list()
-			for rec in fileRecGen(dfpath):
-				frec = rec[:-1] if withLabel else rec
-				frec = toFloatList(frec)
-				
+			#tabluar with multiple values per row, in chunks
+			chunks = fileRecChunks(dfpath, bsize)
+			first = next(chunks, None)
+			if first is not None:
 				if intervals is None:
-					intervals = self.__genIntervals(len(frec), nintervals, intvmin, intvmax,  overlap)
-				
-				#stats based features
-				features = self.__getIntvFeatures(frec, intervals)
-			
-				if rowWise:
-					if withLabel:
-						features.append(rec[-1])
-					feat = features if retArr else toStrFromList(features, prec)
-					yield feat
-				else:
-					#all datra
-					allfeatures.append(features)
-				
-			if not rowWise:
-				#all data
-				features = np.mean(np.array(allfeatures), axis=0)
-				feat = features if retArr else toStrFromList(features, prec)
-				yield feat
+					rlen = len(first[0]) - 1 if withLabel else len(first[0])
+					intervals = self.__genIntervals(rlen, nintervals, intvmin, intvmax,  overlap)
+				args = map(lambda recs : (recs, intervals, withLabel), itertools.chain([first], chunks))
+				pool = multiprocessing.Pool(njobs) if njobs > 1 else None
+				results = pool.imap(recIntervalFeatures, args) if pool is not None else map(recIntervalFeatures, args)
+				try:
+					for features, labels in results:
+						if rowWise:
+							for i in range(len(features)):
+								feat = features[i].tolist()
+								if withLabel:
+									feat.append(labels[i])
+								yield feat if retArr else toStrFromList(feat, prec)
+						else:
+							fsum = features.sum(axis=0) if fsum is None else fsum + features.sum(axis=0)
+							fcount += len(features)
+				finally:
+					if pool is not None:
+						pool.close()
 			
 		else:
-			#sequential data from a column
-			dvalues = getFileColumnAsFloat(dfpath, vcol)
+			#sequential data from a column, windowed in chunks of windows
+			dvalues = getFileColumnAsFloatArray(dfpath, vcol)
 			if intervals is None:
 				intervals = self.__genIntervals(wsize, nintervals, intvmin, intvmax,  overlap)
-				
-			#windowed
-			allfeatures = list()
-			slwin = SlidingWindow(dvalues, wsize, pstep)
-			for wdata in slwin.windowGen():
-				features = self.__getIntvFeatures(wdata, intervals)
+			
+			windows = SlidingWindow(dvalues, wsize, pstep).windows()
+			for i in range(0, len(windows), bsize):
+				features = intervalFeatures(windows[i:i+bsize], intervals)
 				if rowWise:
 					#one value per window location
-					feat = features if retArr else toStrFromList(features, prec)
-					yield feat
+					for feat in features.tolist():
+						yield feat if retArr else toStrFromList(feat, prec)
 				else:
-					#all datra
-					allfeatures.append(features)
-				
-			if not rowWise:
-				#all data
-				features = np.mean(np.array(allfeatures), axis=0)
-				feat = features if retArr else toStrFromList(features, prec)
-				yield feat
+					fsum = features.sum(axis=0) if fsum is None else fsum + features.sum(axis=0)
+					fcount += len(features)
+		
+		if not rowWise and fcount > 0:
+			#all data
+			features = fsum / fcount
+			feat = features if retArr else toStrFromList(features, prec)
+			yield feat
 			
 		if ifpath is not None:
 			with open(ifpath, "w") as fintv:
@@ -160,34 +313,7 @@ class IntervalFeatureExtractor(object):
 				remain = rlen - stb
 		
 		return intervals
-		
-	def __getIntvFeatures(self, data, intervals):
-		"""
-		generate interval features
-		
-		Parameters
-			data : data array
-			intervals : interval indexes
-		"""
-		
-		features = list()
-		for intv in intervals:
-			intvdata = data[intv[0]:intv[1]]
-				
-			#mean and std dev
-			mean = statistics.mean(intvdata)
-			sd = statistics.stdev(intvdata, xbar=mean)
-				
-			#slope
-			self.expl.setVerbose(False)
-			self.expl.addListNumericData(intvdata, "mydata")
-			slope = self.expl.fitLinearReg("mydata")["slope"]
-			features.append(mean)
-			features.append(sd)
-			features.append(slope)
-	
-		return features
-				
+
 """
 quantization and histogram based feature extraction
 """
@@ -244,7 +370,7 @@ class QuantizedFeatureExtractor(object):
 		return re
 		
 	def featGen(self, dfpath, vmin, bwidth, dformat="tabular", vcol=1, nbins=10,  histType="uniform", rowWise=True, 
-	withLabel=True, prec=3, wsize=50, retArr=True):
+	withLabel=True, prec=3, wsize=50, retArr=True, bsize=10000):
 		"""
 		calculates histogram for each record
 		
@@ -261,6 +387,7 @@ class QuantizedFeatureExtractor(object):
 			prec : float output precision
 			wsize : window size for data is single column
 			retArr ; If True returns array otherwise delem separated string
+			bsize : num of windows processed together
 		"""
 		if histType == "uniform":
 			hgram = Histogram.createUninitializedWithNumBins(vmin, bwidth, nbins)
@@ -294,15 +421,12 @@ class QuantizedFeatureExtractor(object):
 			
 			#one value per window location
 			if rowWise:
-				#windowed
-				slwin = SlidingWindow(dvalues, wsize)
-				for wdata in slwin.windowGen():
-					for d in wdata:
-						hgram.add(d)
-					features = hgram.distr()
-					feat = features if retArr else toStrFromList(features, prec)
-					hgram.initialize()
-					yield feat
+				#windowed, histograms for a block of windows together
+				windows = SlidingWindow(dvalues, wsize).windows()
+				for i in range(0, len(windows), bsize):
+					for features in self.__histogram(windows[i:i+bsize], vmin, bwidth, nbins).tolist():
+						feat = features if retArr else toStrFromList(features, prec)
+						yield feat
 				
 			else:
 				#all data
@@ -312,6 +436,77 @@ class QuantizedFeatureExtractor(object):
 				feat = features if retArr else toStrFromList(features, prec)
 				yield feat
 
+	def featGenBlock(self, dfpath, vmin, bwidth, dformat="tabular", vcol=1, nbins=10,  histType="uniform", rowWise=True, 
+	withLabel=True, wsize=50, bsize=10000, mmpath=None, ofpath=None):
+		"""
+		calculates histogram for all records or windows together, returning features array and labels
+		
+		Parameters
+			dfpath : data file path
+			vmin : min value
+			bwidth : bin width
+			dformat : data format tabular or single column of data
+			vcol : value column for columnar data
+			nbins : number of bins
+			histType : histogram type eqwidth for equal width bin and eqsample for equal number of samples in each bin
+			rowWise : if True row wise feature generation
+			withLabel : True if each TS sequence is labeled
+			wsize : window size for data is single column
+			bsize : num of rows or windows processed together
+			mmpath : .npy file path for memory mapping tabular data
+			ofpath : .npy file path for row wise features
+		"""
+		if histType != "uniform":
+			exitWithMsg("equal sample histogram not supported yet")
+		
+		labels = None
+		if dformat == "tabular":
+			data, labels = loadTabularData(dfpath, withLabel, bsize, mmpath)
+		elif rowWise:
+			data = loadWindowedData(dfpath, vcol, wsize)
+		else:
+			data = getFileColumnAsFloatArray(dfpath, vcol).reshape(1, -1)
+		
+		if rowWise:
+			features = blockFeatures(data, lambda block : self.__histogram(block, vmin, bwidth, nbins), nbins, bsize, ofpath)
+		else:
+			#all data, counts summed over blocks
+			counts = np.zeros(nbins)
+			for i in range(0, len(data), bsize):
+				counts += self.__binCounts(np.asarray(data[i:i+bsize]), vmin, bwidth, nbins).sum(axis=0)
+			features = counts / counts.sum()
+		return (features, labels)
+
+	def __binCounts(self, data, vmin, bwidth, nbins):
+		"""
+		bin counts for each row
+		
+		Parameters
+			data : 2D data array
+			vmin : min value
+			bwidth : bin width
+			nbins : number of bins
+		"""
+		bins = ((data - vmin) / bwidth).astype(int)
+		if bins.size > 0 and (bins.min() < 0 or bins.max() > nbins - 1):
+			raise ValueError("outside histogram range")
+		nrow = len(data)
+		bins += np.arange(nrow).reshape(-1, 1) * nbins
+		return np.bincount(bins.ravel(), minlength=nrow * nbins).reshape(nrow, nbins).astype(float)
+
+	def __histogram(self, data, vmin, bwidth, nbins):
+		"""
+		normalized histogram for each row
+		
+		Parameters
+			data : 2D data array
+			vmin : min value
+			bwidth : bin width
+			nbins : number of bins
+		"""
+		counts = self.__binCounts(data, vmin, bwidth, nbins)
+		return counts / counts.sum(axis=1, keepdims=True)
+
 		
 		
 """
@@ -325,7 +520,8 @@ class FourierTransformFeatureExtractor(object):
 		"""
 		pass
 
-	def featGen(self, dfpath, cutoff=None, dformat="tabular", vcol=1, rowWise=True, withLabel=True, prec=3, wsize=50, retArr=True):
+	def featGen(self, dfpath, cutoff=None, dformat="tabular", vcol=1, rowWise=True, withLabel=True, prec=3, wsize=50, retArr=True, 
+	bsize=10000):
 		"""
 		calculates FFT for each record
 		
@@ -339,6 +535,7 @@ class FourierTransformFeatureExtractor(object):
 			prec : float output precision
 			wsize : window size for data is single column
 			retArr ; If True returns array otherwise delem separated string
+			bsize : num of windows processed together
 		"""
 		if dformat == "tabular":
 			# tabluar with multiple values per row
@@ -365,23 +562,62 @@ class FourierTransformFeatureExtractor(object):
 			#columnar data
 			dvalues = getFileColumnAsFloat(dfpath, vcol)
 			
-			allfeatures = list()
-			slwin = SlidingWindow(dvalues, wsize)
-			for wdata in slwin.windowGen():
-				features = self.__fft(wdata, cutoff)
+			fsum = None
+			windows = SlidingWindow(dvalues, wsize).windows()
+			for i in range(0, len(windows), bsize):
+				#FFT for a block of windows together
+				features = self.__fft(windows[i:i+bsize], cutoff)
 				if rowWise:	
 					#windowed
-					feat = features if retArr else toStrFromList(features, prec)
-					yield feat
+					for feat in features:
+						yield feat if retArr else toStrFromList(feat, prec)
 				else:
 					#all data
-					allfeatures.append(features)
+					fsum = features.sum(axis=0) if fsum is None else fsum + features.sum(axis=0)
 			
-			if not rowWise:
+			if not rowWise and fsum is not None:
 				#all data average of all FFT
-				features = np.mean(np.array(allfeatures), axis=0)
+				features = fsum / len(windows)
 				feat = features if retArr else toStrFromList(features, prec)
 				yield feat
+
+	def featGenBlock(self, dfpath, cutoff=None, dformat="tabular", vcol=1, rowWise=True, withLabel=True, wsize=50, 
+	bsize=10000, mmpath=None, ofpath=None):
+		"""
+		calculates FFT for all records or windows together, returning features array and labels
+		
+		Parameters
+			dfpath : data file path
+			cutoff : cutoff index
+			dformat : data format tabular or single column of data
+			vcol : value column for columnar data
+			rowWise : if True row wise feature generation
+			withLabel : True if each TS sequence is labeled
+			wsize : window size for data is single column
+			bsize : num of rows or windows processed together
+			mmpath : .npy file path for memory mapping tabular data
+			ofpath : .npy file path for row wise or windowed features
+		"""
+		labels = None
+		if dformat == "tabular":
+			data, labels = loadTabularData(dfpath, withLabel, bsize, mmpath)
+		else:
+			data = loadWindowedData(dfpath, vcol, wsize)
+		
+		if rowWise:
+			nfeat = data.shape[1] // 2 + 1
+			nfeat = min(nfeat, cutoff) if cutoff is not None else nfeat
+			features = blockFeatures(data, lambda block : self.__fft(block, cutoff), nfeat, bsize, ofpath)
+		elif dformat == "tabular":
+			#all data as one sequence
+			features = self.__fft(np.asarray(data).ravel(), cutoff)
+		else:
+			#all data average of all FFT, summed over blocks
+			features = 0
+			for i in range(0, len(data), bsize):
+				features = features + self.__fft(data[i:i+bsize], cutoff).sum(axis=0)
+			features = features / len(data)
+		return (features, labels)
 				
 	def __fft(self, data, cutoff=None):
 		"""
@@ -391,9 +627,9 @@ class FourierTransformFeatureExtractor(object):
 			data : input data list like
 			cutoff : cutoff index
 		"""
-		ft = fft.rfft(np.array(data))
+		ft = fft.rfft(np.array(data), axis=-1)
 		ft =  np.abs(ft)
-		ft = ft[:cutoff] if cutoff is not None else ft
+		ft = ft[..., :cutoff] if cutoff is not None else ft
 		return ft
 		
 